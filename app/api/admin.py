@@ -0,0 +1,209 @@
+import asyncio
+import tracemalloc
+from typing import Any, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import ValidationError
+
+from app.api.predictions.controller import get_api_key
+from app.drain import drain_coordinator
+from app.memory import memory_diagnostics
+from app.settings import get_settings, public_settings, reload_settings
+
+router = APIRouter(dependencies=[Depends(get_api_key)])
+
+
+@router.get("/settings", response_model=dict)
+async def read_settings() -> dict[str, Any]:
+    """
+    Return the settings in use by this worker.
+
+    Returns:
+    dict: Every setting except the secrets (SECRET_KEY, API_KEY_AUTH, CAPTURE_SALT).
+
+    Raises:
+    HTTPException: 400 or 403 if the `api_key_auth` header is missing or invalid.
+    """
+    return public_settings(get_settings())
+
+
+@router.post("/settings/reload", response_model=dict)
+async def reload() -> dict[str, Any]:
+    """
+    Reload the settings of this worker from the environment and SETTINGS_FILE.
+
+    Returns:
+    dict: A dictionary containing:
+        - "changed" (list): The names of the settings that changed.
+
+    Raises:
+    HTTPException: 400 or 403 if the `api_key_auth` header is missing or invalid.
+    HTTPException: 422 if the new settings are invalid; the current ones stay in use.
+
+    Notes:
+    - Only the worker that handles the request reloads; send SIGHUP to every
+      worker process to reload them all.
+    """
+    try:
+        return {"changed": reload_settings()}
+    except ValidationError as e:
+        raise HTTPException(
+            status_code=422, detail=e.errors(include_url=False, include_input=False)
+        )
+
+
+@router.get("/memory", response_model=dict)
+async def read_memory(limit: int = Query(20, ge=1, le=1000)) -> dict[str, Any]:
+    """
+    Report the memory of this worker.
+
+    Parameters:
+    limit (int): The number of largest items to list per subsystem.
+
+    Returns:
+    dict: A dictionary containing:
+        - "process" (dict): The RSS, allocated blocks and garbage collector counts.
+        - "subsystems" (dict): The estimated bytes held by each subsystem (sessions,
+          caches, connections, dedup indexes, ...).
+        - "tracing" (bool): Whether tracemalloc is tracing allocations.
+
+    Raises:
+    HTTPException: 400 or 403 if the `api_key_auth` header is missing or invalid.
+    """
+    return {
+        "process": memory_diagnostics.sample(),
+        "subsystems": await asyncio.to_thread(memory_diagnostics.sizes, limit),
+        "tracing": tracemalloc.is_tracing(),
+    }
+
+
+@router.post("/memory/tracemalloc/start", response_model=dict)
+async def start_tracemalloc(frames: Optional[int] = Query(None, ge=1, le=100)) -> dict[str, Any]:
+    """
+    Start tracing allocations with tracemalloc.
+
+    Parameters:
+    frames (int, optional): The frames stored per allocation; defaults to TRACEMALLOC_FRAMES.
+
+    Returns:
+    dict: {"tracing": True}.
+
+    Raises:
+    HTTPException: 400 or 403 if the `api_key_auth` header is missing or invalid.
+
+    Notes:
+    - Tracing slows allocations down and uses memory of its own; stop it once done.
+    - Already running tracing keeps its number of frames.
+    """
+    memory_diagnostics.start_tracing(frames)
+    return {"tracing": True}
+
+
+@router.post("/memory/tracemalloc/stop", response_model=dict)
+async def stop_tracemalloc() -> dict[str, Any]:
+    """
+    Stop tracing allocations and drop the baseline snapshot.
+
+    Returns:
+    dict: {"tracing": False}.
+
+    Raises:
+    HTTPException: 400 or 403 if the `api_key_auth` header is missing or invalid.
+    """
+    memory_diagnostics.stop_tracing()
+    return {"tracing": False}
+
+
+@router.get("/memory/snapshot", response_model=dict)
+async def memory_snapshot(limit: int = Query(20, ge=1, le=1000)) -> dict[str, Any]:
+    """
+    Take a tracemalloc snapshot, which becomes the baseline of `/memory/diff`.
+
+    Parameters:
+    limit (int): The number of allocation sites and subsystems to list.
+
+    Returns:
+    dict: A dictionary containing:
+        - "traced_bytes" (int): The bytes allocated since tracing started and still held.
+        - "subsystems" (dict): Those bytes by module of the application (or library).
+        - "top" (list): The largest allocation sites.
+
+    Raises:
+    HTTPException: 400 or 403 if the `api_key_auth` header is missing or invalid.
+    HTTPException: 409 if tracemalloc is not tracing.
+    """
+    try:
+        return await asyncio.to_thread(memory_diagnostics.snapshot, limit)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.get("/memory/diff", response_model=dict)
+async def memory_diff(limit: int = Query(20, ge=1, le=1000)) -> dict[str, Any]:
+    """
+    Compare a new tracemalloc snapshot with the baseline.
+
+    Parameters:
+    limit (int): The number of allocation sites and subsystems to list.
+
+    Returns:
+    dict: A dictionary containing:
+        - "size_diff" (int): The growth in bytes since the baseline.
+        - "subsystems" (dict): That growth by module, largest changes first.
+        - "top" (list): The allocation sites that changed most.
+
+    Raises:
+    HTTPException: 400 or 403 if the `api_key_auth` header is missing or invalid.
+    HTTPException: 409 if tracemalloc is not tracing or no baseline was taken.
+    """
+    try:
+        return await asyncio.to_thread(memory_diagnostics.diff, limit)
+    except (RuntimeError, LookupError) as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.get("/memory/objects", response_model=dict)
+async def memory_objects(limit: int = Query(20, ge=1, le=1000)) -> dict[str, Any]:
+    """
+    Count the live objects by type.
+
+    Parameters:
+    limit (int): The number of types to list.
+
+    Returns:
+    dict: A dictionary containing:
+        - "baseline" (bool): True on the first call, which lists the most common types.
+        - "top" (dict): Otherwise the change in count per type since the previous call.
+
+    Raises:
+    HTTPException: 400 or 403 if the `api_key_auth` header is missing or invalid.
+
+    Notes:
+    - Runs a full garbage collection, which pauses the worker briefly.
+    """
+    return await asyncio.to_thread(memory_diagnostics.object_deltas, limit)
+
+
+@router.post("/drain", response_model=dict)
+async def drain() -> dict[str, Any]:
+    """
+    Start draining this worker before it is stopped.
+
+    Returns:
+    dict: A dictionary containing:
+        - "draining" (bool): True.
+        - "finished" (bool): True once every stream has finished or been ended.
+        - "in_flight" (int): The generations still in progress.
+        - "connections" (int): The client WebSockets still open.
+
+    Raises:
+    HTTPException: 400 or 403 if the `api_key_auth` header is missing or invalid.
+
+    Notes:
+    - The readiness probe reports not-ready from now on and new prompts are
+      refused; streams in progress get DRAIN_GRACE_PERIOD seconds to finish.
+    - Draining cannot be undone; stop the worker once "finished" is true.
+    - Calling it again only reports the progress of the drain.
+    """
+    drain_coordinator.start()
+    return drain_coordinator.status()
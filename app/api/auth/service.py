@@ -1,21 +1,25 @@
-import os
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 
-import jwt
-from jwt.exceptions import ExpiredSignatureError, InvalidTokenError
-
 from app.api.wallet.service import WalletService
+from app.settings import get_settings
+
+DEFAULT_TIER = "default"
 
 
 class AuthService:
     @staticmethod
-    def generate_token(wallet_address: str) -> str:
+    def generate_token(wallet_address: str, tier: str = DEFAULT_TIER) -> str:
+        import jwt
+
+        settings = get_settings()
         expiration = datetime.now(timezone.utc) + timedelta(
-            minutes=int(os.environ.get("ACCESS_TOKEN_EXPIRE_MINUTES", 10080))
+            minutes=settings.access_token_expire_minutes
         )
-        payload = {"wallet_address": wallet_address, "exp": expiration}
-        token = jwt.encode(payload, os.environ.get("SECRET_KEY"), algorithm="HS256")
+        # The tier selects the token budget and scheduler weight of the
+        # wallet's generations.
+        payload = {"wallet_address": wallet_address, "tier": tier, "exp": expiration}
+        token = jwt.encode(payload, settings.secret_key, algorithm="HS256")
         return token
 
     @staticmethod
@@ -24,17 +28,19 @@ class AuthService:
         wallet = wallet_service.get_wallet_by_address(address)
         if not wallet:
             return None
-        token = AuthService.generate_token(address)
+        token = AuthService.generate_token(address, wallet.get("tier") or DEFAULT_TIER)
         return token
 
     @staticmethod
     def verify_token(token: str) -> dict[str, dict]:
+        import jwt
+
         try:
             payload = jwt.decode(
-                token, os.environ.get("SECRET_KEY"), algorithms=["HS256"]
+                token, get_settings().secret_key, algorithms=["HS256"]
             )
             return payload
-        except ExpiredSignatureError:
+        except jwt.ExpiredSignatureError:
             raise ValueError("Token has expired")
-        except InvalidTokenError:
+        except jwt.InvalidTokenError:
             raise ValueError("Invalid token")
@@ -0,0 +1,209 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, Optional
+
+from app.metrics import metrics
+from app.settings import get_settings
+
+CRITICAL = "critical"
+NORMAL = "normal"
+LOW = "low"
+
+THROTTLE_ERRORS = {
+    "ProvisionedThroughputExceededException",
+    "ThrottlingException",
+    "RequestLimitExceeded",
+}
+WRITE_OPERATIONS = {
+    "PutItem",
+    "UpdateItem",
+    "DeleteItem",
+    "BatchWriteItem",
+    "TransactWriteItems",
+}
+
+_priority: ContextVar[Optional[str]] = ContextVar("dynamodb_priority", default=None)
+
+
+class CapacityExceeded(Exception):
+    """
+    Raised instead of calling DynamoDB when the request is shed, and instead
+    of the ClientError when DynamoDB throttled it. Surfaces as a 503.
+    """
+
+
+@contextmanager
+def priority(level: str) -> Iterator[None]:
+    """
+    Run the DynamoDB calls made inside the block at `level`. Without it,
+    writes are CRITICAL and reads NORMAL. Mark admin and background reads LOW
+    so they are shed first.
+    """
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class AdaptiveRateLimiter:
+    """
+    Per-table AIMD rate limiter.
+
+    It is inactive until DynamoDB throttles a request. Then the allowed rate
+    drops to DYNAMODB_BACKOFF_FACTOR times the rate observed at that moment,
+    and rises by DYNAMODB_RATE_INCREASE requests per second for every second
+    without throttling, until it has doubled past the observed rate and the
+    limiter switches off again. While it is active, LOW requests are shed as
+    soon as fewer than half of a second's tokens remain, NORMAL requests when
+    none remain, and CRITICAL requests always go through.
+    """
+
+    def __init__(self) -> None:
+        self.rate: Optional[float] = None
+        self.tokens = 0.0
+        self.ceiling = 0.0
+        self.updated = time.monotonic()
+        self._window_start = self.updated
+        self._window_count = 0
+        self.observed_rate = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, level: str) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self._observe(now)
+            if self.rate is not None:
+                self._refill(now)
+            if self.rate is None:
+                return True
+            if level == CRITICAL:
+                self.tokens -= 1
+                return True
+            reserve = self.rate / 2 if level == LOW else 1
+            if self.tokens < reserve:
+                return False
+            self.tokens -= 1
+            return True
+
+    def on_throttle(self) -> None:
+        with self._lock:
+            settings = get_settings()
+            factor = settings.dynamodb_backoff_factor
+            minimum = settings.dynamodb_min_rate
+            current = self.observed_rate if self.rate is None else min(self.rate, self.observed_rate)
+            if self.rate is None:
+                self.ceiling = max(self.observed_rate, minimum) * 2
+                self.tokens = 0.0
+            self.rate = max(current * factor, minimum)
+            self.tokens = min(self.tokens, self.rate)
+            self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self.updated
+        self.updated = now
+        self.rate += get_settings().dynamodb_rate_increase * elapsed
+        if self.rate >= self.ceiling:
+            self.rate = None
+            return
+        self.tokens = min(self.tokens + self.rate * elapsed, self.rate)
+
+    def _observe(self, now: float) -> None:
+        self._window_count += 1
+        elapsed = now - self._window_start
+        if elapsed >= 1:
+            self.observed_rate = self._window_count / elapsed
+            self._window_start = now
+            self._window_count = 0
+
+
+class CapacityTracker:
+    """
+    Accounts for the capacity consumed by every DynamoDB call and applies the
+    per-table adaptive rate limiters.
+
+    `install` hooks into a boto3 client so that every call requests
+    ReturnConsumedCapacity, is admitted by the limiter of its table, and
+    records its consumed capacity, throttles and retries as metrics.
+    """
+
+    def __init__(self) -> None:
+        self.limiters: dict[str, AdaptiveRateLimiter] = {}
+
+    def install(self, client: Any) -> None:
+        events = client.meta.events
+        events.register("before-parameter-build.dynamodb", self._before_parameter_build)
+        events.register("after-call.dynamodb", self._after_call)
+
+    def limiter(self, table: str) -> AdaptiveRateLimiter:
+        limiter = self.limiters.get(table)
+        if limiter is None:
+            limiter = self.limiters.setdefault(table, AdaptiveRateLimiter())
+        return limiter
+
+    def rates(self) -> dict:
+        return {
+            (("table", table),): limiter.rate
+            for table, limiter in self.limiters.items()
+            if limiter.rate is not None
+        }
+
+    def _before_parameter_build(
+        self, params: dict[str, Any], model: Any, context: dict[str, Any], **kwargs: Any
+    ) -> None:
+        # Control-plane calls (e.g. DescribeTable) consume no capacity.
+        if "ReturnConsumedCapacity" not in model.input_shape.members:
+            return
+        params.setdefault("ReturnConsumedCapacity", "TOTAL")
+        operation = model.name
+        level = _priority.get() or (CRITICAL if operation in WRITE_OPERATIONS else NORMAL)
+        tables = _tables(params)
+        context["capacity_tables"] = tables
+        for table in tables:
+            if not self.limiter(table).acquire(level):
+                metrics.inc("dynamodb_shed_total", table=table, operation=operation, priority=level)
+                raise CapacityExceeded(f"DynamoDB capacity exhausted for {table}")
+
+    def _after_call(
+        self, parsed: dict[str, Any], model: Any, context: dict[str, Any], **kwargs: Any
+    ) -> None:
+        tables = context.get("capacity_tables")
+        if tables is None:
+            return
+        operation = model.name
+        kind = "write" if operation in WRITE_OPERATIONS else "read"
+        consumed = parsed.get("ConsumedCapacity") or []
+        for entry in consumed if isinstance(consumed, list) else [consumed]:
+            metrics.inc(
+                f"dynamodb_consumed_{kind}_units_total",
+                entry.get("CapacityUnits", 0),
+                table=entry.get("TableName", ""),
+                operation=operation,
+            )
+        retries = parsed.get("ResponseMetadata", {}).get("RetryAttempts", 0)
+        code = parsed.get("Error", {}).get("Code")
+        # Unprocessed batch items are how batch operations report throttling.
+        throttled = code in THROTTLE_ERRORS or bool(
+            parsed.get("UnprocessedItems") or parsed.get("UnprocessedKeys")
+        )
+        for table in tables:
+            metrics.inc("dynamodb_requests_total", table=table, operation=operation)
+            if retries:
+                metrics.inc("dynamodb_retries_total", retries, table=table, operation=operation)
+            if throttled:
+                metrics.inc("dynamodb_throttled_total", table=table, operation=operation)
+                self.limiter(table).on_throttle()
+        if code in THROTTLE_ERRORS:
+            raise CapacityExceeded(f"DynamoDB is throttling {operation} requests")
+
+
+def _tables(params: dict[str, Any]) -> list[str]:
+    if "TableName" in params:
+        return [params["TableName"]]
+    return list(params.get("RequestItems", {}))
+
+
+capacity_tracker = CapacityTracker()
+metrics.register_gauge("dynamodb_rate_limit", capacity_tracker.rates)
@@ -1,24 +1,100 @@
-import os
+import base64
+import json
 import uuid
 from datetime import datetime, timezone
-from typing import Union
+from functools import lru_cache
+from typing import Any, Iterable, Optional, Union
+
+from botocore.exceptions import ClientError
+from cachetools import TLRUCache
+
+from app.api.db.capacity import capacity_tracker
+from app.memory import deep_sizeof, memory_diagnostics
+from app.prompt_templates import prompt_templates
+from app.settings import get_settings
+
+
+@lru_cache(maxsize=None)
+def get_dynamodb_resource():
+    """
+    Return the process-wide DynamoDB resource.
+
+    Creating a boto3 resource loads the service model and sets up a connection
+    pool, so it is built once (during the startup warm-up) and shared by every
+    service instead of once per call. boto3 itself is imported here rather than
+    at module level so that importing the application stays cheap. Every call
+    made through it is accounted for and rate limited by `capacity_tracker`.
+    """
+    import boto3
+
+    resource = boto3.resource("dynamodb", region_name=get_settings().aws_region)
+    capacity_tracker.install(resource.meta.client)
+    return resource
+
+
+def event_timestamp(when: Optional[datetime] = None) -> str:
+    """
+    Format a time (now by default) the way event `start_ts` and `end_ts` are
+    stored: ISO 8601 in UTC without an offset. The event queries compare these
+    strings, so every caller has to use the same convention.
+    """
+    if when is None:
+        when = datetime.now(timezone.utc)
+    elif when.tzinfo is not None:
+        when = when.astimezone(timezone.utc)
+    return when.replace(tzinfo=None).isoformat()
+
+
+def encode_cursor(last_evaluated_key: Optional[dict[str, Any]]) -> Optional[str]:
+    """
+    Encode a query's LastEvaluatedKey as an opaque cursor for the next page.
+    """
+    if not last_evaluated_key:
+        return None
+    raw = json.dumps(last_evaluated_key, separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict[str, Any]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        key = json.loads(raw)
+    except ValueError:
+        raise ValueError("Invalid cursor")
+    if not isinstance(key, dict):
+        raise ValueError("Invalid cursor")
+    return key
+
+
+def projection(fields: Optional[Iterable[str]]) -> dict[str, Any]:
+    """
+    Build the query arguments that only return `fields`. Attribute names are
+    always aliased since some (e.g. `timestamp`) are DynamoDB reserved words.
+    """
+    if not fields:
+        return {}
+    names = {f"#p{i}": field for i, field in enumerate(fields)}
+    return {
+        "ProjectionExpression": ", ".join(names),
+        "ExpressionAttributeNames": names,
+    }
 
-import boto3
-from aiohttp import ClientError
-from boto3.dynamodb.conditions import Key, Attr, And
-from cachetools import TTLCache
 
 class DatabaseOperations:
+    # Shared by all instances; the classmethods below build a fresh instance per
+    # call, so a per-instance cache would never be hit. Entries expire
+    # EVENTS_CACHE_TTL seconds after they are stored, as set at that moment.
+    query_cache = TLRUCache(
+        maxsize=100, ttu=lambda key, value, now: now + get_settings().events_cache_ttl
+    )
+
     def __init__(self) -> None:
-        self.dynamodb = boto3.resource(
-            "dynamodb", region_name=os.environ.get("AWS_REGION")
-        )
+        self.dynamodb = get_dynamodb_resource()
         self.football_results = self.dynamodb.Table("bs-football-results")
         self.football_context_prompts = self.dynamodb.Table(
             "bs-football-context-prompts"
         )
         self.user_contacts = self.dynamodb.Table("bs-user-contacts")
-        self.query_cache = TTLCache(maxsize=100, ttl=432000)
 
     @classmethod
     def save_prediction(
@@ -46,6 +122,8 @@ class DatabaseOperations:
         - If no existing prediction is found, it generates a unique ID and saves the new prediction along
         with the timestamp.
         """
+        from boto3.dynamodb.conditions import Key
+
         timestamp = datetime.now(timezone.utc).isoformat()
         prediction_id = str(uuid.uuid4())
         try:
@@ -82,31 +160,33 @@ class DatabaseOperations:
 
     @classmethod
     async def get_daily_event(cls, iso_date_str: str) -> dict[str, str | int]:
+        from boto3.dynamodb.conditions import Attr
+
         try:
             # Query the DynamoDB table with date range filter
             return cls().football_context_prompts.scan(
-                FilterExpression=boto3.dynamodb.conditions.Attr("start_ts").lte(
-                    iso_date_str
-                )
-                & boto3.dynamodb.conditions.Attr("end_ts").gte(iso_date_str)
+                FilterExpression=Attr("start_ts").lte(iso_date_str)
+                & Attr("end_ts").gte(iso_date_str)
             )
         except ClientError as e:
             raise Exception(e.response["Error"]["Message"])
 
     @classmethod
     async def get_next_event(cls, iso_date_str: str) -> dict[str, str | int]:
+        from boto3.dynamodb.conditions import Attr
+
         try:
             # Query the DynamoDB table for events that start after the current time
             return cls().football_context_prompts.scan(
-                FilterExpression=boto3.dynamodb.conditions.Attr("start_ts").gte(
-                    iso_date_str
-                )
+                FilterExpression=Attr("start_ts").gte(iso_date_str)
             )
         except ClientError as e:
             raise Exception(e.response["Error"]["Message"])
 
     @classmethod
     async def get_all_events(cls, iso_date_str: str):
+        from boto3.dynamodb.conditions import And, Attr
+
         if cls().query_cache.get("events"):
             return cls().query_cache.get("events")
         try:
@@ -117,19 +197,36 @@ class DatabaseOperations:
             )
             )
             sorted_events = sorted(events["Items"], key=lambda x: x["start_ts"])
+            prompt_templates.preload(sorted_events)
             cls().query_cache["events"] = sorted_events
             return sorted_events
         except ClientError as e:
             raise Exception(e.response["Error"]["Message"])
 
     @classmethod
-    async def get_user_events(cls, address: str):
+    async def get_user_events(
+        cls, address: str, fields: Optional[Iterable[str]] = None
+    ) -> list[dict[str, Any]]:
+        """
+        Return every prediction of an address, following all result pages and
+        only returning `fields` when given.
+        """
+        from boto3.dynamodb.conditions import Key
+
+        kwargs: dict[str, Any] = {
+            "IndexName": "address-index",
+            "KeyConditionExpression": Key("address").eq(address),
+            **projection(fields),
+        }
+        table = cls().football_results
+        items: list[dict[str, Any]] = []
         try:
-            user_events = cls().football_results.query(
-                IndexName="address-index",
-                KeyConditionExpression=boto3.dynamodb.conditions.Key("address").eq(address)
-            )
-            return user_events["Items"]
+            while True:
+                user_events = table.query(**kwargs)
+                items.extend(user_events["Items"])
+                if "LastEvaluatedKey" not in user_events:
+                    return items
+                kwargs["ExclusiveStartKey"] = user_events["LastEvaluatedKey"]
         except ClientError as e:
             raise Exception(e.response["Error"]["Message"])
 
@@ -137,6 +234,8 @@ class DatabaseOperations:
     async def available_to_predict(
         cls, address: str, team: str
     ) -> dict[str, str | int]:
+        from boto3.dynamodb.conditions import Key
+
         try:
             return cls().football_results.query(
                 IndexName="address-team-index",
@@ -145,4 +244,9 @@ class DatabaseOperations:
                 ),
             )
         except ClientError as e:
-            raise Exception(e.response["Error"]["Message"])
\ No newline at end of file
+            raise Exception(e.response["Error"]["Message"])
+
+
+memory_diagnostics.register(
+    "events_cache", lambda: deep_sizeof(dict(DatabaseOperations.query_cache.items()))
+)
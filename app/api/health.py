@@ -1,4 +1,7 @@
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from app.startup import readiness_report
 
 router = APIRouter()
 
@@ -14,5 +17,26 @@ async def health_check():
 
     Notes:
     - This endpoint can be used by monitoring tools to check if the application is up and running.
+    - It is a liveness probe only; use `/ready` to decide whether to route traffic to this instance.
     """
     return {"status": "Application is running"}
+
+
+@router.get("/ready", response_model=dict)
+async def readiness_check():
+    """
+    Check whether the application is warmed up and its dependencies are reachable.
+
+    Returns:
+    dict: A dictionary containing:
+        - "ready" (bool): True if the instance can serve traffic.
+        - "warmed_up" (bool): True once the startup warm-up has completed.
+        - "draining" (bool): True once the instance is draining before shutdown.
+        - "checks" (dict): The status ("ok", "error") and "latency_ms" of each dependency.
+
+    Notes:
+    - Responds with a 503 status code while the instance is not ready.
+    - Dependency probes are cached for READINESS_CHECK_INTERVAL seconds.
+    """
+    report = await readiness_report()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
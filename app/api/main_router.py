@@ -1,7 +1,9 @@
 from fastapi import APIRouter
 
+from app.api.admin import router as admin_router
 from app.api.auth.controller import router as auth_router
 from app.api.health import router as health_router
+from app.api.metrics import router as metrics_router
 from app.api.predictions.controller import router as predictions_router
 from app.api.wallet.controller import router as wallet_router
 
@@ -11,5 +13,7 @@ api_router.include_router(wallet_router, prefix="/wallet", tags=["wallet"])
 api_router.include_router(predictions_router, prefix="/prediction", tags=["prediction"])
 api_router.include_router(auth_router, prefix="/auth", tags=["auth"])
 api_router.include_router(health_router, prefix="/ping", tags=["health"])
+api_router.include_router(metrics_router, prefix="/metrics", tags=["metrics"])
+api_router.include_router(admin_router, prefix="/admin", tags=["admin"])
 
 __all__ = ["api_router"]
@@ -0,0 +1,17 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.metrics import metrics
+
+router = APIRouter()
+
+
+@router.get("/", response_class=PlainTextResponse)
+async def get_metrics() -> str:
+    """
+    Export the application metrics.
+
+    Returns:
+    str: Every counter and gauge in the Prometheus text exposition format.
+    """
+    return metrics.render()
@@ -0,0 +1,100 @@
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from app.api.db.capacity import LOW, priority
+from app.api.db.db import get_dynamodb_resource
+from app.memory import deep_sizeof, memory_diagnostics
+from app.settings import get_settings
+
+RESULTS_TABLE = "bs-football-results"
+
+
+class PredictionAggregates:
+    """
+    Per-team counts of each prediction.
+
+    Counters are updated in memory on every saved prediction, and periodically
+    rebuilt from a parallel scan of the results table so that they converge
+    with writes made by other workers. Each team's stats are kept as a ready
+    snapshot, so reading them does not depend on how many predictions exist.
+    """
+
+    def __init__(self) -> None:
+        self._counts: dict[str, dict[str, int]] = defaultdict(dict)
+        self._snapshots: dict[str, dict[str, Any]] = {}
+        self.reconciled_at: Optional[str] = None
+
+    def record(self, team: str, prediction: str) -> None:
+        counts = self._counts[team]
+        counts[prediction] = counts.get(prediction, 0) + 1
+        self._snapshots.pop(team, None)
+
+    def stats(self, team: str) -> dict[str, Any]:
+        snapshot = self._snapshots.get(team)
+        if snapshot is None:
+            counts = dict(self._counts.get(team, {}))
+            snapshot = {
+                "team": team,
+                "total": sum(counts.values()),
+                "predictions": counts,
+                "reconciled_at": self.reconciled_at,
+            }
+            self._snapshots[team] = snapshot
+        return snapshot
+
+    async def reconcile(self, segments: Optional[int] = None) -> None:
+        """
+        Rebuild every counter from a parallel scan of the results table.
+        """
+        segments = segments or get_settings().stats_scan_segments
+        results = await asyncio.gather(
+            *(
+                asyncio.to_thread(self._scan_segment, segment, segments)
+                for segment in range(segments)
+            )
+        )
+        counts: dict[str, dict[str, int]] = defaultdict(dict)
+        for partial in results:
+            for (team, prediction), count in partial.items():
+                counts[team][prediction] = counts[team].get(prediction, 0) + count
+        self._counts = counts
+        self._snapshots = {}
+        self.reconciled_at = datetime.now(timezone.utc).isoformat()
+
+    @staticmethod
+    def _scan_segment(segment: int, total_segments: int) -> dict[tuple[str, str], int]:
+        table = get_dynamodb_resource().Table(RESULTS_TABLE)
+        kwargs: dict[str, Any] = {
+            "Segment": segment,
+            "TotalSegments": total_segments,
+            "ProjectionExpression": "#team, #prediction",
+            "ExpressionAttributeNames": {"#team": "team", "#prediction": "prediction"},
+        }
+        counts: dict[tuple[str, str], int] = defaultdict(int)
+        while True:
+            with priority(LOW):
+                response = table.scan(**kwargs)
+            for item in response.get("Items", []):
+                if "team" in item and "prediction" in item:
+                    counts[(item["team"], item["prediction"])] += 1
+            if "LastEvaluatedKey" not in response:
+                return counts
+            kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+async def run_reconciliation() -> None:
+    while True:
+        try:
+            await prediction_aggregates.reconcile()
+        except Exception as e:
+            print("Unable to reconcile prediction stats:", e)
+        await asyncio.sleep(get_settings().stats_reconcile_interval)
+
+
+prediction_aggregates = PredictionAggregates()
+memory_diagnostics.register(
+    "prediction_aggregates",
+    lambda: deep_sizeof([prediction_aggregates._counts, prediction_aggregates._snapshots]),
+)
@@ -0,0 +1,69 @@
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+from app.api.predictions.scheduler import inference_scheduler
+from app.settings import get_settings
+
+
+class UpstreamLoad:
+    """
+    Process-wide view of the load on the inference server: the number of
+    generations in flight and a moving average of the time to first token.
+    """
+
+    in_flight: int = 0
+    latency_ewma: float = 0.0
+    # Weight of the newest sample in the moving average.
+    alpha: float = 0.2
+
+    @classmethod
+    @contextmanager
+    def track(cls) -> Iterator[None]:
+        cls.in_flight += 1
+        try:
+            yield
+        finally:
+            cls.in_flight -= 1
+
+    @classmethod
+    def record_latency(cls, seconds: float) -> None:
+        if cls.latency_ewma == 0.0:
+            cls.latency_ewma = seconds
+        else:
+            cls.latency_ewma += cls.alpha * (seconds - cls.latency_ewma)
+
+    @classmethod
+    def queue_depth(cls) -> int:
+        return cls.in_flight + inference_scheduler.waiting
+
+    @classmethod
+    def is_overloaded(cls) -> bool:
+        settings = get_settings()
+        return (
+            cls.queue_depth() >= settings.budget_queue_threshold
+            or cls.latency_ewma >= settings.budget_latency_threshold
+        )
+
+
+def resolve_token_budget(event: dict[str, Any], tier: str) -> int:
+    """
+    Return the `max_tokens` for a generation.
+
+    The budget comes from the event row: a `token_budgets` map keyed by tier,
+    falling back to the event's `max_tokens` and then to DEFAULT_MAX_TOKENS.
+    While the inference server is overloaded the budget is scaled down by
+    BUDGET_REDUCTION_FACTOR, but never below MIN_MAX_TOKENS.
+    """
+    settings = get_settings()
+    budgets = event.get("token_budgets") or {}
+    budget = int(
+        budgets.get(tier)
+        or event.get("max_tokens")
+        or settings.default_max_tokens
+    )
+    if UpstreamLoad.is_overloaded():
+        budget = max(
+            min(budget, settings.min_max_tokens),
+            int(budget * settings.budget_reduction_factor),
+        )
+    return budget
@@ -1,9 +1,12 @@
-from typing import Dict, List, Union
-from fastapi import APIRouter, HTTPException, Request
+from typing import Dict, List, Optional, Union
+from fastapi import APIRouter, HTTPException, Query, Request
 from pydantic import BaseModel
 
+from app.api.db.capacity import CapacityExceeded
+from app.serialization import FastJSONResponse
 from app.utils import check_api_key
 
+from .aggregates import prediction_aggregates
 from .service import PredictionService
 
 router = APIRouter()
@@ -20,6 +23,17 @@ class PredictionHistoryItem(BaseModel):
 
 class PredictionHistoryResponse(BaseModel):
     history: List[PredictionHistoryItem]
+    next_cursor: Optional[str] = None
+
+class PredictionStatsResponse(BaseModel):
+    team: str
+    total: int
+    predictions: Dict[str, int]
+    reconciled_at: Optional[str]
+
+
+HISTORY_FIELDS = tuple(PredictionHistoryItem.model_fields)
+
 
 class PredictionRequest(BaseModel):
     prediction: str
@@ -67,6 +81,7 @@ async def create_prediction(
     Raises:
     HTTPException:
         - 500 Internal Server Error: If there is an unhandled exception during the process.
+        - 503 Service Unavailable: If DynamoDB is throttling requests.
 
     Notes:
     - The endpoint expects a POST request with a JSON body containing the `prediction` and `address`.
@@ -82,6 +97,8 @@ async def create_prediction(
             return {"result": result}
         else:
             return {"error": result}
+    except CapacityExceeded as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -100,6 +117,7 @@ async def get_daily_event(
     Raises:
     HTTPException:
         - 500 Internal Server Error: If there is an unhandled exception during the process.
+        - 503 Service Unavailable: If DynamoDB is throttling requests.
 
     Notes:
     - The endpoint is a GET request and does not require any parameters in the request body.
@@ -110,6 +128,8 @@ async def get_daily_event(
     try:
         result = await prediction_service.get_daily_event()
         return {"result": result}
+    except CapacityExceeded as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -132,6 +152,7 @@ async def available_to_predict(
     Raises:
     HTTPException:
         - 500 Internal Server Error: If there is an unhandled exception during the process.
+        - 503 Service Unavailable: If DynamoDB is throttling requests.
 
     Notes:
     - The endpoint is a GET request that requires an `address` query parameter.
@@ -142,37 +163,78 @@ async def available_to_predict(
     try:
         available = await prediction_service.available_to_predict(address)
         return {"available": available}
+    except CapacityExceeded as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/history", response_model=PredictionHistoryResponse)
-async def get_address_history(address: str) -> dict[str, list[dict[str, int]]]:
+async def get_address_history(
+    address: str,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+) -> FastJSONResponse:
     """
     Retrieve the prediction history for a given address.
 
     Parameters:
     address (str): The address for which to retrieve the prediction history.
+    limit (int, optional): The maximum number of records to return.
+    cursor (str, optional): The `next_cursor` of the previous page.
 
     Returns:
     dict: A dictionary containing:
         - "history" (list): A list of prediction records associated with the provided address.
+        - "next_cursor" (str | None): The cursor of the next page, or None if this is the last page.
 
     Raises:
     HTTPException:
+        - 400 Bad Request: If the cursor is invalid.
         - 500 Internal Server Error: If there is an unhandled exception during the process.
+        - 503 Service Unavailable: If DynamoDB is throttling requests.
 
     Notes:
     - The endpoint is a GET request that requires an `address` query parameter.
     - If an error occurs, the endpoint returns a 500 status code with a detailed error message.
+    - Only the fields of the response model are read from the database, and the response is returned
+      directly, skipping re-validation of every item against the response model.
     """
     try:
-        history = await prediction_service.get_address_history(address)
-        return {"history": history}
+        history, next_cursor = await prediction_service.get_address_history(
+            address, limit=limit, cursor=cursor, fields=HISTORY_FIELDS
+        )
+        return FastJSONResponse({"history": history, "next_cursor": next_cursor})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except CapacityExceeded as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/stats", response_model=PredictionStatsResponse)
+async def get_prediction_stats(team: str) -> dict[str, str | int | dict | None]:
+    """
+    Retrieve how many users made each prediction for a given team.
+
+    Parameters:
+    team (str): The team (match) for which to retrieve the prediction counts.
+
+    Returns:
+    dict: A dictionary containing:
+        - "team" (str): The requested team.
+        - "total" (int): The number of predictions for the team.
+        - "predictions" (dict): The number of users per prediction.
+        - "reconciled_at" (str | None): When the counts were last rebuilt from the database.
+
+    Notes:
+    - The counts are maintained in memory as predictions are saved and reconciled with the database every
+      STATS_RECONCILE_INTERVAL seconds, so the endpoint does not read the database.
+    """
+    return prediction_aggregates.stats(team)
+
+
 @router.get("/next", response_model=dict[str, str])
 async def get_next_event(
     # api_key: str = Depends(get_api_key)
@@ -187,6 +249,7 @@ async def get_next_event(
     Raises:
     HTTPException:
         - 500 Internal Server Error: If there is an unhandled exception during the process.
+        - 503 Service Unavailable: If DynamoDB is throttling requests.
 
     Notes:
     - The endpoint is a GET request that does not require any parameters.
@@ -195,6 +258,8 @@ async def get_next_event(
     try:
         result = await PredictionService.get_next_event()
         return {"result": result}
+    except CapacityExceeded as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
@@ -213,6 +278,7 @@ async def get_next_event_for_address(address: str):
     Raises:
     HTTPException:
         - 500 Internal Server Error: If there is an unhandled exception during the process.
+        - 503 Service Unavailable: If DynamoDB is throttling requests.
 
     Notes:
     - The endpoint is a GET request that requires an address parameter.
@@ -221,5 +287,7 @@ async def get_next_event_for_address(address: str):
     try:
         result = await PredictionService.get_address_prediction_event(address)
         return {"team": result}
+    except CapacityExceeded as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -0,0 +1,192 @@
+from typing import Any, Optional
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from app.api.predictions.lifecycle import event_lifecycle
+from app.memory import deep_sizeof, memory_diagnostics
+from app.metrics import metrics
+from app.settings import get_settings
+
+# Polynomial base for hashing a shingle's code points into one integer.
+_SHINGLE_BASE = np.uint64(1_000_003)
+_MASK32 = np.uint64(32)
+
+
+def _mix(values: np.ndarray) -> np.ndarray:
+    # splitmix64 finaliser: spreads the polynomial hashes over all 64 bits.
+    values = values ^ (values >> np.uint64(30))
+    values = values * np.uint64(0xBF58476D1CE4E5B9)
+    values = values ^ (values >> np.uint64(27))
+    values = values * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+def shingle_hashes(text: str, size: int) -> np.ndarray:
+    """
+    Return the distinct 64-bit hashes of the `size`-character shingles of
+    `text`, after lower-casing it and collapsing whitespace.
+    """
+    normalised = " ".join(text.lower().split())
+    codes = np.frombuffer(normalised.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    if len(codes) == 0:
+        return codes
+    size = min(size, len(codes))
+    powers = np.cumprod(np.full(size, _SHINGLE_BASE, dtype=np.uint64)) // _SHINGLE_BASE
+    with np.errstate(over="ignore"):
+        return np.unique(_mix(sliding_window_view(codes, size) @ powers))
+
+
+class MinHasher:
+    """
+    MinHash signatures with `permutations` multiply-shift hash functions, and
+    their LSH band keys: the signature is cut into `bands` bands, and two
+    prompts become candidates when any band is identical.
+    """
+
+    def __init__(self, permutations: int, bands: int, shingle_size: int, seed: int = 1) -> None:
+        if permutations % bands:
+            raise ValueError("The number of permutations must be a multiple of the bands")
+        rng = np.random.default_rng(seed)
+        self.shingle_size = shingle_size
+        self.bands = bands
+        # Odd multipliers keep multiply-shift hashing universal.
+        self._a = rng.integers(1, 2**63, size=(permutations, 1), dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2**63, size=(permutations, 1), dtype=np.uint64)
+        self._band_mix = rng.integers(1, 2**63, size=permutations // bands, dtype=np.uint64)
+
+    def signature(self, text: str) -> tuple[np.ndarray, np.ndarray]:
+        hashes = shingle_hashes(text, self.shingle_size)
+        if len(hashes) == 0:
+            hashes = np.zeros(1, dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            permuted = (self._a * hashes + self._b) >> _MASK32
+            signature = permuted.min(axis=1).astype(np.uint32)
+            band_keys = signature.reshape(self.bands, -1).astype(np.uint64) @ self._band_mix
+        return signature, band_keys
+
+
+class MinHashIndex:
+    """
+    Fixed-size LSH index of signatures and their stored responses. Once full,
+    the oldest entry is overwritten.
+    """
+
+    def __init__(self, capacity: int, permutations: int, bands: int) -> None:
+        self.signatures = np.zeros((capacity, permutations), dtype=np.uint32)
+        self.band_keys = np.zeros((capacity, bands), dtype=np.uint64)
+        self.responses: list[Any] = [None] * capacity
+        self.size = 0
+        self._next = 0
+
+    def add(self, signature: np.ndarray, band_keys: np.ndarray, response: Any) -> None:
+        slot = self._next
+        self.signatures[slot] = signature
+        self.band_keys[slot] = band_keys
+        self.responses[slot] = response
+        self._next = (slot + 1) % len(self.responses)
+        self.size = min(self.size + 1, len(self.responses))
+
+    def query(
+        self, signature: np.ndarray, band_keys: np.ndarray, threshold: float
+    ) -> Optional[tuple[float, Any]]:
+        """
+        Return the most similar stored entry and its estimated Jaccard
+        similarity, if it reaches `threshold`.
+        """
+        candidates = np.flatnonzero((self.band_keys[: self.size] == band_keys).any(axis=1))
+        if len(candidates) == 0:
+            return None
+        similarity = (self.signatures[candidates] == signature).mean(axis=1)
+        best = int(similarity.argmax())
+        if similarity[best] < threshold:
+            return None
+        return float(similarity[best]), self.responses[candidates[best]]
+
+
+class PromptDeduplicator:
+    """
+    Serves stored responses to near-duplicate prompts about the same event.
+
+    Every completed generation is stored in the event's MinHash index under
+    the signature of its prompt's DEDUP_SHINGLE_SIZE-character shingles. A
+    later prompt whose estimated Jaccard similarity with a stored prompt
+    reaches DEDUP_THRESHOLD gets that response instead of a new generation.
+    Each event keeps at most DEDUP_MAX_ENTRIES prompts, and its index is
+    dropped when the event ends. Disabled unless DEDUP_ENABLED is set.
+    """
+
+    def __init__(self) -> None:
+        self._hasher: Optional[MinHasher] = None
+        self._parameters: Optional[tuple[int, int, int]] = None
+        self.indexes: dict[str, MinHashIndex] = {}
+
+    @property
+    def hasher(self) -> MinHasher:
+        settings = get_settings()
+        parameters = (
+            settings.dedup_permutations, settings.dedup_bands, settings.dedup_shingle_size
+        )
+        if parameters != self._parameters:
+            # Signatures made with other parameters cannot be compared.
+            self._hasher = MinHasher(*parameters)
+            self._parameters = parameters
+            self.indexes.clear()
+        return self._hasher
+
+    @property
+    def enabled(self) -> bool:
+        return get_settings().dedup_enabled
+
+    @property
+    def threshold(self) -> float:
+        return get_settings().dedup_threshold
+
+    def signature(self, prompt: str) -> tuple[np.ndarray, np.ndarray]:
+        return self.hasher.signature(prompt)
+
+    def lookup(
+        self,
+        team: str,
+        signature: tuple[np.ndarray, np.ndarray],
+        max_tokens: Optional[int] = None,
+        threshold: Optional[float] = None,
+    ) -> Optional[list[str]]:
+        index = self.indexes.get(team)
+        match = None
+        if index is not None:
+            match = index.query(*signature, self.threshold if threshold is None else threshold)
+        if match is None or (max_tokens is not None and len(match[1]) > max_tokens):
+            metrics.inc("dedup_misses_total")
+            return None
+        metrics.inc("dedup_hits_total")
+        return match[1]
+
+    def store(self, team: str, signature: tuple[np.ndarray, np.ndarray], tokens: list[str]) -> None:
+        index = self.indexes.get(team)
+        if index is None:
+            index = MinHashIndex(
+                get_settings().dedup_max_entries,
+                permutations=len(signature[0]),
+                bands=len(signature[1]),
+            )
+            self.indexes[team] = index
+        index.add(*signature, tokens)
+
+    def evict(self, team: str) -> None:
+        self.indexes.pop(team, None)
+
+    def entries(self) -> int:
+        return sum(index.size for index in self.indexes.values())
+
+    def memory_usage(self) -> dict[str, int]:
+        return {
+            team: index.signatures.nbytes + index.band_keys.nbytes + deep_sizeof(index.responses)
+            for team, index in self.indexes.items()
+        }
+
+
+prompt_deduplicator = PromptDeduplicator()
+event_lifecycle.on_event_end(lambda event: prompt_deduplicator.evict(event["team"]))
+metrics.register_gauge("dedup_index_entries", prompt_deduplicator.entries)
+memory_diagnostics.register("dedup_indexes", prompt_deduplicator.memory_usage)
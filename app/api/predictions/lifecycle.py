@@ -0,0 +1,153 @@
+import asyncio
+from datetime import datetime, timezone
+from typing import Any, Callable, Optional
+
+from app.api.db.capacity import LOW, priority
+from app.api.db.db import DatabaseOperations, event_timestamp
+from app.prompt_templates import prompt_templates
+from app.settings import get_settings
+from app.startup import check_inference_server
+
+EventHook = Callable[[dict[str, Any]], None]
+
+
+def parse_ts(value: str) -> datetime:
+    # Event timestamps without an offset are UTC (see `event_timestamp`).
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+class EventLifecycle:
+    """
+    Background scheduler that follows the event timeline.
+
+    It keeps the events that have not ended yet, refreshed every
+    EVENT_TIMELINE_REFRESH seconds, and wakes up at each event boundary:
+    EVENT_PREWARM_LEAD seconds before `start_ts` it compiles the prompt
+    template and warms the inference server connection, at `start_ts` and
+    `end_ts` it swaps the active events cache in one assignment, and after
+    `end_ts` it drops the event's per-event state and runs the end hooks.
+    """
+
+    def __init__(self) -> None:
+        self.timeline: list[dict[str, Any]] = []
+        self.refreshed_at: Optional[datetime] = None
+        self._handled: set[tuple[str, str, str]] = set()
+        self._end_hooks: list[EventHook] = []
+
+    def on_event_end(self, hook: EventHook) -> None:
+        self._end_hooks.append(hook)
+
+    async def refresh_timeline(self) -> None:
+        self.timeline = sorted(
+            await asyncio.to_thread(self._scan_upcoming), key=lambda e: e["start_ts"]
+        )
+        self.refreshed_at = datetime.now(timezone.utc)
+
+    def boundaries(self) -> list[tuple[datetime, str, dict[str, Any]]]:
+        lead = get_settings().event_prewarm_lead
+        boundaries = []
+        for event in self.timeline:
+            start, end = parse_ts(event["start_ts"]), parse_ts(event["end_ts"])
+            boundaries.append((start.timestamp() - lead, "prewarm", event))
+            boundaries.append((start.timestamp(), "start", event))
+            boundaries.append((end.timestamp(), "end", event))
+        return [
+            (datetime.fromtimestamp(when, timezone.utc), kind, event)
+            for when, kind, event in sorted(boundaries, key=lambda b: b[0])
+        ]
+
+    async def run(self) -> None:
+        while True:
+            try:
+                refresh = get_settings().event_timeline_refresh
+                now = datetime.now(timezone.utc)
+                if (
+                    self.refreshed_at is None
+                    or (now - self.refreshed_at).total_seconds() >= refresh
+                ):
+                    await self.refresh_timeline()
+                await self.handle_due(now)
+                sleep = refresh - (now - self.refreshed_at).total_seconds()
+                upcoming = self.next_boundary(now)
+                if upcoming is not None:
+                    sleep = min(sleep, (upcoming - now).total_seconds())
+            except Exception as e:
+                print("Event lifecycle error:", e)
+                sleep = refresh
+            await asyncio.sleep(max(sleep, 0.1))
+
+    def next_boundary(self, now: datetime) -> Optional[datetime]:
+        for when, kind, event in self.boundaries():
+            if when > now and self._key(kind, event) not in self._handled:
+                return when
+        return None
+
+    async def handle_due(self, now: datetime) -> None:
+        swap = False
+        for when, kind, event in self.boundaries():
+            key = self._key(kind, event)
+            if when > now or key in self._handled:
+                continue
+            self._handled.add(key)
+            if kind == "prewarm":
+                await self.prewarm(event)
+            elif kind == "start":
+                swap = True
+            else:
+                swap = True
+                self.evict(event)
+        if swap:
+            self.swap_active_events(now)
+
+    async def prewarm(self, event: dict[str, Any]) -> None:
+        prompt_templates.for_event(event)
+        try:
+            await check_inference_server()
+        except Exception as e:
+            print(f"Unable to warm the inference server for {event['team']}:", e)
+
+    def swap_active_events(self, now: datetime) -> None:
+        active = [
+            event
+            for event in self.timeline
+            if parse_ts(event["start_ts"]) <= now <= parse_ts(event["end_ts"])
+        ]
+        prompt_templates.preload(active)
+        DatabaseOperations.query_cache["events"] = active
+
+    def evict(self, event: dict[str, Any]) -> None:
+        prompt_templates.invalidate(event["team"])
+        self.timeline = [e for e in self.timeline if e is not event]
+        self._handled = {k for k in self._handled if k[1] != event["team"]}
+        for hook in self._end_hooks:
+            try:
+                hook(event)
+            except Exception as e:
+                print(f"Event end hook failed for {event['team']}:", e)
+
+    @staticmethod
+    def _key(kind: str, event: dict[str, Any]) -> tuple[str, str, str]:
+        return kind, event["team"], event["start_ts"]
+
+    @staticmethod
+    def _scan_upcoming() -> list[dict[str, Any]]:
+        from boto3.dynamodb.conditions import Attr
+
+        table = DatabaseOperations().football_context_prompts
+        kwargs: dict[str, Any] = {
+            "FilterExpression": Attr("end_ts").gte(event_timestamp())
+        }
+        items: list[dict[str, Any]] = []
+        while True:
+            with priority(LOW):
+                response = table.scan(**kwargs)
+            items.extend(response.get("Items", []))
+            if "LastEvaluatedKey" not in response:
+                return items
+            kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+event_lifecycle = EventLifecycle()
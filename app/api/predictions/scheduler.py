@@ -0,0 +1,197 @@
+import asyncio
+import sys
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+from app.memory import deep_sizeof, memory_diagnostics
+from app.metrics import metrics
+from app.settings import get_settings, on_reload
+
+PositionCallback = Callable[[int], Awaitable[None]]
+
+# Queue positions are recomputed at most this often (seconds), so a burst of
+# arrivals or admissions costs one pass over the queues.
+POSITION_INTERVAL = 0.1
+
+
+class SchedulerFull(Exception):
+    pass
+
+
+class _Waiter:
+    __slots__ = ("key", "cost", "future", "on_position", "position")
+
+    def __init__(self, key: str, cost: float, on_position: Optional[PositionCallback]):
+        self.key = key
+        self.cost = cost
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.on_position = on_position
+        self.position = -1
+
+
+class InferenceScheduler:
+    """
+    Admission control in front of the inference server.
+
+    At most INFERENCE_MAX_CONCURRENCY generations run at once. Requests beyond
+    that wait in one queue per key (the wallet address) and are admitted by
+    deficit round-robin: every pass over the queues grants each key a quantum
+    scaled by its tier weight (SCHEDULER_TIER_WEIGHTS, e.g. "premium=2"), so a
+    wallet with many queued prompts cannot starve the others. Waiters are told
+    their position when it changes, in batches of at most one per
+    POSITION_INTERVAL.
+    """
+
+    def __init__(self) -> None:
+        self.active = 0
+        self.waiting = 0
+        self._queues: OrderedDict[str, deque[_Waiter]] = OrderedDict()
+        self._deficits: dict[str, float] = {}
+        self._key_weights: dict[str, float] = {}
+        self._notifications: set[asyncio.Task] = set()
+        self._positions_handle: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def max_concurrency(self) -> int:
+        return get_settings().inference_max_concurrency
+
+    @property
+    def max_queue(self) -> int:
+        return get_settings().scheduler_max_queue
+
+    @property
+    def quantum(self) -> float:
+        return get_settings().scheduler_quantum
+
+    @property
+    def weights(self) -> dict[str, float]:
+        return get_settings().scheduler_tier_weights
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        key: str,
+        tier: str = "default",
+        cost: float = 1,
+        on_position: Optional[PositionCallback] = None,
+    ) -> AsyncIterator[None]:
+        if self.active < self.max_concurrency and not self.waiting:
+            self.active += 1
+        else:
+            await self._wait(key, tier, cost, on_position)
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._dispatch()
+
+    async def _wait(
+        self, key: str, tier: str, cost: float, on_position: Optional[PositionCallback]
+    ) -> None:
+        if self.waiting >= self.max_queue:
+            raise SchedulerFull("Inference queue is full")
+        waiter = _Waiter(key, cost, on_position)
+        self._queues.setdefault(key, deque()).append(waiter)
+        self._deficits.setdefault(key, 0.0)
+        self._key_weights[key] = self.weights.get(tier, 1.0)
+        self.waiting += 1
+        self._positions_changed()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Admitted just before being cancelled: hand the slot on.
+                self.active -= 1
+                self._dispatch()
+            else:
+                self._remove(waiter)
+            raise
+
+    def _dispatch(self) -> None:
+        admitted = False
+        while self.active < self.max_concurrency and self._queues:
+            waiter = self._next()
+            self.waiting -= 1
+            self.active += 1
+            waiter.future.set_result(None)
+            admitted = True
+        if admitted and self._queues:
+            self._positions_changed()
+
+    def _next(self) -> _Waiter:
+        return self._pop_next(self._queues, self._deficits)
+
+    def _pop_next(
+        self, queues: "OrderedDict[str, deque[_Waiter]]", deficits: dict[str, float]
+    ) -> _Waiter:
+        while True:
+            key, queue = next(iter(queues.items()))
+            if deficits[key] >= queue[0].cost:
+                waiter = queue.popleft()
+                deficits[key] -= waiter.cost
+                if not queue:
+                    del queues[key]
+                    del deficits[key]
+                return waiter
+            queues.move_to_end(key)
+            # Settings only allow positive quanta and weights, so every key
+            # earns credit and this terminates.
+            deficits[key] += self.quantum * self._key_weights.get(key, 1.0)
+
+    def _remove(self, waiter: _Waiter) -> None:
+        queue = self._queues.get(waiter.key)
+        if queue is None or waiter not in queue:
+            return
+        queue.remove(waiter)
+        self.waiting -= 1
+        if not queue:
+            del self._queues[waiter.key]
+            del self._deficits[waiter.key]
+        if self._queues:
+            self._positions_changed()
+
+    def memory_usage(self) -> dict[str, int]:
+        return {
+            key: deep_sizeof(queue)
+            + sum(sys.getsizeof(waiter.__dict__) for waiter in queue)
+            for key, queue in self._queues.items()
+        }
+
+    def _positions_changed(self) -> None:
+        if self._positions_handle is None:
+            self._positions_handle = asyncio.get_running_loop().call_later(
+                POSITION_INTERVAL, self._update_positions
+            )
+
+    def _update_positions(self) -> None:
+        self._positions_handle = None
+        # Simulate the admission order on copies of the queues.
+        queues = OrderedDict((k, deque(q)) for k, q in self._queues.items())
+        deficits = dict(self._deficits)
+        changed = []
+        for position in range(1, self.waiting + 1):
+            waiter = self._pop_next(queues, deficits)
+            if waiter.position != position:
+                waiter.position = position
+                if waiter.on_position is not None:
+                    changed.append((waiter.on_position, position))
+        if changed:
+            task = asyncio.create_task(self._notify(changed))
+            self._notifications.add(task)
+            task.add_done_callback(self._notifications.discard)
+
+    async def _notify(self, changed: list[tuple[PositionCallback, int]]) -> None:
+        for on_position, position in changed:
+            try:
+                await on_position(position)
+            except Exception as e:
+                print("Error sending queue position:", e)
+
+
+inference_scheduler = InferenceScheduler()
+# A raised concurrency limit admits waiters straight away.
+on_reload(lambda old, new: inference_scheduler._dispatch())
+metrics.register_gauge("inference_active", lambda: inference_scheduler.active)
+metrics.register_gauge("inference_queued", lambda: inference_scheduler.waiting)
+memory_diagnostics.register("scheduler_queues", inference_scheduler.memory_usage)
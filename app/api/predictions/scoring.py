@@ -0,0 +1,303 @@
+import asyncio
+import json
+import os
+import re
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+import numpy as np
+
+from app.api.db.db import get_dynamodb_resource
+from app.settings import get_settings
+
+RESULTS_TABLE = "bs-football-results"
+# Partition key of RESULTS_TABLE, which every GSI projects.
+RESULTS_KEY = "id"
+# ASCII digits and whitespace, as matched by `parse_predictions`.
+SCORE_PATTERN = re.compile(r"(\d+)\s*[-:]\s*(\d+)", re.ASCII)
+DRAW_WORDS = ("draw", "tie")
+
+EXACT_SCORE_POINTS = 3
+OUTCOME_POINTS = 1
+
+# How much of a prediction could be understood.
+UNPARSED, OUTCOME_ONLY, EXACT_SCORE = 0, 1, 2
+
+# The most digits of a goal count that are read; longer numbers are capped.
+_MAX_DIGITS = 18
+_POWERS = 10 ** np.arange(_MAX_DIGITS, dtype=np.int64)
+
+
+def parse_result(result: str) -> tuple[int, int]:
+    match = SCORE_PATTERN.search(result)
+    if not match:
+        raise ValueError(f"Invalid match result: {result!r}, expected e.g. '2-1'")
+    return int(match.group(1)), int(match.group(2))
+
+
+def _next_index(mask: np.ndarray) -> np.ndarray:
+    # For every column, the first column at or after it where `mask` is set
+    # (the last column, which is padding, if none).
+    columns = np.arange(mask.shape[1])
+    index = np.where(mask, columns, mask.shape[1] - 1)
+    return np.minimum.accumulate(index[:, ::-1], axis=1)[:, ::-1]
+
+
+def _read_numbers(digits: np.ndarray, start: np.ndarray, end: np.ndarray) -> np.ndarray:
+    # The numbers written by `digits[start:end]`, read from their last digit.
+    length = end - start
+    offsets = np.arange(_MAX_DIGITS)
+    values = digits[np.maximum(end[:, None] - 1 - offsets, 0)] * _POWERS
+    values = np.where(offsets < length[:, None], values, 0).sum(axis=1)
+    return np.where(length > _MAX_DIGITS, np.iinfo(np.int64).max, values)
+
+
+def find_scores(texts: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Find the first match of SCORE_PATTERN in every string of `texts` at once,
+    returning (home goals, away goals, found) arrays.
+
+    The strings are viewed as a matrix of code points, padded with one empty
+    column. A match starts at the first digit run followed, past optional
+    whitespace, by a separator and, past more whitespace, by another run.
+    Numbers of more than 18 digits are read as the largest int64.
+    """
+    rows = len(texts)
+    width = texts.dtype.itemsize // 4
+    home_goals = np.zeros(rows, dtype=np.int64)
+    away_goals = np.zeros(rows, dtype=np.int64)
+    found = np.zeros(rows, dtype=bool)
+    if not rows or not width:
+        return home_goals, away_goals, found
+
+    chars = np.zeros((rows, width + 1), dtype=np.uint32)
+    chars[:, :width] = np.ascontiguousarray(texts).view(np.uint32).reshape(rows, width)
+    is_digit = (chars >= ord("0")) & (chars <= ord("9"))
+    # Only rows with a digit can hold a score.
+    candidates = np.flatnonzero(is_digit.any(axis=1))
+    chars, is_digit = chars[candidates], is_digit[candidates]
+    is_space = (chars == ord(" ")) | ((chars >= ord("\t")) & (chars <= ord("\r")))
+    is_separator = (chars == ord("-")) | (chars == ord(":"))
+    run_start = is_digit.copy()
+    run_start[:, 1:] &= ~is_digit[:, :-1]
+
+    # Indexes into the flattened matrices, so that each lookup below is a
+    # single gather.
+    row_offsets = np.arange(len(candidates))[:, None] * (width + 1)
+    run_end = _next_index(~is_digit) + row_offsets
+    next_visible = _next_index(~is_space) + row_offsets
+    separator = next_visible.ravel()[run_end]
+    away_start = next_visible.ravel()[np.minimum(separator + 1, row_offsets + width)]
+    matches = run_start & is_separator.ravel()[separator] & is_digit.ravel()[away_start]
+
+    matched = np.flatnonzero(matches.any(axis=1))
+    first = matches[matched].argmax(axis=1)
+    home_start = matched * (width + 1) + first
+    home_end = run_end.ravel()[home_start]
+    away_start = away_start.ravel()[home_start]
+    away_end = run_end.ravel()[away_start]
+    digits = np.where(is_digit, chars.astype(np.int64) - ord("0"), 0).ravel()
+    rows_found = candidates[matched]
+    home_goals[rows_found] = _read_numbers(digits, home_start, home_end)
+    away_goals[rows_found] = _read_numbers(digits, away_start, away_end)
+    found[rows_found] = True
+    return home_goals, away_goals, found
+
+
+def parse_predictions(
+    predictions: list[str], home: str, away: str
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Turn free-text predictions into (home goals, away goals, kind) arrays.
+
+    A score such as "2-1" is an exact prediction. Otherwise naming a team or a
+    draw predicts only the outcome, encoded as 1-0, 0-1 or 0-0. The whole
+    batch is parsed with array operations rather than row by row.
+    """
+    # Lower-cased in one go, joined by a character that is no digit, space or
+    # separator, which predictions are stripped of should one contain it.
+    joined = "\x00".join(map(str, predictions))
+    if joined.count("\x00") >= len(predictions):
+        joined = "\x00".join(str(p).replace("\x00", "") for p in predictions)
+    normalised = np.array(joined.lower().split("\x00") if predictions else [], dtype=str)
+    home, away = home.lower(), away.lower()
+    home_goals, away_goals, exact = find_scores(normalised)
+    draw = np.zeros(len(normalised), dtype=bool)
+    for word in DRAW_WORDS:
+        draw |= np.char.find(normalised, word) >= 0
+    names_home = np.char.find(normalised, home) >= 0
+    names_away = np.char.find(normalised, away) >= 0
+    outcome = ~exact & ~draw
+    home_wins = outcome & bool(home) & names_home & ~names_away
+    away_wins = outcome & bool(away) & names_away & ~names_home
+
+    kind = np.where(
+        exact, EXACT_SCORE, np.where(draw | home_wins | away_wins, OUTCOME_ONLY, UNPARSED)
+    ).astype(np.int8)
+    return (
+        np.where(exact, home_goals, home_wins.astype(np.int64)),
+        np.where(exact, away_goals, away_wins.astype(np.int64)),
+        kind,
+    )
+
+
+def score_predictions(
+    home_goals: np.ndarray, away_goals: np.ndarray, kind: np.ndarray, result: tuple[int, int]
+) -> np.ndarray:
+    actual_home, actual_away = result
+    exact = (kind == EXACT_SCORE) & (home_goals == actual_home) & (away_goals == actual_away)
+    outcome = (kind != UNPARSED) & (
+        np.sign(home_goals - away_goals) == np.sign(actual_home - actual_away)
+    )
+    return np.where(exact, EXACT_SCORE_POINTS, np.where(outcome, OUTCOME_POINTS, 0))
+
+
+class BulkScorer:
+    """
+    Scores every prediction for a finished match.
+
+    Predictions are streamed page by page from the TEAM_INDEX GSI (partition
+    key `team`), scored in vectorised chunks and written back, at most
+    `concurrency` chunks at a time. Only `score` and `scored_at` are set, by
+    key, so the index needs to project `prediction` but not the other
+    attributes, and concurrent writes to the rows are kept. After each page whose
+    writes, and those of every page before it, have completed, the position
+    is saved to the checkpoint file so an interrupted run can resume there.
+    """
+
+    def __init__(
+        self,
+        chunk_size: int = 1000,
+        concurrency: int = 4,
+        checkpoint_path: Optional[str] = None,
+    ) -> None:
+        self.chunk_size = chunk_size
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.checkpoint_path = checkpoint_path
+        self.index_name = get_settings().team_index
+        self.table = get_dynamodb_resource().Table(RESULTS_TABLE)
+        self.scored = 0
+        self.started = 0.0
+
+    async def run(self, team: str, result: str) -> dict[str, Any]:
+        home, _, away = team.partition("_")
+        parsed_result = parse_result(result)
+        checkpoint = self._load_checkpoint(team)
+        self.scored = checkpoint.get("scored", 0)
+        start_key = checkpoint.get("last_evaluated_key")
+        self.started = time.perf_counter()
+        pending: deque[tuple[Optional[dict], list[asyncio.Task], int]] = deque()
+
+        while True:
+            page = await asyncio.to_thread(self._query_page, team, start_key)
+            items = page.get("Items", [])
+            start_key = page.get("LastEvaluatedKey")
+            writes = [
+                asyncio.create_task(
+                    self._score_and_write(items[i:i + self.chunk_size], home, away, parsed_result)
+                )
+                for i in range(0, len(items), self.chunk_size)
+            ]
+            pending.append((start_key, writes, len(items)))
+            await self._advance_checkpoint(team, pending, wait=start_key is None)
+            if start_key is None:
+                break
+
+        report = self.report()
+        print(f"Scored {report['scored']} predictions for {team}: {report['rows_per_second']} rows/s")
+        self._clear_checkpoint()
+        return report
+
+    def report(self) -> dict[str, Any]:
+        elapsed = time.perf_counter() - self.started
+        return {
+            "scored": self.scored,
+            "seconds": round(elapsed, 2),
+            "rows_per_second": round(self.scored / elapsed, 1) if elapsed else 0.0,
+        }
+
+    async def _score_and_write(
+        self, items: list[dict[str, Any]], home: str, away: str, result: tuple[int, int]
+    ) -> None:
+        async with self.semaphore:
+            home_goals, away_goals, kind = parse_predictions(
+                [item.get("prediction", "") for item in items], home, away
+            )
+            scores = score_predictions(home_goals, away_goals, kind, result)
+            scored_at = datetime.now(timezone.utc).isoformat()
+            await asyncio.to_thread(
+                self._write_scores,
+                [(item[RESULTS_KEY], score) for item, score in zip(items, scores.tolist())],
+                scored_at,
+            )
+
+    async def _advance_checkpoint(
+        self,
+        team: str,
+        pending: deque[tuple[Optional[dict], list[asyncio.Task], int]],
+        wait: bool,
+    ) -> None:
+        # Keep at most one page of writes queued behind the one being read.
+        # A page only counts as scored, in the checkpoint too, once all of its
+        # writes have completed; those of later pages may still be running.
+        while pending and (wait or len(pending) > 1 or all(t.done() for t in pending[0][1])):
+            last_evaluated_key, writes, count = pending.popleft()
+            await asyncio.gather(*writes)
+            self.scored += count
+            self._save_checkpoint(team, last_evaluated_key)
+        print(f"Scored {self.scored} predictions ({self.report()['rows_per_second']} rows/s)")
+
+    def _query_page(self, team: str, start_key: Optional[dict]) -> dict[str, Any]:
+        from boto3.dynamodb.conditions import Key
+
+        kwargs: dict[str, Any] = {
+            "IndexName": self.index_name,
+            "KeyConditionExpression": Key("team").eq(team),
+        }
+        if start_key:
+            kwargs["ExclusiveStartKey"] = start_key
+        return self.table.query(**kwargs)
+
+    def _write_scores(self, scores: list[tuple[Any, int]], scored_at: str) -> None:
+        # Items read from the GSI may lack unprojected attributes, so they are
+        # updated rather than put back; rows deleted meanwhile are skipped.
+        errors = self.table.meta.client.exceptions
+        for key, score in scores:
+            try:
+                self.table.update_item(
+                    Key={RESULTS_KEY: key},
+                    UpdateExpression="SET score = :score, scored_at = :scored_at",
+                    ConditionExpression="attribute_exists(#key)",
+                    ExpressionAttributeNames={"#key": RESULTS_KEY},
+                    ExpressionAttributeValues={":score": score, ":scored_at": scored_at},
+                )
+            except errors.ConditionalCheckFailedException:
+                print(f"Prediction {key} was deleted before it was scored")
+
+    def _load_checkpoint(self, team: str) -> dict[str, Any]:
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return {}
+        with open(self.checkpoint_path) as f:
+            checkpoint = json.load(f)
+        if checkpoint.get("team") != team:
+            raise ValueError(f"Checkpoint {self.checkpoint_path} belongs to {checkpoint.get('team')}")
+        print(f"Resuming {team} after {checkpoint['scored']} predictions")
+        return checkpoint
+
+    def _save_checkpoint(self, team: str, last_evaluated_key: Optional[dict]) -> None:
+        if not self.checkpoint_path or last_evaluated_key is None:
+            return
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(
+                {"team": team, "last_evaluated_key": last_evaluated_key, "scored": self.scored},
+                f,
+                default=str,
+            )
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _clear_checkpoint(self) -> None:
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
@@ -1,30 +1,55 @@
 import asyncio
-import json
-import os
 import uuid
 from datetime import datetime, timezone
-from typing import  Optional, Union
+from functools import cached_property
+from typing import Any, Iterable, Optional, Union
 
-import boto3
-import websockets
-from boto3.dynamodb.conditions import Key
 from botocore.exceptions import ClientError
 from fastapi import WebSocket
 
-from app.api.db.db import DatabaseOperations
-from app.utils import generate_json_prompt
+from app import capture
+from app.api.db.db import (
+    DatabaseOperations,
+    decode_cursor,
+    encode_cursor,
+    event_timestamp,
+    get_dynamodb_resource,
+    projection,
+)
+from app.api.predictions.aggregates import prediction_aggregates
+from app.api.predictions.budget import UpstreamLoad, resolve_token_budget
+from app.api.predictions.scheduler import SchedulerFull, inference_scheduler
+from app.api.predictions.sessions import GenerationSession, generation_sessions
+from app.drain import drain_coordinator
+from app.prompt_templates import PromptTooLargeError, prompt_templates
+from app.serialization import (
+    END_OF_RESPONSE_FRAME,
+    error_frame,
+    exception_frame,
+    truncation_frame,
+)
+from app.settings import get_settings
 
 class PredictionService:
-    def __init__(self) -> None:
-        self.dynamodb = boto3.resource(
-            "dynamodb", region_name=os.environ.get("AWS_REGION")
-        )
-        self.table = self.dynamodb.Table("bs-football-results")
-        self.events = self.dynamodb.Table("bs-football-context-prompts")
+    # Tables are resolved on first use so that the module-level instance in the
+    # controller does not touch boto3 at import time.
+    @cached_property
+    def dynamodb(self):
+        return get_dynamodb_resource()
+
+    @cached_property
+    def table(self):
+        return self.dynamodb.Table("bs-football-results")
+
+    @cached_property
+    def events(self):
+        return self.dynamodb.Table("bs-football-context-prompts")
 
     async def save_prediction(
         self, prediction: str, address: str, team: str
     ) -> Union[dict[str, str], str]:
+        from boto3.dynamodb.conditions import Key
+
         timestamp = datetime.now(timezone.utc).isoformat()
         prediction_id = str(uuid.uuid4())
         try:
@@ -45,6 +70,7 @@ class PredictionService:
                         "timestamp": timestamp,
                     }
                 )
+                prediction_aggregates.record(team, prediction)
                 return {
                     "prediction": prediction,
                     "address": address,
@@ -60,73 +86,187 @@ class PredictionService:
                 raise Exception(e.response["Error"]["Message"])
 
     @classmethod
-    async def get_new_prediction(cls, prompt: str, client_websocket, team: str):
-        current_time = datetime.now()
-        iso_date_str = current_time.isoformat()
+    async def get_new_prediction(
+        cls,
+        prompt: str,
+        client_websocket,
+        team: str,
+        tier: str = "default",
+        owner: Optional[str] = None,
+    ):
+        """
+        Stream a generation from the inference server to the client.
+
+        The generation is bounded by the event's token budget for `tier` (see
+        `resolve_token_budget`) and by a wall-clock deadline of
+        GENERATION_DEADLINE seconds covering connection retries and streaming.
+        A stream that is cut short ends with a truncation frame instead of the
+        plain END_OF_RESPONSE frame.
+
+        Tokens go through a `GenerationSession` owned by `owner`, so a client
+        that loses its connection can resume the stream instead of starting a
+        new generation. The upstream is only called once `inference_scheduler`
+        admits the request; until then the client gets its queue position.
+        With DEDUP_ENABLED, a near-duplicate of an earlier prompt about the same
+        event is answered with the stored response (see `PromptDeduplicator`).
+        """
+        iso_date_str = event_timestamp()
         events = await DatabaseOperations.get_all_events(iso_date_str)
         event = next((e for e in events if e['team'] == team), None)
         if not event:
-            await client_websocket.send_text(
-                json.dumps({"statusCode": 404, "body": "No daily event found"})
+            await client_websocket.send_text(error_frame(404, "No daily event found"))
+            return
+
+        max_tokens = resolve_token_budget(event, tier)
+        try:
+            json_prompt = prompt_templates.for_event(event).render(
+                prompt, max_tokens=max_tokens
             )
+        except PromptTooLargeError as e:
+            await client_websocket.send_text(exception_frame(413, e))
             return
 
-        system_context_prompt = event["contextPrompt"]
-        assistant_context_prompt = event["assistantPrompt"]
-        json_prompt = generate_json_prompt(
-            prompt, system_context_prompt, assistant_context_prompt, max_tokens=10000
+        capture.record(
+            "req",
+            owner=capture.trace_recorder.anonymise(owner or "anonymous"),
+            tier=tier,
+            max_tokens=max_tokens,
         )
+        deduplicator = signature = cached = output = None
+        if get_settings().dedup_enabled:
+            # Imported on demand: numpy is only needed when deduplicating.
+            from app.api.predictions.dedup import prompt_deduplicator as deduplicator
+
+            signature = deduplicator.signature(prompt)
+            cached = deduplicator.lookup(team, signature, max_tokens)
+            output = []
+
+        session = generation_sessions.create(client_websocket, owner)
+        await session.start()
+        final_frame = error_frame(500, "Generation failed")
+        # Upstream token timings, collected only while the message is captured.
+        timings = ([], []) if capture.current_message.get() is not None else None
+        try:
+            if cached is not None:
+                for token in cached:
+                    await session.send_token(token)
+                final_frame = END_OF_RESPONSE_FRAME
+            else:
+                async with inference_scheduler.slot(
+                    owner or "anonymous", tier, on_position=session.send_queue_position
+                ):
+                    if session.abandoned:
+                        final_frame = truncation_frame("abandoned")
+                    else:
+                        final_frame = await cls._stream_generation(
+                            json_prompt, session, max_tokens, timings, output
+                        )
+                if output and final_frame == END_OF_RESPONSE_FRAME:
+                    deduplicator.store(team, signature, output)
+        except SchedulerFull as e:
+            final_frame = exception_frame(503, e)
+        except asyncio.CancelledError:
+            # The client cancelled the stream, or the drain ended it; the
+            # upstream connection is closed on the way out.
+            final_frame = truncation_frame(
+                "draining" if drain_coordinator.draining else "cancelled"
+            )
+            raise
+        finally:
+            await session.finish(final_frame)
+            if timings is not None:
+                capture.record("gen", d=timings[0], n=timings[1])
+
+    @staticmethod
+    async def _stream_generation(
+        json_prompt: str,
+        session: GenerationSession,
+        max_tokens: int,
+        timings: Optional[tuple[list[float], list[int]]] = None,
+        output: Optional[list[str]] = None,
+    ) -> str:
+        """
+        Relay the upstream tokens into the session and return the frame that
+        ends the stream. If `timings` is given, the gap before each upstream
+        token (in milliseconds) and its size are appended to it; if `output`
+        is given, the tokens are.
+        """
+        import websockets
+
+        settings = get_settings()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.generation_deadline
+        retry_count = settings.retry_count
+        retry_time = settings.retry_time
+        tokens_count = 0
         retry_counts = 0
-        done = False
-        while retry_counts < int(os.environ.get("RETRY_COUNT", "3")) and not done:
-            try:
-                async with websockets.connect(
-                    f"ws://{os.environ.get('AKASH_ENDPOINT')}"
-                ) as ws:
-                    print("Connected to external websocket")
-                    await ws.send(json_prompt)
-                    print("Message sent to external websocket")
-                    retry_counts = 0
-                    while retry_counts < int(os.environ.get("RETRY_COUNT", "3")):
-                        try:
-                            tokens_count = 0
-                            async for message in ws:
-                                tokens_count += 1
-                                print(
-                                    "Received message from external websocket:", message
-                                )
-                                await client_websocket.send_text(
-                                    json.dumps({"token": message})
-                                )
-                            print("TOKENS COUNT =", tokens_count)
-                            if tokens_count > 0:
-                                await client_websocket.send_text(
-                                    json.dumps({"token": "END_OF_RESPONSE"})
+
+        with UpstreamLoad.track():
+            while retry_counts < retry_count:
+                try:
+                    async with websockets.connect(
+                        f"ws://{settings.akash_endpoint}",
+                        open_timeout=max(deadline - loop.time(), 0),
+                        # Don't hold the upstream slot waiting on a clean close
+                        # after a stream is cut short.
+                        close_timeout=1,
+                    ) as ws:
+                        print("Connected to external websocket")
+                        await ws.send(json_prompt)
+                        print("Message sent to external websocket")
+                        sent_at = received_at = loop.time()
+                        while True:
+                            try:
+                                message = await asyncio.wait_for(
+                                    ws.recv(), timeout=deadline - loop.time()
                                 )
-                                done = True
+                            except websockets.ConnectionClosedOK:
                                 break
-                            else:
-                                await asyncio.sleep(
-                                    int(os.environ.get("RETRY_TIME", "30"))
-                                )
-                                print(
-                                    "No messages received from external websocket. Retrying..."
-                                )
-                        except Exception as e:
-                            print("Error receiving message via WebSocket:", e)
-                            break
-            except Exception as e:
-                print(
-                    f"Unable to connect to Inference Server. Retrying in {os.environ.get('RETRY_TIME')} seconds:",
-                    e,
-                )
+                            if tokens_count == 0:
+                                UpstreamLoad.record_latency(loop.time() - sent_at)
+                            if timings is not None:
+                                now = loop.time()
+                                timings[0].append(round((now - received_at) * 1000, 1))
+                                timings[1].append(len(message))
+                                received_at = now
+                            tokens_count += 1
+                            if output is not None:
+                                output.append(message)
+                            await session.send_token(message)
+                            if session.abandoned:
+                                # Nobody reattached; stop using the upstream slot.
+                                print("Client did not reconnect, stopping generation")
+                                return truncation_frame("abandoned")
+                            if tokens_count >= max_tokens:
+                                return truncation_frame("token_budget")
+                    print("TOKENS COUNT =", tokens_count)
+                    if tokens_count > 0:
+                        return END_OF_RESPONSE_FRAME
+                    print("No messages received from external websocket. Retrying...")
+                except (asyncio.TimeoutError, TimeoutError):
+                    break
+                except Exception as e:
+                    if tokens_count > 0:
+                        # Reconnecting would restart the generation from scratch.
+                        print("Error receiving message via WebSocket:", e)
+                        return truncation_frame("upstream_error")
+                    print(
+                        f"Unable to connect to Inference Server. Retrying in {retry_time} seconds:",
+                        e,
+                    )
                 retry_counts += 1
-                await asyncio.sleep(int(os.environ.get("RETRY_TIME", "30")))
+                if loop.time() + retry_time >= deadline:
+                    break
+                await asyncio.sleep(retry_time)
+
+        print("Generation deadline reached or retries exhausted")
+        if tokens_count > 0:
+            return truncation_frame("deadline")
+        return error_frame(504, "Inference server unavailable")
 
     @classmethod
     async def get_daily_event(cls) -> Optional[dict[str, list | str]]:
-        current_time = datetime.now()
-        iso_date_str = current_time.isoformat()
+        iso_date_str = event_timestamp()
         response = await DatabaseOperations.get_daily_event(iso_date_str)
         items = response.get("Items", [])
         if items:
@@ -136,8 +276,7 @@ class PredictionService:
 
     @classmethod
     async def get_next_event(cls) -> Optional[dict[str, str]]:
-        current_time = datetime.now()
-        iso_date_str = current_time.isoformat()
+        iso_date_str = event_timestamp()
         response = await DatabaseOperations.get_next_event(iso_date_str)
         items = response.get("Items", [])
         if items:
@@ -160,27 +299,47 @@ class PredictionService:
         except ClientError as e:
             raise Exception(e.response["Error"]["Message"])
 
-    async def get_address_history(self, address: str) -> list[dict[str, str | int]]:
+    async def get_address_history(
+        self,
+        address: str,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        fields: Optional[Iterable[str]] = None,
+    ) -> tuple[list[dict[str, str | int]], Optional[str]]:
+        """
+        Return one page of an address's predictions and the cursor of the next
+        page, or None if it is the last one. Without a `limit` the page is
+        whatever fits in a single DynamoDB response.
+        """
+        from boto3.dynamodb.conditions import Key
+
+        kwargs: dict[str, Any] = {
+            "IndexName": "address-index",
+            "KeyConditionExpression": Key("address").eq(address),
+            **projection(fields),
+        }
+        if limit:
+            kwargs["Limit"] = limit
+        if cursor:
+            kwargs["ExclusiveStartKey"] = decode_cursor(cursor)
         try:
-            response = self.table.query(
-                IndexName="address-index",
-                KeyConditionExpression=Key("address").eq(address),
-            )
+            response = self.table.query(**kwargs)
             items = response.get("Items", [])
-            return items
+            return items, encode_cursor(response.get("LastEvaluatedKey"))
         except ClientError as e:
             raise Exception(e.response['Error']['Message'])
-    
+
     @classmethod
     async def get_address_prediction_event(cls, address: str):
         try:
-            current_time = datetime.now()
-            iso_date_str = current_time.isoformat()
+            iso_date_str = event_timestamp()
             events = await DatabaseOperations.get_all_events(iso_date_str)
-            user_events = await DatabaseOperations.get_user_events(address)            
+            user_events = await DatabaseOperations.get_user_events(
+                address, fields=("team",)
+            )
+            predicted_teams = {ue['team'] for ue in user_events}
             for event in events:
-                event_teams = [ue['team'] for ue in user_events]
-                if event['team'] not in event_teams:
+                if event['team'] not in predicted_teams:
                     return event['team']
         except ClientError as e:
             raise Exception(e.response['Error']['Message'])
@@ -0,0 +1,190 @@
+import asyncio
+import time
+import uuid
+from collections import deque
+from typing import Optional
+
+from fastapi import WebSocket
+
+from app.memory import deep_sizeof, memory_diagnostics
+from app.metrics import metrics
+from app.serialization import dumps, error_frame, exception_frame, token_frame
+from app.settings import get_settings
+
+
+class SessionGone(Exception):
+    pass
+
+
+class GenerationSession:
+    """
+    One generation's output, decoupled from the socket it is delivered to.
+
+    Every frame is numbered with an offset and kept in a bounded ring buffer.
+    If the client's socket fails the session keeps buffering, and a client that
+    reconnects can `attach` and replay everything after the last offset it saw.
+    A session left without a client for SESSION_GRACE_PERIOD seconds is
+    abandoned, which tells the generation to stop using the upstream.
+    """
+
+    def __init__(
+        self, session_id: str, owner: Optional[str], websocket: WebSocket, capacity: int
+    ) -> None:
+        self.session_id = session_id
+        self.owner = owner
+        self.websocket: Optional[WebSocket] = websocket
+        self.buffer: deque[str] = deque(maxlen=capacity)
+        self.offset = 0
+        self.delivered = 0
+        self.finished = False
+        self.grace_period = get_settings().session_grace_period
+        self.idle_since: Optional[float] = None
+        # The task producing the generation, cancelled to cancel the stream.
+        self.task: Optional[asyncio.Task] = asyncio.current_task()
+        self._lock = asyncio.Lock()
+
+    @property
+    def first_offset(self) -> int:
+        return self.offset - len(self.buffer)
+
+    @property
+    def abandoned(self) -> bool:
+        return (
+            self.idle_since is not None
+            and time.monotonic() - self.idle_since > self.grace_period
+        )
+
+    def expired(self, now: float) -> bool:
+        return self.finished and self.idle_since is not None and (
+            now - self.idle_since > self.grace_period
+        )
+
+    async def start(self) -> None:
+        await self._send_direct(dumps({"session_id": self.session_id, "offset": 0}))
+
+    async def send_queue_position(self, position: int) -> None:
+        # Not buffered: only the latest position matters to a client.
+        await self._send_direct(dumps({"queue_position": position}))
+
+    async def send_token(self, token: str) -> None:
+        await self._emit(token_frame(token, self.offset))
+
+    async def send_text(self, frame: str) -> None:
+        await self._emit(frame)
+
+    async def finish(self, frame: str) -> None:
+        await self._emit(frame)
+        self.finished = True
+        if self.idle_since is None:
+            # Kept for the grace period so a client that missed the end can replay it.
+            self.idle_since = time.monotonic()
+
+    async def attach(self, websocket: WebSocket, offset: int) -> None:
+        async with self._lock:
+            # Checked under the lock: frames emitted while waiting for it may
+            # have pushed `offset` out of the buffer.
+            if offset < self.first_offset or offset > self.offset:
+                raise SessionGone("Session offset no longer available")
+            self.websocket = websocket
+            self.delivered = offset
+            self.idle_since = time.monotonic() if self.finished else None
+            await self._flush()
+
+    async def _emit(self, frame: str) -> None:
+        self.buffer.append(frame)
+        self.offset += 1
+        async with self._lock:
+            await self._flush()
+
+    async def _flush(self) -> None:
+        while self.websocket is not None and self.delivered < self.offset:
+            index = self.delivered - self.first_offset
+            assert index >= 0, "Replaying frames that left the buffer"
+            frame = self.buffer[index]
+            try:
+                await self.websocket.send_text(frame)
+            except Exception as e:
+                print("Error sending token via WebSocket:", e)
+                self._detach()
+                return
+            self.delivered += 1
+            # Uncompressed size; see `DeflateEstimator` for the deflated size.
+            metrics.inc("ws_frames_sent_total")
+            metrics.inc("ws_bytes_sent_total", len(frame))
+
+    async def _send_direct(self, frame: str) -> None:
+        if self.websocket is None:
+            return
+        try:
+            await self.websocket.send_text(frame)
+        except Exception as e:
+            print("Error sending token via WebSocket:", e)
+            self._detach()
+
+    def _detach(self) -> None:
+        self.websocket = None
+        self.idle_since = time.monotonic()
+
+
+class SessionRegistry:
+    def __init__(self) -> None:
+        self._sessions: dict[str, GenerationSession] = {}
+
+    def create(self, websocket: WebSocket, owner: Optional[str]) -> GenerationSession:
+        self._evict_expired()
+        session = GenerationSession(
+            uuid.uuid4().hex,
+            owner,
+            websocket,
+            capacity=get_settings().session_buffer_size,
+        )
+        self._sessions[session.session_id] = session
+        return session
+
+    async def resume(
+        self, session_id: str, owner: Optional[str], websocket: WebSocket, offset: int
+    ) -> Optional[GenerationSession]:
+        """
+        Reattach a client to a session and replay its frames from `offset`.
+        Errors are reported to the client as status frames. Returns the
+        session if it was reattached.
+        """
+        self._evict_expired()
+        session = self._sessions.get(session_id)
+        if session is None or session.owner != owner:
+            await websocket.send_text(error_frame(404, "Session not found"))
+            return None
+        try:
+            await session.attach(websocket, offset)
+        except SessionGone as e:
+            await websocket.send_text(exception_frame(410, e))
+            return None
+        return session
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def in_flight(self) -> list[GenerationSession]:
+        """The sessions whose generation has not finished, queued ones included."""
+        return [session for session in self._sessions.values() if not session.finished]
+
+    def buffer_sizes(self) -> dict[str, int]:
+        return {s: deep_sizeof(v.buffer) for s, v in self._sessions.items()}
+
+    def buffer_sizes_by_websocket(self) -> dict[WebSocket, int]:
+        sizes: dict[WebSocket, int] = {}
+        for session in self._sessions.values():
+            if session.websocket is not None:
+                sizes[session.websocket] = sizes.get(session.websocket, 0) + deep_sizeof(
+                    session.buffer
+                )
+        return sizes
+
+    def _evict_expired(self) -> None:
+        now = time.monotonic()
+        for session_id in [s for s, v in self._sessions.items() if v.expired(now)]:
+            del self._sessions[session_id]
+
+
+generation_sessions = SessionRegistry()
+memory_diagnostics.register("generation_sessions", generation_sessions.buffer_sizes)
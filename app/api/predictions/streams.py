@@ -0,0 +1,65 @@
+from typing import Any
+
+from fastapi import WebSocket
+
+from app.serialization import END_OF_RESPONSE_FRAME, dumps, loads
+
+PROTOCOL_VERSIONS = (1, 2)
+
+_TRUNCATED_PREFIX = '{"token":"END_OF_RESPONSE","truncated"'
+_ERROR_PREFIX = '{"statusCode":'
+
+
+def completion_frame(stream_id: str, frame: str) -> str:
+    """
+    Translate the frame that ends a version 1 stream into the version 2
+    completion frame: `{"stream_id": ..., "end": STATUS, ...}` where STATUS is
+    `complete`, `truncated` (with a `reason`), `cancelled` or `error` (with
+    the `statusCode` and `body`).
+    """
+    completion: dict[str, Any] = {"stream_id": stream_id}
+    if frame == END_OF_RESPONSE_FRAME:
+        completion["end"] = "complete"
+    else:
+        ending = loads(frame)
+        if "statusCode" in ending:
+            completion.update(end="error", statusCode=ending["statusCode"], body=ending.get("body"))
+        elif ending.get("reason") == "cancelled":
+            completion["end"] = "cancelled"
+        else:
+            completion.update(end="truncated", reason=ending.get("reason"))
+    return dumps(completion)
+
+
+def is_final(frame: str) -> bool:
+    return (
+        frame == END_OF_RESPONSE_FRAME
+        or frame.startswith(_TRUNCATED_PREFIX)
+        or frame.startswith(_ERROR_PREFIX)
+    )
+
+
+class StreamWebSocket:
+    """
+    The view of a client WebSocket for one stream of the version 2 protocol.
+
+    Every frame sent through it is tagged with the stream id, and the frame
+    that ends the stream is replaced by its completion frame. Frames are
+    tagged by splicing the serialised id into the already serialised frame.
+    """
+
+    def __init__(self, websocket: WebSocket, stream_id: str) -> None:
+        self.websocket = websocket
+        self.stream_id = stream_id
+        self._prefix = '{"stream_id":' + dumps(stream_id) + ","
+        self.finished = False
+
+    async def send_text(self, frame: str) -> None:
+        if is_final(frame):
+            self.finished = True
+            await self.websocket.send_text(completion_frame(self.stream_id, frame))
+        else:
+            await self.websocket.send_text(self._prefix + frame[1:])
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.websocket, name)
@@ -2,7 +2,9 @@ from botocore.exceptions import ClientError
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 
+from app.api.db.capacity import CapacityExceeded
 from app.api.wallet.service import WalletService
+from app.serialization import FastJSONResponse
 
 router = APIRouter()
 
@@ -26,9 +28,12 @@ def create_new_wallet(wallet: Wallet) -> Wallet:
 
 
 @router.get("/", response_model=list[Wallet])
-def get_wallets() -> list[Wallet]:
+def get_wallets() -> FastJSONResponse:
     try:
-        return wallet_service.get_wallets()
+        wallets = wallet_service.get_wallets()
+        # Returned as a response directly to skip re-validating every item
+        # against the response model; only the model's fields are exposed.
+        return FastJSONResponse([{"address": w["address"]} for w in wallets])
     except ClientError as e:
         raise HTTPException(status_code=500, detail=e.response["Error"]["Message"])
 
@@ -37,5 +42,7 @@ def get_wallets() -> list[Wallet]:
 def get_wallet_by_address(address: str) -> Wallet:
     try:
         return wallet_service.get_wallet_by_address(address)
+    except CapacityExceeded as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=404, detail=str(e))
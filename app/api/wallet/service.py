@@ -1,28 +1,31 @@
-import os
+from functools import cached_property
 
-import boto3
 from botocore.exceptions import ClientError
 
+from app.api.db.capacity import LOW, priority
+from app.api.db.db import get_dynamodb_resource
+
 
 class WalletService:
-    def __init__(self) -> None:
-        self.dynamodb = boto3.resource(
-            "dynamodb", region_name=os.environ.get("AWS_REGION")
-        )
-        self.wallets = self.dynamodb.Table("bs-user-contacts")
+    # Resolved on first use so that building the service does not touch boto3.
+    @cached_property
+    def wallets(self):
+        return get_dynamodb_resource().Table("bs-user-contacts")
 
     def get_wallets(self) -> list[dict[str, dict[str, int]]]:
-        response = self.wallets.scan()
+        # A full scan for admin listings: shed first when DynamoDB throttles.
+        with priority(LOW):
+            response = self.wallets.scan()
         wallets = response.get("Items", [])
         return wallets
 
     def get_wallet_by_address(self, address: str) -> dict[str, dict[str, int]]:
+        from boto3.dynamodb.conditions import Key
+
         try:
             response = self.wallets.query(
                 IndexName="address-index",
-                KeyConditionExpression=boto3.dynamodb.conditions.Key("address").eq(
-                    address
-                ),
+                KeyConditionExpression=Key("address").eq(address),
             )
             items = response.get("Items")
             if not items:
@@ -0,0 +1,284 @@
+import asyncio
+import hashlib
+import itertools
+import json
+import queue
+import secrets
+import threading
+import time
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Optional, Union
+
+from app.serialization import dumps, loads
+from app.settings import get_settings
+
+
+# Version 2 frames start with their stream id (see StreamWebSocket).
+_STREAM_PREFIX = '{"stream_id":'
+_decoder = json.JSONDecoder()
+
+
+def _anonymise(value: str, salt: str) -> str:
+    return hashlib.sha256(f"{salt}:{value}".encode()).hexdigest()[:16]
+
+
+class RotatingTraceFile:
+    """
+    Append-only JSON lines file rotated at CAPTURE_MAX_BYTES, keeping
+    CAPTURE_BACKUPS older files as `<path>.1`, `<path>.2`, ...
+    """
+
+    def __init__(self, path: str, max_bytes: int, backups: int) -> None:
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = self.path.open("a", encoding="utf-8")
+        self._size = self._file.tell()
+
+    def write(self, record: dict[str, Any]) -> None:
+        line = dumps(record) + "\n"
+        if self._size and self._size + len(line) > self.max_bytes:
+            self._rotate()
+        self._file.write(line)
+        self._size += len(line)
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+    def _rotate(self) -> None:
+        self._file.close()
+        for index in range(self.backups - 1, 0, -1):
+            source = self.path.with_name(f"{self.path.name}.{index}")
+            if source.exists():
+                source.replace(self.path.with_name(f"{self.path.name}.{index + 1}"))
+        if self.backups > 0:
+            self.path.replace(self.path.with_name(f"{self.path.name}.1"))
+        else:
+            self.path.unlink()
+        self._file = self.path.open("a", encoding="utf-8")
+        self._size = 0
+
+
+class ConnectionTrace:
+    """
+    The trace of one client connection. Times are milliseconds since the
+    connection was opened.
+    """
+
+    def __init__(self, recorder: "TraceRecorder", connection_id: str) -> None:
+        self.recorder = recorder
+        self.connection_id = connection_id
+        self.opened = time.monotonic()
+        self._messages = itertools.count()
+        self.write("open", ts=round(time.time(), 3))
+
+    def elapsed(self) -> float:
+        return round((time.monotonic() - self.opened) * 1000, 1)
+
+    def write(self, kind: str, **fields: Any) -> None:
+        self.recorder.write({"c": self.connection_id, "t": self.elapsed(), "k": kind, **fields})
+
+    def inbound(self, data: str) -> int:
+        """
+        Record an inbound frame without its credentials, and without its
+        prompt text unless CAPTURE_PROMPTS is set, and return its message
+        number. The protocol version, hashed stream id and action of version
+        2 messages are kept so that they replay as they were sent.
+        """
+        message = next(self._messages)
+        record: dict[str, Any] = {"m": message, "n": len(data)}
+        try:
+            body = loads(data)
+        except ValueError:
+            body = None
+        payload = body.get("data", {}) if isinstance(body, dict) else None
+        if isinstance(payload, dict):
+            if "v" in body:
+                record["v"] = body["v"]
+            if body.get("stream_id"):
+                record["stream"] = self.recorder.anonymise(str(body["stream_id"]))
+            if body.get("action"):
+                record["action"] = str(body["action"])
+            record["team"] = payload.get("team", "")
+            prompt = payload.get("prompt")
+            record["prompt_len"] = len(prompt) if isinstance(prompt, str) else 0
+            if self.recorder.capture_prompts and isinstance(prompt, str) and prompt:
+                record["prompt"] = prompt
+            if payload.get("session_id"):
+                record["session"] = self.recorder.anonymise(str(payload["session_id"]))
+                record["offset"] = payload.get("offset", 0)
+        else:
+            record["invalid"] = True
+        self.write("in", **record)
+        return message
+
+    def outbound(self, frame: str) -> None:
+        # Only the frame's first key (after the stream id of version 2
+        # frames) and size are kept, never token text.
+        record: dict[str, Any] = {"n": len(frame)}
+        start = 2
+        if frame.startswith(_STREAM_PREFIX):
+            stream_id, end = _decoder.raw_decode(frame, len(_STREAM_PREFIX))
+            record["stream"] = self.recorder.anonymise(stream_id)
+            start = end + 2
+        kind = frame[start:frame.find('"', start)] if frame.startswith('{"') else ""
+        record["f"] = kind
+        if kind == "session_id":
+            record["session"] = self.recorder.anonymise(loads(frame)["session_id"])
+        elif kind == "statusCode":
+            record["status"] = loads(frame)["statusCode"]
+        elif kind == "token" and '"truncated"' in frame:
+            record["reason"] = loads(frame).get("reason")
+        elif kind == "end":
+            # A version 2 completion frame.
+            completion = loads(frame)
+            record["end"] = completion["end"]
+            if "statusCode" in completion:
+                record["status"] = completion["statusCode"]
+            if completion.get("reason"):
+                record["reason"] = completion["reason"]
+        self.write("out", **record)
+
+    def close(self) -> None:
+        self.write("close")
+        self.recorder.request_flush()
+
+
+# Queued after records to have the writer flush the file.
+_FLUSH = object()
+
+
+class TraceRecorder:
+    """
+    Opt-in capture of WebSocket traffic for offline replay
+    (see scripts/replay_traces.py).
+
+    With CAPTURE_ENABLED set, every connection's inbound frames, outbound
+    frames and upstream token timings are written as compact JSON lines to
+    CAPTURE_PATH. Credentials, prompt text and tokens are never written: only
+    sizes, timings and statuses, with wallet addresses and session ids hashed
+    with CAPTURE_SALT. CAPTURE_PROMPTS additionally keeps the prompt text, for
+    measuring the deduplication hit rate (see scripts/dedup_hit_rate.py).
+
+    Records are queued and written by a background thread, so the event loop
+    never waits for the disk; `flush` waits until they are written.
+    """
+
+    def __init__(self) -> None:
+        self._file: Optional[RotatingTraceFile] = None
+        self._salt: Optional[str] = None
+        self._queue: "queue.SimpleQueue[Union[dict[str, Any], object, Callable[[], None]]]" = (
+            queue.SimpleQueue()
+        )
+        self._writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return get_settings().capture_enabled
+
+    @property
+    def capture_prompts(self) -> bool:
+        return get_settings().capture_prompts
+
+    def connection(self) -> Optional[ConnectionTrace]:
+        if not self.enabled:
+            return None
+        return ConnectionTrace(self, secrets.token_hex(6))
+
+    def anonymise(self, value: str) -> str:
+        if self._salt is None:
+            self._salt = get_settings().capture_salt or secrets.token_hex(16)
+        return _anonymise(value, self._salt)
+
+    def write(self, record: dict[str, Any]) -> None:
+        self._put(record)
+
+    def request_flush(self) -> None:
+        """Have the writer flush the file once the queued records are written."""
+        self._put(_FLUSH)
+
+    async def flush(self) -> None:
+        """Wait until every record queued so far is written and flushed."""
+        if self._writer is None:
+            return
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+
+        def flushed() -> None:
+            loop.call_soon_threadsafe(lambda: done.done() or done.set_result(None))
+
+        self._put(flushed)
+        await done
+
+    def _put(self, item: Union[dict[str, Any], object, Callable[[], None]]) -> None:
+        if self._writer is None:
+            with self._writer_lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(
+                        target=self._run, name="trace-writer", daemon=True
+                    )
+                    self._writer.start()
+        self._queue.put(item)
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if isinstance(item, dict):
+                    self._write(item)
+                    continue
+                if self._file is not None:
+                    self._file.flush()
+                if callable(item):
+                    item()
+            except Exception as e:
+                print("Unable to write capture trace:", e)
+
+    def _write(self, record: dict[str, Any]) -> None:
+        if self._file is None:
+            settings = get_settings()
+            self._file = RotatingTraceFile(
+                settings.capture_path,
+                max_bytes=settings.capture_max_bytes,
+                backups=settings.capture_backups,
+            )
+        self._file.write(record)
+
+
+class CapturingWebSocket:
+    """Wraps a client WebSocket and records every frame sent through it."""
+
+    def __init__(self, websocket, trace: ConnectionTrace) -> None:
+        self._websocket = websocket
+        self._trace = trace
+
+    async def send_text(self, data: str) -> None:
+        await self._websocket.send_text(data)
+        self._trace.outbound(data)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._websocket, name)
+
+
+# The connection trace and message number of the frame being handled, set by
+# the WebSocket endpoint so that the prediction service can add to the trace.
+current_message: ContextVar[Optional[tuple[ConnectionTrace, int]]] = ContextVar(
+    "current_message", default=None
+)
+
+
+def record(kind: str, **fields: Any) -> None:
+    """Add a record about the message being handled, if it is being captured."""
+    current = current_message.get()
+    if current is not None:
+        trace, message = current
+        trace.write(kind, m=message, **fields)
+
+
+trace_recorder = TraceRecorder()
@@ -0,0 +1,135 @@
+import gzip
+import time
+import zlib
+from typing import Any, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.metrics import metrics
+from app.settings import Settings, get_settings
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depends on the environment
+    brotli = None
+
+
+def accepted_encodings(accept_encoding: str) -> set[str]:
+    encodings = set()
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        encodings.add(name.strip().lower())
+    return encodings
+
+
+class CompressionMiddleware:
+    """
+    Compress REST responses with brotli (when installed) or gzip.
+
+    Only complete, uncompressed bodies of at least COMPRESSION_MIN_SIZE bytes
+    are compressed; streamed responses and WebSocket traffic pass through.
+    The bytes saved and the time spent compressing are recorded as metrics.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = self.select_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        settings = get_settings()
+        start_message: Optional[Message] = None
+        passthrough = False
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+            assert start_message is not None
+            headers = MutableHeaders(raw=start_message["headers"])
+            body = message.get("body", b"")
+            if (
+                message.get("more_body", False)
+                or "content-encoding" in headers
+                or len(body) < settings.compression_min_size
+            ):
+                passthrough = True
+                metrics.inc("http_compression_skipped_total")
+                await send(start_message)
+                await send(message)
+                return
+
+            started = time.perf_counter()
+            compressed = self.compress(body, encoding, settings)
+            metrics.inc("http_compression_seconds_total", time.perf_counter() - started, encoding=encoding)
+            metrics.inc("http_compression_bytes_in_total", len(body), encoding=encoding)
+            metrics.inc("http_compression_bytes_out_total", len(compressed), encoding=encoding)
+            metrics.inc("http_compression_responses_total", encoding=encoding)
+
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start_message)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
+
+    @staticmethod
+    def select_encoding(accept_encoding: str) -> Optional[str]:
+        encodings = accepted_encodings(accept_encoding)
+        if brotli is not None and "br" in encodings:
+            return "br"
+        if "gzip" in encodings:
+            return "gzip"
+        return None
+
+    @staticmethod
+    def compress(body: bytes, encoding: str, settings: Settings) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=settings.brotli_quality)
+        return gzip.compress(body, compresslevel=settings.gzip_level)
+
+
+def negotiates_deflate(websocket) -> bool:
+    return "permessage-deflate" in websocket.headers.get("sec-websocket-extensions", "")
+
+
+class DeflateEstimator:
+    """
+    Wraps a client WebSocket and estimates what per-message deflate makes of
+    every frame sent through it.
+
+    The server compresses frames below the ASGI interface, where the
+    application cannot see the result, so the frames are compressed again
+    with the settings uvicorn negotiates (12-bit window, memLevel 5, context
+    takeover). Only a sample of WS_COMPRESSION_SAMPLE_RATE of the
+    connections is wrapped, since this doubles the compression work.
+    """
+
+    def __init__(self, websocket) -> None:
+        self._websocket = websocket
+        self._compressor = zlib.compressobj(wbits=-12, memLevel=5)
+
+    async def send_text(self, data: str) -> None:
+        await self._websocket.send_text(data)
+        raw = data.encode()
+        compressed = self._compressor.compress(raw) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        # The empty block that ends every sync flush is not sent.
+        metrics.inc("ws_deflate_sampled_bytes_in_total", len(raw))
+        metrics.inc("ws_deflate_sampled_bytes_out_total", len(compressed) - 4)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._websocket, name)
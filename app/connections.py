@@ -0,0 +1,215 @@
+import asyncio
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from fastapi import WebSocket
+
+from app.api.predictions.sessions import generation_sessions
+from app.memory import deep_sizeof, memory_diagnostics
+from app.metrics import metrics
+from app.serialization import dumps, loads
+from app.settings import get_settings
+
+# Close codes: 1001 going away (idle), 1008 policy violation (over a limit),
+# 1011 unexpected condition (unresponsive), 1012 service restart (draining).
+CLOSE_IDLE = 1001
+CLOSE_LIMIT = 1008
+CLOSE_UNRESPONSIVE = 1011
+CLOSE_RESTART = 1012
+
+
+class ConnectionLimitExceeded(Exception):
+    pass
+
+
+def is_pong(data: str) -> bool:
+    """Whether an inbound frame is a heartbeat reply, `{"pong": N}`."""
+    # Only frames that can be one are parsed; the handler parses the others.
+    if '"pong"' not in data:
+        return False
+    try:
+        frame = loads(data)
+    except ValueError:
+        return False
+    return isinstance(frame, dict) and "pong" in frame
+
+
+class ClientConnection:
+    def __init__(self, websocket: WebSocket, ip: str) -> None:
+        self.websocket = websocket
+        self.ip = ip
+        self.wallet: Optional[str] = None
+        self.connected_at = time.monotonic()
+        self.last_seen = self.connected_at
+        self.active_requests = 0
+        self.heartbeats = 0
+        # Raised to 2 by the first authenticated version 2 message.
+        self.protocol = 1
+        # Version 2 protocol streams in progress, by client-supplied id.
+        self.streams: dict[str, asyncio.Task] = {}
+
+    def add_stream(self, stream_id: str, task: asyncio.Task) -> None:
+        self.streams[stream_id] = task
+
+        def remove(done: asyncio.Task) -> None:
+            if self.streams.get(stream_id) is done:
+                del self.streams[stream_id]
+
+        task.add_done_callback(remove)
+
+    def touch(self) -> None:
+        self.last_seen = time.monotonic()
+
+    def idle_for(self, now: float) -> float:
+        return 0.0 if self.active_requests else now - self.last_seen
+
+
+class ConnectionManager:
+    """
+    Tracks the open client WebSockets.
+
+    Connections are limited to WS_MAX_CONNECTIONS_PER_IP per client address
+    and, once a message has authenticated them, WS_MAX_CONNECTIONS_PER_WALLET
+    per wallet. Every WS_HEARTBEAT_INTERVAL seconds each connection that
+    speaks protocol version 2 gets a `{"heartbeat": N}` frame (version 1
+    clients do not expect it); a connection whose heartbeat cannot be written
+    within WS_HEARTBEAT_TIMEOUT seconds is unresponsive and is closed, and so
+    is one that has sent nothing (a `{"pong": N}` reply counts) and has no
+    request in progress for WS_IDLE_TIMEOUT seconds.
+    """
+
+    def __init__(self) -> None:
+        self._connections: dict[WebSocket, ClientConnection] = {}
+        self._per_ip: Counter[str] = Counter()
+        self._per_wallet: Counter[str] = Counter()
+
+    def connect(self, websocket: WebSocket, ip: str) -> ClientConnection:
+        if self._per_ip[ip] >= get_settings().ws_max_connections_per_ip:
+            metrics.inc("ws_connections_rejected_total", reason="ip_limit")
+            raise ConnectionLimitExceeded("Too many connections from this address")
+        connection = ClientConnection(websocket, ip)
+        self._connections[websocket] = connection
+        self._per_ip[ip] += 1
+        return connection
+
+    def identify(self, websocket: WebSocket, wallet: Optional[str]) -> None:
+        """
+        Attach the wallet that authenticated a message to its connection.
+        Raises ConnectionLimitExceeded if the wallet already has too many.
+        """
+        connection = self._connections.get(websocket)
+        if connection is None or not wallet or connection.wallet == wallet:
+            return
+        if self._per_wallet[wallet] >= get_settings().ws_max_connections_per_wallet:
+            metrics.inc("ws_connections_rejected_total", reason="wallet_limit")
+            raise ConnectionLimitExceeded("Too many connections for this wallet")
+        self._release_wallet(connection)
+        connection.wallet = wallet
+        self._per_wallet[wallet] += 1
+
+    def disconnect(self, websocket: WebSocket) -> None:
+        # Idempotent: called by the endpoint and by evictions.
+        connection = self._connections.pop(websocket, None)
+        if connection is None:
+            return
+        self._per_ip[connection.ip] -= 1
+        if not self._per_ip[connection.ip]:
+            del self._per_ip[connection.ip]
+        self._release_wallet(connection)
+
+    def get(self, websocket: WebSocket) -> Optional[ClientConnection]:
+        return self._connections.get(websocket)
+
+    def connections(self) -> list[ClientConnection]:
+        return list(self._connections.values())
+
+    @asynccontextmanager
+    async def request(self, connection: ClientConnection) -> AsyncIterator[None]:
+        """Marks the connection busy so it is not evicted as idle meanwhile."""
+        connection.active_requests += 1
+        try:
+            yield
+        finally:
+            connection.active_requests -= 1
+            connection.touch()
+
+    def __len__(self) -> int:
+        return len(self._connections)
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(get_settings().ws_heartbeat_interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                print("Connection heartbeat error:", e)
+
+    async def sweep(self) -> None:
+        idle_timeout = get_settings().ws_idle_timeout
+        now = time.monotonic()
+        heartbeats = []
+        for connection in list(self._connections.values()):
+            if connection.idle_for(now) > idle_timeout:
+                await self.evict(connection, CLOSE_IDLE, "idle")
+            elif connection.protocol >= 2:
+                heartbeats.append(self._heartbeat(connection))
+        await asyncio.gather(*heartbeats)
+
+    async def evict(self, connection: ClientConnection, code: int, reason: str) -> None:
+        self.disconnect(connection.websocket)
+        metrics.inc("ws_connections_evicted_total", reason=reason)
+        try:
+            await asyncio.wait_for(connection.websocket.close(code=code, reason=reason), 5)
+        except Exception as e:
+            print(f"Error closing {reason} WebSocket:", e)
+
+    async def _heartbeat(self, connection: ClientConnection) -> None:
+        timeout = get_settings().ws_heartbeat_timeout
+        connection.heartbeats += 1
+        try:
+            await asyncio.wait_for(
+                connection.websocket.send_text(dumps({"heartbeat": connection.heartbeats})),
+                timeout,
+            )
+        except Exception:
+            await self.evict(connection, CLOSE_UNRESPONSIVE, "unresponsive")
+
+    def _release_wallet(self, connection: ClientConnection) -> None:
+        if connection.wallet is None:
+            return
+        self._per_wallet[connection.wallet] -= 1
+        if not self._per_wallet[connection.wallet]:
+            del self._per_wallet[connection.wallet]
+        connection.wallet = None
+
+    def memory_usage(self) -> dict[str, int]:
+        """Estimated bytes per connection, including the sessions it is attached to."""
+        buffered = generation_sessions.buffer_sizes_by_websocket()
+        return {
+            f"{c.wallet or c.ip}#{id(c):x}": deep_sizeof(list(c.streams))
+            + buffered.get(c.websocket, 0)
+            for c in self._connections.values()
+        }
+
+    def gauges(self) -> dict:
+        now = time.monotonic()
+        idle_timeout = get_settings().ws_idle_timeout
+        connections = self._connections.values()
+        return {
+            (("state", "busy"),): sum(1 for c in connections if c.active_requests),
+            (("state", "idle"),): sum(
+                1 for c in connections
+                if not c.active_requests and now - c.last_seen > idle_timeout / 2
+            ),
+            (("state", "open"),): len(self._connections),
+            (("state", "authenticated"),): sum(1 for c in connections if c.wallet),
+        }
+
+
+connection_manager = ConnectionManager()
+metrics.register_gauge("ws_connections", connection_manager.gauges)
+metrics.register_gauge("ws_connection_ips", lambda: len(connection_manager._per_ip))
+metrics.register_gauge("ws_connection_wallets", lambda: len(connection_manager._per_wallet))
+memory_diagnostics.register("ws_connections", connection_manager.memory_usage)
@@ -0,0 +1,129 @@
+import asyncio
+import signal
+import time
+from typing import Any, Optional
+
+from app.api.predictions.sessions import generation_sessions
+from app.capture import trace_recorder
+from app.connections import CLOSE_RESTART, ClientConnection, connection_manager
+from app.metrics import metrics
+from app.serialization import dumps
+from app.settings import get_settings
+
+# How often the drain checks whether the streams in flight have finished.
+POLL_INTERVAL = 0.1
+# How long cancelled generations get to send their final frame.
+CANCEL_TIMEOUT = 5
+
+RECONNECT_FRAME = dumps({"reconnect": True, "reason": "draining"})
+
+
+class DrainCoordinator:
+    """
+    Takes the instance out of service without cutting streams short.
+
+    Once draining, the readiness probe reports not-ready, new WebSockets and
+    new prompts are refused, and the streams in flight (including queued
+    ones and those of clients that are reconnecting) get DRAIN_GRACE_PERIOD
+    seconds to finish. The ones still running are then ended with a
+    `draining` truncation frame, every client gets a `{"reconnect": true}`
+    frame and its socket is closed with code 1012 (service restart), and the
+    capture trace is flushed.
+
+    A drain starts on SIGTERM, which is passed on to the server once the
+    drain has finished (a second SIGTERM passes it on straight away), or on
+    POST /api/admin/drain, after which the instance waits to be stopped.
+    """
+
+    def __init__(self) -> None:
+        self.draining = False
+        self.started_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        self.started_by_signal = False
+
+    def start(self) -> asyncio.Task:
+        """Start draining, if not already, and return the task doing it."""
+        if self.task is None:
+            self.draining = True
+            self.started_at = time.monotonic()
+            print(f"Draining {len(generation_sessions.in_flight())} streams")
+            self.task = asyncio.create_task(self._drain())
+        return self.task
+
+    def status(self) -> dict[str, Any]:
+        return {
+            "draining": self.draining,
+            "finished": self.task is not None and self.task.done(),
+            "in_flight": len(generation_sessions.in_flight()),
+            "connections": len(connection_manager),
+        }
+
+    async def _drain(self) -> None:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + get_settings().drain_grace_period
+        while generation_sessions.in_flight() and loop.time() < deadline:
+            await asyncio.sleep(POLL_INTERVAL)
+
+        remaining = [s.task for s in generation_sessions.in_flight() if s.task is not None]
+        metrics.inc("drain_streams_cut_total", len(remaining))
+        for task in remaining:
+            task.cancel()
+        if remaining:
+            print(f"Drain grace period over, ending {len(remaining)} streams")
+            await asyncio.wait(remaining, timeout=CANCEL_TIMEOUT)
+
+        await asyncio.gather(
+            *(self._send_away(c) for c in connection_manager.connections())
+        )
+        await trace_recorder.flush()
+        print(f"Drained in {time.monotonic() - self.started_at:.2f}s")
+
+    async def _send_away(self, connection: ClientConnection) -> None:
+        try:
+            await asyncio.wait_for(
+                connection.websocket.send_text(RECONNECT_FRAME),
+                get_settings().ws_heartbeat_timeout,
+            )
+        except Exception as e:
+            print("Error sending reconnect frame:", e)
+        await connection_manager.evict(connection, CLOSE_RESTART, "draining")
+
+    def install_signal_handler(self) -> None:
+        """
+        Drain on SIGTERM before handing the signal to the handler it replaces
+        (the server's, which then shuts down). Call from within the running
+        event loop.
+        """
+        previous = signal.getsignal(signal.SIGTERM)
+        if previous is None:
+            previous = signal.SIG_DFL
+        loop = asyncio.get_running_loop()
+        handed_over = False
+
+        def hand_over(*_: Any) -> None:
+            nonlocal handed_over
+            if handed_over:
+                return
+            handed_over = True
+            loop.remove_signal_handler(signal.SIGTERM)
+            signal.signal(signal.SIGTERM, previous)
+            signal.raise_signal(signal.SIGTERM)
+
+        def on_sigterm() -> None:
+            if self.task is not None and self.started_by_signal:
+                # Signalled again: stop waiting.
+                hand_over()
+                return
+            self.started_by_signal = True
+            self.start().add_done_callback(hand_over)
+
+        try:
+            loop.add_signal_handler(signal.SIGTERM, on_sigterm)
+        except (NotImplementedError, RuntimeError, ValueError):
+            # Not supported on Windows or outside the main thread; only the
+            # admin endpoint drains there.
+            pass
+
+
+drain_coordinator = DrainCoordinator()
+metrics.register_gauge("draining", lambda: int(drain_coordinator.draining))
@@ -1,53 +1,142 @@
-import json
-import os
+import asyncio
 
 from fastapi import WebSocket
 
-from app.api.auth.service import AuthService
+from app.api.auth.service import DEFAULT_TIER, AuthService
+from app.api.db.capacity import CapacityExceeded
 from app.api.predictions.service import PredictionService
+from app.api.predictions.sessions import generation_sessions
+from app.api.predictions.streams import PROTOCOL_VERSIONS, StreamWebSocket
+from app.connections import CLOSE_LIMIT, ConnectionLimitExceeded, connection_manager
+from app.drain import drain_coordinator
+from app.serialization import error_frame, exception_frame, loads, truncation_frame
+from app.settings import get_settings
 
 
 async def handle_message(
     event: dict[str, dict[str, int]], client_websocket: WebSocket
 ) -> None:
-    body = json.loads(event.get("body", "{}"))
+    try:
+        body = loads(event.get("body", "{}"))
+    except ValueError:
+        await client_websocket.send_text(error_frame(400, "Invalid JSON"))
+        return
+
+    # The socket itself; `client_websocket` becomes the stream's view of it
+    # for version 2 messages.
+    websocket = client_websocket
+    version = body.get("v", 1)
+    if version not in PROTOCOL_VERSIONS:
+        await client_websocket.send_text(error_frame(400, "Unsupported protocol version"))
+        return
+    if version == 2:
+        stream_id = body.get("stream_id")
+        if not isinstance(stream_id, str) or not stream_id:
+            await client_websocket.send_text(error_frame(400, "No stream_id provided"))
+            return
+        client_websocket = StreamWebSocket(websocket, stream_id)
+        connection = connection_manager.get(websocket)
+    # Cancelling needs the same credentials as prompting.
+    cancel = version == 2 and body.get("action") == "cancel"
+
     data = body.get("data", {})
     prompt = data.get("prompt", "")
     team = data.get("team", "")
+    session_id = data.get("session_id", "")
     api_key = data.get("api_key_auth", "")
     if not api_key :
-        await client_websocket.send_text(json.dumps({"statusCode": 400, "body": "No api key provided"}))
+        await client_websocket.send_text(error_frame(400, "No api key provided"))
         return
 
-    if api_key != os.environ.get("API_KEY_AUTH"):
-        await client_websocket.send_text(
-            json.dumps({"statusCode": 401, "body": "Unauthorized"})
-        )
+    settings = get_settings()
+    if api_key != settings.api_key_auth:
+        await client_websocket.send_text(error_frame(401, "Unauthorized"))
         return
 
-    if not prompt:
-        await client_websocket.send_text(
-            json.dumps({"statusCode": 400, "body": "No prompt provided"})
-        )
+    if not prompt and not session_id and not cancel:
+        await client_websocket.send_text(error_frame(400, "No prompt provided"))
         return
 
     token: str = data.get("token", "")
     if not token:
-        await client_websocket.send_text(
-            json.dumps({"statusCode": 400, "body": "No token provided"})
-        )
+        await client_websocket.send_text(error_frame(400, "No token provided"))
         return
 
     try:
-        AuthService.verify_token(token)
+        payload = AuthService.verify_token(token)
     except ValueError as e:
-        error_message: str = str(e)
-        await client_websocket.send_text(
-            json.dumps({"statusCode": 498, "body": error_message})
+        await client_websocket.send_text(exception_frame(498, e))
+        return
+
+    owner = payload.get("wallet_address")
+    try:
+        connection_manager.identify(websocket, owner)
+    except ConnectionLimitExceeded as e:
+        await client_websocket.send_text(exception_frame(429, e))
+        await websocket.close(code=CLOSE_LIMIT, reason=str(e))
+        return
+
+    if cancel:
+        await cancel_stream(connection, client_websocket)
+        return
+
+    if version == 2 and connection is not None:
+        connection.protocol = 2
+        if stream_id in connection.streams:
+            await client_websocket.send_text(error_frame(409, "Stream already in progress"))
+            return
+        if len(connection.streams) >= settings.ws_max_streams:
+            await client_websocket.send_text(error_frame(429, "Too many streams"))
+            return
+
+    if session_id:
+        try:
+            offset = int(data.get("offset", 0))
+        except (TypeError, ValueError):
+            await client_websocket.send_text(error_frame(400, "Invalid offset"))
+            return
+        session = await generation_sessions.resume(
+            session_id, owner, client_websocket, offset
         )
+        if version == 2 and connection is not None and session is not None:
+            if session.task is not None and not session.task.done():
+                connection.add_stream(stream_id, session.task)
+        return
+
+    if drain_coordinator.draining:
+        # Resuming is still allowed above: the session only exists here.
+        await client_websocket.send_text(error_frame(503, "Server is draining, reconnect"))
         return
 
-    await PredictionService.get_new_prediction(prompt, client_websocket, team)
+    if version == 2 and connection is not None:
+        connection.add_stream(stream_id, asyncio.current_task())
+
+    try:
+        await PredictionService.get_new_prediction(
+            prompt,
+            client_websocket,
+            team,
+            tier=payload.get("tier", DEFAULT_TIER),
+            owner=owner,
+        )
+    except CapacityExceeded as e:
+        await client_websocket.send_text(exception_frame(503, e))
+        return
+    except asyncio.CancelledError:
+        # Cancelled before the generation could end the stream itself.
+        if version == 2 and not client_websocket.finished:
+            await client_websocket.send_text(truncation_frame("cancelled"))
+        raise
     print("Finished getting new prediction")
 
 
+async def cancel_stream(connection, client_websocket: StreamWebSocket) -> None:
+    """
+    Cancel a version 2 stream of this connection. The stream then ends with
+    a `cancelled` completion frame.
+    """
+    task = connection.streams.get(client_websocket.stream_id) if connection else None
+    if task is None:
+        await client_websocket.send_text(error_frame(404, "Stream not found"))
+        return
+    task.cancel()
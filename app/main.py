@@ -1,16 +1,54 @@
 import asyncio
+import random
+from contextlib import asynccontextmanager
 
-from dotenv import load_dotenv
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.api.db.capacity import CapacityExceeded
 from app.api.main_router import api_router
+from app.api.predictions.aggregates import run_reconciliation
+from app.api.predictions.lifecycle import event_lifecycle
+from app.capture import CapturingWebSocket, current_message, trace_recorder
+from app.compression import CompressionMiddleware, DeflateEstimator, negotiates_deflate
+from app.connections import (
+    CLOSE_LIMIT,
+    CLOSE_RESTART,
+    ClientConnection,
+    ConnectionLimitExceeded,
+    connection_manager,
+    is_pong,
+)
+from app.drain import drain_coordinator
 from app.handlers import handle_message
+from app.memory import memory_diagnostics
+from app.serialization import FastJSONResponse
+from app.settings import get_settings, install_reload_handler
+from app.startup import warm_up
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Fail fast on invalid settings.
+    get_settings()
+    # Warm up in the background so the liveness probe answers straight away;
+    # the readiness probe reports not-ready until the warm-up has finished.
+    tasks = [
+        asyncio.create_task(warm_up()),
+        asyncio.create_task(run_reconciliation()),
+        asyncio.create_task(event_lifecycle.run()),
+        asyncio.create_task(connection_manager.run()),
+        asyncio.create_task(memory_diagnostics.run()),
+    ]
+    install_reload_handler()
+    drain_coordinator.install_signal_handler()
+    yield
+    for task in tasks:
+        task.cancel()
+    await trace_recorder.flush()
 
-load_dotenv()
 
-app = FastAPI()
-clients: set[WebSocket] = set()
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 
 origins = [
     "http://localhost",
@@ -23,22 +61,64 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware)
 app.include_router(api_router, prefix="/api")
 
 
+@app.exception_handler(CapacityExceeded)
+async def capacity_exceeded_handler(request: Request, exc: CapacityExceeded):
+    return FastJSONResponse({"detail": str(exc)}, status_code=503, headers={"Retry-After": "1"})
+
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    await websocket.accept()
-    clients.add(websocket)
-
+    trace = trace_recorder.connection()
+    client = websocket if trace is None else CapturingWebSocket(websocket, trace)
+    sample_rate = get_settings().ws_compression_sample_rate
+    if negotiates_deflate(websocket) and random.random() < sample_rate:
+        client = DeflateEstimator(client)
+    ip = websocket.client.host if websocket.client else ""
+    if drain_coordinator.draining:
+        await websocket.close(code=CLOSE_RESTART, reason="Draining")
+        if trace is not None:
+            trace.close()
+        return
+    try:
+        connection = connection_manager.connect(client, ip)
+    except ConnectionLimitExceeded as e:
+        await websocket.close(code=CLOSE_LIMIT, reason=str(e))
+        if trace is not None:
+            trace.close()
+        return
     try:
+        # Inside the try: a client that drops during the handshake is
+        # still unregistered.
+        await websocket.accept()
         while True:
             data: str = await websocket.receive_text()
+            connection.touch()
+            if is_pong(data):
+                continue
             event = {
                 "body": data,
-                "requestContext": {"connectionId": websocket.client.host},
+                "requestContext": {"connectionId": ip},
             }
-            asyncio.create_task(handle_message(event, websocket))
+            if trace is not None:
+                # Copied into the handler task's context.
+                current_message.set((trace, trace.inbound(data)))
+            asyncio.create_task(handle_request(connection, event, client))
     except WebSocketDisconnect:
         print("Client disconnected")
-        clients.remove(websocket)
+    except Exception as e:
+        print("WebSocket connection error:", e)
+    finally:
+        connection_manager.disconnect(client)
+        if trace is not None:
+            trace.close()
+
+
+async def handle_request(
+    connection: ClientConnection, event: dict, client_websocket: WebSocket
+) -> None:
+    async with connection_manager.request(connection):
+        await handle_message(event, client_websocket)
@@ -0,0 +1,273 @@
+import asyncio
+import gc
+import os
+import sys
+import tracemalloc
+from collections import Counter, deque
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Optional, Union
+
+from app.metrics import metrics
+from app.settings import get_settings
+
+Sizer = Callable[[], Union[int, dict[str, int]]]
+
+APP_ROOT = Path(__file__).resolve().parent
+# Leaf types whose sys.getsizeof is their whole size.
+_ATOMIC = (str, bytes, bytearray, int, float, bool, type(None))
+_CONTAINERS = (list, tuple, set, frozenset, deque)
+
+
+def deep_sizeof(obj: Any) -> int:
+    """
+    Estimate the bytes held by `obj` and the containers, strings and numbers
+    it refers to, each counted once. Other objects are counted shallowly and
+    not followed, so that e.g. a WebSocket does not pull in the whole app.
+    """
+    seen: set[int] = set()
+    total = 0
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item)
+        if isinstance(item, _ATOMIC):
+            continue
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, _CONTAINERS):
+            stack.extend(item)
+    return total
+
+
+@lru_cache(maxsize=4096)
+def subsystem(filename: str) -> str:
+    """
+    The subsystem an allocation site belongs to: the module for files of the
+    application (e.g. `app.api.predictions.sessions`), the top-level package
+    for libraries, `<...>` for frozen and built-in code.
+    """
+    if filename.startswith("<"):
+        return filename
+    path = Path(filename)
+    try:
+        relative = path.resolve().relative_to(APP_ROOT.parent)
+        return ".".join(relative.with_suffix("").parts)
+    except ValueError:
+        pass
+    parts = path.parts
+    if "site-packages" in parts:
+        return parts[parts.index("site-packages") + 1].split(".")[0]
+    return path.stem
+
+
+@lru_cache(maxsize=4096)
+def _in_app(filename: str) -> bool:
+    return not filename.startswith("<") and Path(filename).resolve().is_relative_to(APP_ROOT)
+
+
+def _attribute(traceback: tracemalloc.Traceback) -> str:
+    # The innermost application frame, else the innermost frame.
+    for frame in reversed(traceback):
+        if _in_app(frame.filename):
+            return subsystem(frame.filename)
+    return subsystem(traceback[-1].filename)
+
+
+def resident_memory_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+
+        # Peak rather than current RSS where /proc is unavailable (kilobytes
+        # on Linux, bytes on macOS).
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class MemoryDiagnostics:
+    """
+    Accounts for the memory of the process.
+
+    A lightweight sampler records the RSS, the interpreter's allocated blocks
+    and the garbage collector's counts every MEMORY_SAMPLE_INTERVAL seconds
+    as gauges. On demand it reports the estimated bytes held by every
+    registered subsystem (sessions, caches, connections, ...), tracemalloc
+    snapshots and diffs grouped by allocation site and subsystem, and the
+    types whose object counts changed most since the previous call.
+    """
+
+    def __init__(self) -> None:
+        self.sizers: dict[str, Sizer] = {}
+        self.samples: dict[str, float] = {}
+        self._snapshot: Optional[tracemalloc.Snapshot] = None
+        self._object_counts: Optional[Counter[str]] = None
+
+    def register(self, name: str, sizer: Sizer) -> None:
+        """
+        Register a subsystem; `sizer` returns its estimated bytes, or bytes
+        per item (e.g. per cache or per connection).
+        """
+        self.sizers[name] = sizer
+
+    def sizes(self, limit: int = 20) -> dict[str, dict[str, Any]]:
+        """
+        The estimated bytes of every subsystem and, for those sized per item,
+        the number of items and the `limit` largest ones.
+        """
+        report: dict[str, dict[str, Any]] = {}
+        for name, sizer in self.sizers.items():
+            try:
+                size = sizer()
+            except Exception as e:
+                report[name] = {"error": str(e)}
+                continue
+            if isinstance(size, dict):
+                largest = sorted(size.items(), key=lambda item: -item[1])[:limit]
+                report[name] = {
+                    "bytes": sum(size.values()),
+                    "count": len(size),
+                    "largest": dict(largest),
+                }
+            else:
+                report[name] = {"bytes": size}
+        return report
+
+    def sample(self) -> dict[str, float]:
+        counts = gc.get_count()
+        self.samples = {
+            "rss_bytes": resident_memory_bytes(),
+            "allocated_blocks": sys.getallocatedblocks(),
+            "gc_generation0": counts[0],
+            "gc_generation1": counts[1],
+            "gc_generation2": counts[2],
+        }
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            self.samples.update(traced_bytes=current, traced_peak_bytes=peak)
+        return self.samples
+
+    async def run(self) -> None:
+        while True:
+            try:
+                self.sample()
+            except Exception as e:
+                print("Memory sampling error:", e)
+            await asyncio.sleep(get_settings().memory_sample_interval)
+
+    def start_tracing(self, frames: Optional[int] = None) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames or get_settings().tracemalloc_frames)
+        self._snapshot = None
+
+    def stop_tracing(self) -> None:
+        tracemalloc.stop()
+        self._snapshot = None
+
+    def snapshot(self, limit: int = 20) -> dict[str, Any]:
+        """
+        Take a tracemalloc snapshot, keep it as the baseline for `diff` and
+        return its largest allocation sites and subsystems.
+        """
+        snapshot = self._take_snapshot()
+        self._snapshot = snapshot
+        statistics = snapshot.statistics("traceback")
+        by_subsystem: Counter[str] = Counter()
+        for stat in statistics:
+            by_subsystem[_attribute(stat.traceback)] += stat.size
+        return {
+            "traced_bytes": sum(stat.size for stat in statistics),
+            "subsystems": dict(by_subsystem.most_common(limit)),
+            "top": [
+                {
+                    "site": _site(stat.traceback),
+                    "subsystem": _attribute(stat.traceback),
+                    "bytes": stat.size,
+                    "count": stat.count,
+                }
+                for stat in statistics[:limit]
+            ],
+        }
+
+    def diff(self, limit: int = 20) -> dict[str, Any]:
+        """
+        Compare a new snapshot with the baseline taken by `snapshot`, which is
+        kept so that repeated diffs show the growth since then.
+        """
+        if self._snapshot is None:
+            raise LookupError("No baseline snapshot, take one first")
+        differences = self._take_snapshot().compare_to(self._snapshot, "traceback")
+        by_subsystem: Counter[str] = Counter()
+        for stat in differences:
+            by_subsystem[_attribute(stat.traceback)] += stat.size_diff
+        ranked = sorted(by_subsystem.items(), key=lambda item: -abs(item[1]))
+        return {
+            "size_diff": sum(stat.size_diff for stat in differences),
+            "subsystems": dict(ranked[:limit]),
+            "top": [
+                {
+                    "site": _site(stat.traceback),
+                    "subsystem": _attribute(stat.traceback),
+                    "size_diff": stat.size_diff,
+                    "count_diff": stat.count_diff,
+                }
+                for stat in differences[:limit]
+            ],
+        }
+
+    def object_deltas(self, limit: int = 20) -> dict[str, Any]:
+        """
+        Count the objects tracked by the garbage collector by type and return
+        the largest changes since the previous call.
+        """
+        gc.collect()
+        counts = Counter(type(obj).__qualname__ for obj in gc.get_objects())
+        previous, self._object_counts = self._object_counts, counts
+        if previous is None:
+            return {"baseline": True, "top": dict(counts.most_common(limit))}
+        deltas = counts.copy()
+        deltas.subtract(previous)
+        ranked = sorted(
+            ((name, delta) for name, delta in deltas.items() if delta),
+            key=lambda item: -abs(item[1]),
+        )
+        return {"baseline": False, "top": dict(ranked[:limit])}
+
+    def _take_snapshot(self) -> tracemalloc.Snapshot:
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc is not tracing, start it first")
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+
+
+def _site(traceback: tracemalloc.Traceback) -> str:
+    frame = traceback[-1]
+    return f"{frame.filename}:{frame.lineno}"
+
+
+memory_diagnostics = MemoryDiagnostics()
+for _name in ("rss_bytes", "allocated_blocks", "traced_bytes"):
+    metrics.register_gauge(
+        f"process_memory_{_name}", lambda name=_name: memory_diagnostics.samples.get(name, 0)
+    )
+metrics.register_gauge(
+    "process_gc_objects",
+    lambda: {
+        (("generation", str(generation)),): memory_diagnostics.samples.get(
+            f"gc_generation{generation}", 0
+        )
+        for generation in range(3)
+    },
+)
+memory_diagnostics.register(
+    "metrics", lambda: deep_sizeof(metrics.counters) + deep_sizeof(metrics.gauges)
+)
@@ -0,0 +1,60 @@
+from collections import defaultdict
+from typing import Callable, Union
+
+Labels = tuple[tuple[str, str], ...]
+
+
+def _labels(labels: dict[str, str]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Metrics:
+    """
+    Minimal in-process metrics registry.
+
+    Counters accumulate, gauges hold the last value set or are computed on
+    demand by a registered callable. `render` exports everything in the
+    Prometheus text format for the `/api/metrics/` endpoint.
+    """
+
+    def __init__(self) -> None:
+        self.counters: dict[str, dict[Labels, float]] = defaultdict(
+            lambda: defaultdict(float)
+        )
+        self.gauges: dict[str, dict[Labels, float]] = defaultdict(dict)
+        self.gauge_functions: dict[str, Callable[[], Union[float, dict[Labels, float]]]] = {}
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        self.counters[name][_labels(labels)] += value
+
+    def set_gauge(self, name: str, value: float, **labels: str) -> None:
+        self.gauges[name][_labels(labels)] = value
+
+    def register_gauge(
+        self, name: str, function: Callable[[], Union[float, dict[Labels, float]]]
+    ) -> None:
+        self.gauge_functions[name] = function
+
+    def collect(self) -> dict[str, dict[Labels, float]]:
+        collected: dict[str, dict[Labels, float]] = {}
+        for name, series in self.counters.items():
+            collected[name] = dict(series)
+        for name, series in self.gauges.items():
+            collected[name] = dict(series)
+        for name, function in self.gauge_functions.items():
+            value = function()
+            collected[name] = value if isinstance(value, dict) else {(): value}
+        return collected
+
+    def render(self) -> str:
+        lines = []
+        for name, series in sorted(self.collect().items()):
+            kind = "counter" if name in self.counters else "gauge"
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in series.items():
+                label_str = ",".join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f"{name}{{{label_str}}} {value}" if labels else f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
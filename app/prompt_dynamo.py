@@ -1,41 +1,158 @@
-import os
+import asyncio
+import time
+from typing import Any, Optional
 
-import boto3
+from app.api.db.db import get_dynamodb_resource
+from app.memory import deep_sizeof, memory_diagnostics
+from app.settings import get_settings
+
+PROMPTS_TABLE = "bs-olympics-context-prompts"
+BATCH_GET_LIMIT = 100
+BATCH_GET_RETRIES = 5
+
+DEFAULT_PROMPTS = {
+    "contextPrompt": "Generate a response in a simple list format with hierarchy, "
+    "including up to three options. Begin with a headline to set up "
+    "the answer. Reiterate the product category mentioned in the inquiry for context.",
+    "assistantPrompt": "As an expert language model specialized in the Food & "
+    "Beverage sector in the U.S., your knowledge "
+    "spans various aspects such as market trends, "
+    "consumer preferences, industry regulations, and product innovations. "
+    "Your expertise allows you to provide insightful information and "
+    "recommendations tailored to the unique challenges and opportunities within "
+    "this dynamic sector.",
+}
 
 
 def default_prompts() -> dict[str, str]:
     # Return default prompts if the prompt key is not found in DynamoDB
+    return dict(DEFAULT_PROMPTS)
+
+
+def _prompts_from_item(item: dict[str, Any]) -> dict[str, str]:
     return {
-        "contextPrompt": "Generate a response in a simple list format with hierarchy, "
-        "including up to three options. Begin with a headline to set up "
-        "the answer. Reiterate the product category mentioned in the inquiry for context.",
-        "assistantPrompt": "As an expert language model specialized in the Food & "
-        "Beverage sector in the U.S., your knowledge "
-        "spans various aspects such as market trends, "
-        "consumer preferences, industry regulations, and product innovations. "
-        "Your expertise allows you to provide insightful information and "
-        "recommendations tailored to the unique challenges and opportunities within "
-        "this dynamic sector.",
+        "contextPrompt": item.get("contextPrompt", DEFAULT_PROMPTS["contextPrompt"]),
+        "assistantPrompt": item.get("assistantPrompt", DEFAULT_PROMPTS["assistantPrompt"]),
     }
 
 
-def get_prompts_from_dynamodb(prompt_key: str) -> dict[str, str]:
-    # Retrieve both prompts from DynamoDB using the prompt key
-    region_name = os.environ.get("AWS_REGION")
-    dynamodb = boto3.resource("dynamodb", region_name=region_name)
-    table = dynamodb.Table("bs-olympics-context-prompts")
-
-    response = table.get_item(Key={"sport_key": prompt_key})
-
-    if "Item" in response:
-        item = response["Item"]
-        return {
-            "contextPrompt": item.get(
-                "contextPrompt", default_prompts()["contextPrompt"]
-            ),
-            "assistantPrompt": item.get(
-                "assistantPrompt", default_prompts()["assistantPrompt"]
-            ),
-        }
-    else:
-        return default_prompts()
+async def get_prompts_from_dynamodb(prompt_key: str) -> dict[str, str]:
+    # Retrieve both prompts for the prompt key, through the cache that the
+    # warm-up preloads PROMPT_KEYS into
+    return await prompt_repository.get(prompt_key)
+
+
+class PromptRepository:
+    """
+    Cached, async access to the prompts table.
+
+    Entries are fresh for PROMPTS_CACHE_TTL seconds. For PROMPTS_STALE_TTL seconds
+    after that the stale value is still served immediately while a single
+    background refresh fetches the new one. Keys missing from the table are
+    cached as misses for PROMPTS_NEGATIVE_TTL seconds and resolve to
+    `default_prompts()`. Concurrent misses for the same key share one fetch.
+    """
+
+    def __init__(self, table_name: str = PROMPTS_TABLE) -> None:
+        self.table_name = table_name
+        # prompt_key -> (prompts, or None for a missing key, fetched_at)
+        self._entries: dict[str, tuple[Optional[dict[str, str]], float]] = {}
+        self._inflight: dict[str, asyncio.Task] = {}
+
+    @property
+    def fresh_ttl(self) -> float:
+        return get_settings().prompts_cache_ttl
+
+    @property
+    def stale_ttl(self) -> float:
+        return get_settings().prompts_stale_ttl
+
+    @property
+    def negative_ttl(self) -> float:
+        return get_settings().prompts_negative_ttl
+
+    async def get(self, prompt_key: str) -> dict[str, str]:
+        entry = self._entries.get(prompt_key)
+        if entry is not None:
+            prompts, fetched_at = entry
+            age = time.monotonic() - fetched_at
+            ttl = self.fresh_ttl if prompts is not None else self.negative_ttl
+            if age < ttl:
+                return self._resolve(prompts)
+            if age < ttl + self.stale_ttl:
+                self._refresh(prompt_key)
+                return self._resolve(prompts)
+        prompts = await asyncio.shield(self._refresh(prompt_key))
+        return self._resolve(prompts)
+
+    async def preload(self, prompt_keys: list[str]) -> None:
+        """
+        Load many keys with `batch_get_item`, 100 keys per request, caching the
+        keys that are not in the table as misses.
+        """
+        prompt_keys = list(dict.fromkeys(prompt_keys))
+        for start in range(0, len(prompt_keys), BATCH_GET_LIMIT):
+            chunk = prompt_keys[start:start + BATCH_GET_LIMIT]
+            items = await asyncio.to_thread(self._fetch_batch, chunk)
+            fetched_at = time.monotonic()
+            for prompt_key in chunk:
+                item = items.get(prompt_key)
+                self._entries[prompt_key] = (
+                    _prompts_from_item(item) if item is not None else None,
+                    fetched_at,
+                )
+
+    def invalidate(self, prompt_key: Optional[str] = None) -> None:
+        if prompt_key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(prompt_key, None)
+
+    @staticmethod
+    def _resolve(prompts: Optional[dict[str, str]]) -> dict[str, str]:
+        return dict(prompts) if prompts is not None else default_prompts()
+
+    def _refresh(self, prompt_key: str) -> asyncio.Task:
+        task = self._inflight.get(prompt_key)
+        if task is None:
+            task = asyncio.create_task(self._load(prompt_key))
+            self._inflight[prompt_key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(prompt_key, None))
+        return task
+
+    async def _load(self, prompt_key: str) -> Optional[dict[str, str]]:
+        try:
+            item = await asyncio.to_thread(self._fetch, prompt_key)
+        except Exception as e:
+            entry = self._entries.get(prompt_key)
+            if entry is None:
+                raise
+            # Keep serving the stale value rather than failing the caller.
+            print(f"Unable to refresh prompts for {prompt_key}:", e)
+            return entry[0]
+        prompts = _prompts_from_item(item) if item is not None else None
+        self._entries[prompt_key] = (prompts, time.monotonic())
+        return prompts
+
+    def _fetch(self, prompt_key: str) -> Optional[dict[str, Any]]:
+        table = get_dynamodb_resource().Table(self.table_name)
+        return table.get_item(Key={"sport_key": prompt_key}).get("Item")
+
+    def _fetch_batch(self, prompt_keys: list[str]) -> dict[str, dict[str, Any]]:
+        dynamodb = get_dynamodb_resource()
+        request = {self.table_name: {"Keys": [{"sport_key": k} for k in prompt_keys]}}
+        items: dict[str, dict[str, Any]] = {}
+        for attempt in range(BATCH_GET_RETRIES):
+            response = dynamodb.batch_get_item(RequestItems=request)
+            for item in response.get("Responses", {}).get(self.table_name, []):
+                items[item["sport_key"]] = item
+            request = response.get("UnprocessedKeys")
+            if not request:
+                return items
+            time.sleep(0.05 * 2**attempt)
+        unprocessed = len(request[self.table_name]["Keys"])
+        raise Exception(f"Unable to preload prompts: {unprocessed} keys unprocessed")
+
+
+prompt_repository = PromptRepository()
+memory_diagnostics.register("prompt_cache", lambda: deep_sizeof(prompt_repository._entries))
@@ -0,0 +1,110 @@
+import json
+import math
+from typing import Any, Optional
+
+from app.memory import deep_sizeof, memory_diagnostics
+from app.settings import get_settings
+
+# Rough characters-per-token ratio used to estimate prompt size without a tokenizer.
+CHARS_PER_TOKEN = 4
+
+
+class PromptTooLargeError(ValueError):
+    pass
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+class PromptTemplate:
+    """
+    An event's prompt payload, serialised once.
+
+    The static system and assistant contexts are JSON-encoded when the template
+    is built; rendering only escapes the user prompt and splices it, together
+    with the token budget, around the pre-encoded part. The result is identical
+    to `utils.generate_json_prompt`.
+    """
+
+    __slots__ = ("version", "static_tokens", "_body")
+
+    def __init__(
+        self, system_context_prompt: str, assistant_context_prompt: str, version: Any
+    ) -> None:
+        self.version = version
+        self.static_tokens = estimate_tokens(system_context_prompt) + estimate_tokens(
+            assistant_context_prompt
+        )
+        contexts = json.dumps(
+            {
+                "system_context": system_context_prompt,
+                "assistant_context": assistant_context_prompt,
+            }
+        )
+        self._body = ", " + contexts[1:-1] + ', "max_tokens": '
+
+    def check_budget(self, prompt: str) -> None:
+        max_prompt_tokens = get_settings().max_prompt_tokens
+        if not max_prompt_tokens:
+            return
+        tokens = self.static_tokens + estimate_tokens(prompt)
+        if tokens > max_prompt_tokens:
+            raise PromptTooLargeError(
+                f"Prompt is too large: ~{tokens} tokens, limit is {max_prompt_tokens}"
+            )
+
+    def render(self, prompt: str, max_tokens: int) -> str:
+        self.check_budget(prompt)
+        return '{"user_prompt": ' + json.dumps(prompt) + self._body + f"{max_tokens}}}"
+
+
+def prompt_version(item: dict[str, Any]) -> Any:
+    """
+    Identify a revision of a prompt row.
+
+    An explicit `version` or `updated_at` attribute wins. Otherwise the hash of
+    both prompts is used, which is cheap for rows served from the events cache
+    because Python caches the hash on the string objects.
+    """
+    version = item.get("version") or item.get("updated_at")
+    if version is not None:
+        return version
+    return hash((item.get("contextPrompt"), item.get("assistantPrompt")))
+
+
+class PromptTemplateCache:
+    def __init__(self) -> None:
+        self._templates: dict[str, PromptTemplate] = {}
+
+    def for_event(self, event: dict[str, Any]) -> PromptTemplate:
+        """
+        Return the template for an event row, rebuilding it if the row's prompts
+        changed since it was compiled.
+        """
+        version = prompt_version(event)
+        template = self._templates.get(event["team"])
+        if template is None or template.version != version:
+            template = PromptTemplate(
+                event["contextPrompt"], event["assistantPrompt"], version
+            )
+            self._templates[event["team"]] = template
+        return template
+
+    def preload(self, events: list[dict[str, Any]]) -> None:
+        for event in events:
+            self.for_event(event)
+
+    def invalidate(self, team: Optional[str] = None) -> None:
+        if team is None:
+            self._templates.clear()
+        else:
+            self._templates.pop(team, None)
+
+
+prompt_templates = PromptTemplateCache()
+memory_diagnostics.register(
+    "prompt_templates",
+    lambda: deep_sizeof(prompt_templates._templates)
+    + sum(deep_sizeof((t.version, t._body)) for t in prompt_templates._templates.values()),
+)
@@ -0,0 +1,79 @@
+import json
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, Optional
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    # DynamoDB returns every number as a Decimal.
+    if isinstance(obj, Decimal):
+        return int(obj) if obj == obj.to_integral_value() else float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+
+    def dumps_bytes(obj: Any) -> bytes:
+        return orjson.dumps(obj, default=_default)
+
+    def dumps(obj: Any) -> str:
+        return orjson.dumps(obj, default=_default).decode()
+
+    loads = orjson.loads
+
+else:
+
+    def dumps(obj: Any) -> str:
+        return json.dumps(obj, default=_default, separators=(",", ":"))
+
+    def dumps_bytes(obj: Any) -> bytes:
+        return dumps(obj).encode()
+
+    loads = json.loads
+
+
+def token_frame(token: str, offset: Optional[int] = None) -> str:
+    if offset is None:
+        return '{"token":' + dumps(token) + "}"
+    return '{"token":' + dumps(token) + ',"offset":' + str(offset) + "}"
+
+
+@lru_cache(maxsize=64)
+def error_frame(status_code: int, body: str) -> str:
+    # Cached: only for the fixed messages; use exception_frame for the others.
+    return dumps({"statusCode": status_code, "body": body})
+
+
+def exception_frame(status_code: int, error: Exception) -> str:
+    # Not cached: the message varies with the exception.
+    return dumps({"statusCode": status_code, "body": str(error)})
+
+
+@lru_cache(maxsize=8)
+def truncation_frame(reason: str) -> str:
+    # Ends the stream like END_OF_RESPONSE, flagged so clients can tell it was cut short.
+    return dumps({"token": "END_OF_RESPONSE", "truncated": True, "reason": reason})
+
+
+END_OF_RESPONSE_FRAME = token_frame("END_OF_RESPONSE")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response rendered with the fast serialiser.
+
+    Endpoints that return large lists can return this directly: FastAPI then
+    skips validating and re-serialising the payload through the response model.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps_bytes(content)
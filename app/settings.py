@@ -0,0 +1,240 @@
+import asyncio
+import os
+import signal
+from typing import Any, Callable, Mapping, Optional
+
+from pydantic import (
+    BaseModel,
+    ConfigDict,
+    Field,
+    NonNegativeFloat,
+    NonNegativeInt,
+    PositiveFloat,
+    PositiveInt,
+    ValidationError,
+    field_validator,
+    model_validator,
+)
+
+ReloadHook = Callable[["Settings", "Settings"], None]
+
+# Read once when first used; changing them needs a restart.
+RESTART_REQUIRED = frozenset(
+    {"aws_region", "capture_path", "capture_max_bytes", "capture_backups", "capture_salt"}
+)
+
+
+class Settings(BaseModel):
+    """
+    The application configuration, validated when loaded.
+
+    Every field is read from the environment variable of the same name in
+    upper case (e.g. `retry_time` from RETRY_TIME); unset or empty variables
+    keep the default. Instances are immutable: a reload builds a new one.
+    """
+
+    model_config = ConfigDict(frozen=True)
+
+    # Required to serve traffic, see `app.startup.verify_configuration`.
+    akash_endpoint: Optional[str] = None
+    aws_region: Optional[str] = None
+    secret_key: Optional[str] = Field(None, repr=False)
+    api_key_auth: Optional[str] = Field(None, repr=False)
+    access_token_expire_minutes: PositiveInt = 10080
+
+    # Generation and token budgets.
+    retry_count: PositiveInt = 3
+    retry_time: NonNegativeFloat = 30
+    generation_deadline: PositiveFloat = 180
+    default_max_tokens: PositiveInt = 10000
+    min_max_tokens: PositiveInt = 1000
+    budget_queue_threshold: PositiveInt = 50
+    budget_latency_threshold: PositiveFloat = 5
+    budget_reduction_factor: float = Field(0.5, gt=0, le=1)
+    max_prompt_tokens: NonNegativeInt = 0
+    inference_max_concurrency: PositiveInt = 8
+    scheduler_max_queue: NonNegativeInt = 1000
+    scheduler_quantum: PositiveFloat = 1
+    scheduler_tier_weights: dict[str, PositiveFloat] = {}
+    session_grace_period: NonNegativeFloat = 30
+    session_buffer_size: PositiveInt = 2048
+    drain_grace_period: NonNegativeFloat = 25
+
+    # Caches and background jobs.
+    events_cache_ttl: PositiveFloat = 300
+    prompts_cache_ttl: NonNegativeFloat = 300
+    prompts_stale_ttl: NonNegativeFloat = 3600
+    prompts_negative_ttl: NonNegativeFloat = 60
+    prompt_keys: list[str] = []
+    readiness_timeout: PositiveFloat = 5
+    readiness_check_interval: PositiveFloat = 10
+    stats_scan_segments: PositiveInt = 4
+    stats_reconcile_interval: PositiveFloat = 600
+    team_index: str = "team-index"
+    event_prewarm_lead: NonNegativeFloat = 120
+    event_timeline_refresh: PositiveFloat = 600
+
+    # REST responses.
+    compression_min_size: NonNegativeInt = 1024
+    gzip_level: int = Field(6, ge=0, le=9)
+    brotli_quality: int = Field(4, ge=0, le=11)
+    ws_compression_sample_rate: float = Field(0.05, ge=0, le=1)
+
+    # Traffic capture.
+    capture_enabled: bool = False
+    capture_prompts: bool = False
+    capture_path: str = "captures/trace.jsonl"
+    capture_max_bytes: PositiveInt = 50 * 1024 * 1024
+    capture_backups: NonNegativeInt = 5
+    capture_salt: Optional[str] = Field(None, repr=False)
+
+    # Client WebSockets.
+    ws_max_connections_per_ip: NonNegativeInt = 20
+    ws_max_connections_per_wallet: NonNegativeInt = 5
+    ws_heartbeat_interval: PositiveFloat = 25
+    ws_heartbeat_timeout: PositiveFloat = 10
+    ws_idle_timeout: PositiveFloat = 300
+    ws_max_streams: PositiveInt = 8
+
+    # DynamoDB capacity.
+    dynamodb_backoff_factor: float = Field(0.5, gt=0, lt=1)
+    dynamodb_min_rate: PositiveFloat = 1
+    dynamodb_rate_increase: PositiveFloat = 5
+
+    # Near-duplicate prompts.
+    dedup_enabled: bool = False
+    dedup_threshold: float = Field(0.8, ge=0, le=1)
+    dedup_shingle_size: PositiveInt = 5
+    dedup_permutations: PositiveInt = 128
+    dedup_bands: PositiveInt = 32
+    dedup_max_entries: PositiveInt = 1000
+
+    # Memory diagnostics.
+    memory_sample_interval: PositiveFloat = 30
+    tracemalloc_frames: PositiveInt = 10
+
+    @field_validator("scheduler_tier_weights", mode="before")
+    @classmethod
+    def _parse_weights(cls, value: Any) -> Any:
+        # "premium=2,free=0.5"
+        if not isinstance(value, str):
+            return value
+        weights = {}
+        for pair in value.split(","):
+            if "=" in pair:
+                tier, weight = pair.split("=", 1)
+                weights[tier.strip()] = weight.strip()
+        return weights
+
+    @field_validator("prompt_keys", mode="before")
+    @classmethod
+    def _parse_keys(cls, value: Any) -> Any:
+        if not isinstance(value, str):
+            return value
+        return [key.strip() for key in value.split(",") if key.strip()]
+
+    @model_validator(mode="after")
+    def _check_bands(self) -> "Settings":
+        if self.dedup_permutations % self.dedup_bands:
+            raise ValueError("DEDUP_PERMUTATIONS must be a multiple of DEDUP_BANDS")
+        return self
+
+    @classmethod
+    def from_environ(cls, environ: Mapping[str, str]) -> "Settings":
+        values = {}
+        for name in cls.model_fields:
+            value = environ.get(name.upper())
+            if value:
+                values[name] = value
+        return cls.model_validate(values)
+
+
+_settings: Optional[Settings] = None
+_reload_hooks: list[ReloadHook] = []
+
+
+def read_environ() -> dict[str, str]:
+    """
+    The variables settings are loaded from: the environment, overridden by
+    the dotenv-format file at SETTINGS_FILE if set. Editing that file and
+    reloading changes the settings of a running process, whose environment
+    cannot be changed from outside.
+    """
+    from dotenv import dotenv_values
+
+    environ = dict(os.environ)
+    path = environ.get("SETTINGS_FILE")
+    if path:
+        environ.update({k: v for k, v in dotenv_values(path).items() if v is not None})
+    return environ
+
+
+def get_settings() -> Settings:
+    """
+    Return the current settings. Callers should read it once per operation
+    rather than keep it, so that a reload applies to the next operation.
+    """
+    global _settings
+    if _settings is None:
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        _settings = Settings.from_environ(read_environ())
+    return _settings
+
+
+def on_reload(hook: ReloadHook) -> None:
+    """
+    Call `hook(old, new)` after every reload that changes the settings, to
+    apply them to state built from the old ones.
+    """
+    _reload_hooks.append(hook)
+
+
+def reload_settings() -> list[str]:
+    """
+    Load the settings again and swap them in if they are valid, returning
+    the names of the ones that changed. Raises pydantic's ValidationError,
+    leaving the current settings in place, if they are not.
+    """
+    global _settings
+    old = get_settings()
+    new = Settings.from_environ(read_environ())
+    changed = [name for name in Settings.model_fields if getattr(old, name) != getattr(new, name)]
+    if not changed:
+        return changed
+    _settings = new
+    for hook in _reload_hooks:
+        try:
+            hook(old, new)
+        except Exception as e:
+            print("Error applying reloaded settings:", e)
+    restart = RESTART_REQUIRED.intersection(changed)
+    if restart:
+        print("Settings changed that only apply after a restart:", ", ".join(sorted(restart)))
+    return changed
+
+
+def reload_on_signal() -> None:
+    """SIGHUP handler: reload the settings, keeping the current ones if invalid."""
+    try:
+        changed = reload_settings()
+    except ValidationError as e:
+        print("Invalid settings, keeping the current ones:", e)
+        return
+    print("Settings reloaded:", ", ".join(changed) or "no changes")
+
+
+def install_reload_handler() -> None:
+    """Reload the settings on SIGHUP. Call from within the running event loop."""
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, reload_on_signal)
+    except (AttributeError, NotImplementedError, RuntimeError):
+        # No SIGHUP on Windows; only the admin endpoint reloads there.
+        pass
+
+
+def public_settings(settings: Settings) -> dict[str, Any]:
+    """The settings without the secrets (the fields hidden from repr)."""
+    hidden = {name for name, field in Settings.model_fields.items() if not field.repr}
+    return settings.model_dump(exclude=hidden)
@@ -0,0 +1,134 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable
+
+from app.api.db.db import DatabaseOperations, event_timestamp, get_dynamodb_resource
+from app.drain import drain_coordinator
+from app.prompt_dynamo import prompt_repository
+from app.settings import get_settings
+
+REQUIRED_SETTINGS = ("AKASH_ENDPOINT", "AWS_REGION", "SECRET_KEY", "API_KEY_AUTH")
+READINESS_TABLE = "bs-football-context-prompts"
+
+
+class Readiness:
+    """
+    Process-wide readiness state.
+
+    `warmed_up` flips once the startup warm-up has completed successfully;
+    `checks` holds the last result of every dependency probe so the readiness
+    endpoint can answer without hitting the dependencies on every poll.
+    """
+
+    warmed_up: bool = False
+    checks: dict[str, dict[str, Any]] = {}
+    checked_at: float = 0.0
+    lock: asyncio.Lock | None = None
+
+    @classmethod
+    def is_ready(cls) -> bool:
+        return (
+            cls.warmed_up
+            and not drain_coordinator.draining
+            and all(c["ok"] for c in cls.checks.values())
+        )
+
+
+def verify_configuration() -> None:
+    settings = get_settings()
+    missing = [name for name in REQUIRED_SETTINGS if not getattr(settings, name.lower())]
+    if missing:
+        raise ValueError(f"Missing settings: {', '.join(missing)}")
+
+
+async def check_dynamodb() -> None:
+    # DescribeTable is a control-plane call, so it consumes no read capacity.
+    client = get_dynamodb_resource().meta.client
+    await asyncio.to_thread(client.describe_table, TableName=READINESS_TABLE)
+
+
+async def check_inference_server() -> None:
+    import websockets
+
+    settings = get_settings()
+    async with websockets.connect(
+        f"ws://{settings.akash_endpoint}", open_timeout=settings.readiness_timeout
+    ):
+        pass
+
+
+async def preload_events() -> None:
+    await DatabaseOperations.get_all_events(event_timestamp())
+    prompt_keys = get_settings().prompt_keys
+    if prompt_keys:
+        await prompt_repository.preload(prompt_keys)
+
+
+async def _timed(check: Callable[[], Awaitable[None] | None]) -> dict[str, Any]:
+    started = time.perf_counter()
+    try:
+        result = check()
+        if asyncio.iscoroutine(result):
+            await asyncio.wait_for(result, timeout=get_settings().readiness_timeout)
+        status = {"ok": True}
+    except Exception as e:
+        status = {"ok": False, "error": str(e) or type(e).__name__}
+    status["latency_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return status
+
+
+async def run_checks() -> dict[str, dict[str, Any]]:
+    """
+    Probe every dependency concurrently and record the per-dependency status and
+    latency on `Readiness`.
+    """
+    names = ("configuration", "dynamodb", "inference_server")
+    results = await asyncio.gather(
+        _timed(verify_configuration),
+        _timed(check_dynamodb),
+        _timed(check_inference_server),
+    )
+    Readiness.checks = dict(zip(names, results))
+    Readiness.checked_at = time.monotonic()
+    return Readiness.checks
+
+
+async def readiness_report() -> dict[str, Any]:
+    """
+    Return the readiness of this instance, re-running the dependency probes at
+    most once every READINESS_CHECK_INTERVAL seconds.
+    """
+    if Readiness.lock is None:
+        Readiness.lock = asyncio.Lock()
+    interval = get_settings().readiness_check_interval
+    async with Readiness.lock:
+        if not Readiness.checks or time.monotonic() - Readiness.checked_at > interval:
+            await run_checks()
+    return {
+        "ready": Readiness.is_ready(),
+        "warmed_up": Readiness.warmed_up,
+        "draining": drain_coordinator.draining,
+        "checks": Readiness.checks,
+    }
+
+
+async def warm_up() -> None:
+    """
+    Pay the cold costs before the first prompt does: build the DynamoDB client,
+    load the active events into the cache and open a connection to the
+    inference server. The instance only reports ready once this has succeeded;
+    until then the warm-up is retried every READINESS_CHECK_INTERVAL seconds.
+    """
+    started = time.perf_counter()
+    while True:
+        checks = await run_checks()
+        if all(c["ok"] for c in checks.values()):
+            preload = await _timed(preload_events)
+            if preload["ok"]:
+                break
+            print("Unable to preload events:", preload["error"])
+        else:
+            print("Dependencies not ready:", checks)
+        await asyncio.sleep(get_settings().readiness_check_interval)
+    Readiness.warmed_up = True
+    print(f"Warm-up finished in {time.perf_counter() - started:.2f}s")
@@ -1,5 +1,5 @@
 from datetime import datetime, timedelta, timezone
-from unittest.mock import MagicMock, patch
+from unittest.mock import patch
 
 import jwt
 import pytest
@@ -9,9 +9,8 @@ from app.api.auth.service import AuthService
 
 # Mock environment variables
 @pytest.fixture(autouse=True)
-def setup_env_vars(monkeypatch):
-    monkeypatch.setenv("SECRET_KEY", "test_secret")
-    monkeypatch.setenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60")
+def setup_env_vars(configure):
+    configure(SECRET_KEY="test_secret", ACCESS_TOKEN_EXPIRE_MINUTES="60")
 
 
 # Test the generate_token method
@@ -24,13 +23,14 @@ def test_generate_token():
 
     # Assertions
     assert payload["wallet_address"] == wallet_address
+    assert payload["tier"] == "default"
     assert "exp" in payload
 
 
 # Test the authenticate method with a valid wallet
 @patch("app.api.auth.service.WalletService")
 def test_authenticate(mock_wallet_service):
-    mock_wallet = MagicMock()
+    mock_wallet = {"address": "0x123"}
     mock_wallet_service.return_value.get_wallet_by_address.return_value = mock_wallet
 
     wallet_address = "0x123"
@@ -38,6 +38,20 @@ def test_authenticate(mock_wallet_service):
 
     # Assertions
     assert token is not None
+    assert AuthService.verify_token(token)["tier"] == "default"
+
+
+# Test that the token carries the tier of the wallet
+@patch("app.api.auth.service.WalletService")
+def test_authenticate_tier(mock_wallet_service):
+    mock_wallet_service.return_value.get_wallet_by_address.return_value = {
+        "address": "0x123",
+        "tier": "premium",
+    }
+
+    token = AuthService.authenticate("0x123")
+
+    assert AuthService.verify_token(token)["tier"] == "premium"
 
 
 # Test the authenticate method with an invalid wallet
@@ -0,0 +1,160 @@
+import json
+import threading
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app import capture
+from app.api.db.db import DatabaseOperations
+from app.api.predictions.service import PredictionService
+from app.api.predictions.streams import StreamWebSocket
+from app.capture import CapturingWebSocket, RotatingTraceFile, TraceRecorder
+
+
+@pytest.fixture
+def recorder(tmp_path, monkeypatch, configure):
+    configure(CAPTURE_ENABLED="true", CAPTURE_PATH=str(tmp_path / "trace.jsonl"))
+    recorder = TraceRecorder()
+    monkeypatch.setattr(capture, "trace_recorder", recorder)
+    return recorder
+
+
+def read_trace(tmp_path):
+    lines = (tmp_path / "trace.jsonl").read_text().splitlines()
+    return [json.loads(line) for line in lines]
+
+
+# Test that the trace file rotates and keeps a bounded number of backups
+def test_rotating_trace_file(tmp_path):
+    trace = RotatingTraceFile(str(tmp_path / "trace.jsonl"), max_bytes=40, backups=2)
+    for i in range(6):
+        trace.write({"i": i, "pad": "x" * 10})
+    trace.close()
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "trace.jsonl", "trace.jsonl.1", "trace.jsonl.2"
+    ]
+    assert json.loads((tmp_path / "trace.jsonl").read_text())["i"] == 5
+
+
+# Test that captured frames keep sizes and timings but no credentials or text
+@pytest.mark.asyncio
+async def test_inbound_is_anonymised(recorder, tmp_path):
+    trace = recorder.connection()
+    data = json.dumps({"data": {
+        "prompt": "who wins?", "team": "Spain_England",
+        "api_key_auth": "secret-key", "token": "jwt-token",
+    }})
+    assert trace.inbound(data) == 0
+    trace.inbound('{"data": {"session_id": "abc", "offset": 3}}')
+    trace.inbound("not json")
+    trace.close()
+    await recorder.flush()
+
+    text = (tmp_path / "trace.jsonl").read_text()
+    assert "secret-key" not in text and "jwt-token" not in text and "who wins" not in text
+    opened, first, resume, invalid, closed = read_trace(tmp_path)
+    assert opened["k"] == "open" and closed["k"] == "close"
+    assert first["prompt_len"] == 9 and first["team"] == "Spain_England"
+    assert resume["session"] == recorder.anonymise("abc") and resume["offset"] == 3
+    assert invalid["invalid"] is True
+
+
+# Test that prompt text is only kept when CAPTURE_PROMPTS is set
+@pytest.mark.asyncio
+async def test_inbound_prompt_opt_in(recorder, tmp_path, configure):
+    configure(CAPTURE_PROMPTS="true")
+    trace = recorder.connection()
+    trace.inbound(json.dumps({"data": {"prompt": "who wins?", "token": "jwt-token"}}))
+    trace.close()
+    await recorder.flush()
+
+    text = (tmp_path / "trace.jsonl").read_text()
+    assert "jwt-token" not in text
+    assert read_trace(tmp_path)[1]["prompt"] == "who wins?"
+
+
+# Test that a captured generation records the upstream timings and outbound frames
+@pytest.mark.asyncio
+async def test_generation_is_captured(recorder, tmp_path):
+    event = {"team": "some-team", "contextPrompt": "ctx", "assistantPrompt": "asst"}
+    trace = recorder.connection()
+    client = CapturingWebSocket(MagicMock(send_text=AsyncMock()), trace)
+    token = capture.current_message.set((trace, trace.inbound('{"data": {}}')))
+
+    async def stream(json_prompt, session, max_tokens, timings, output=None):
+        timings[0].extend([120.0, 15.5])
+        timings[1].extend([3, 4])
+        await session.send_token("abc")
+        return '{"token":"END_OF_RESPONSE"}'
+
+    try:
+        with patch.object(
+            DatabaseOperations, "get_all_events", AsyncMock(return_value=[event])
+        ), patch.object(PredictionService, "_stream_generation", side_effect=stream):
+            await PredictionService.get_new_prediction("prompt", client, "some-team", owner="0xabc")
+    finally:
+        capture.current_message.reset(token)
+    trace.close()
+    await recorder.flush()
+
+    records = {r["k"]: r for r in read_trace(tmp_path) if r["k"] in ("req", "gen")}
+    assert records["req"]["owner"] == recorder.anonymise("0xabc")
+    assert records["gen"]["d"] == [120.0, 15.5] and records["gen"]["n"] == [3, 4]
+    frames = [r["f"] for r in read_trace(tmp_path) if r["k"] == "out"]
+    assert frames == ["session_id", "token", "token"]
+
+
+# Test that a prompt that is not a string is recorded without failing
+@pytest.mark.asyncio
+async def test_inbound_prompt_not_a_string(recorder, tmp_path, configure):
+    configure(CAPTURE_PROMPTS="true")
+    trace = recorder.connection()
+    trace.inbound(json.dumps({"data": {"prompt": ["who", "wins"], "team": "t"}}))
+    trace.inbound(json.dumps({"data": {"prompt": 42}}))
+    trace.close()
+    await recorder.flush()
+
+    first, second = read_trace(tmp_path)[1:3]
+    assert first["prompt_len"] == 0 and "prompt" not in first
+    assert second["prompt_len"] == 0
+
+
+# Test that records are written by the writer thread, not the event loop
+@pytest.mark.asyncio
+async def test_writes_off_the_event_loop(recorder, tmp_path, monkeypatch):
+    threads = []
+    write = RotatingTraceFile.write
+    monkeypatch.setattr(
+        RotatingTraceFile, "write",
+        lambda self, record: threads.append(threading.current_thread().name) or write(self, record),
+    )
+
+    trace = recorder.connection()
+    trace.close()
+    await recorder.flush()
+
+    assert threads == ["trace-writer", "trace-writer"]
+    assert [r["k"] for r in read_trace(tmp_path)] == ["open", "close"]
+
+
+# Test that version 2 messages and frames keep their stream, version and action
+@pytest.mark.asyncio
+async def test_version_2_is_captured(recorder, tmp_path):
+    trace = recorder.connection()
+    client = CapturingWebSocket(MagicMock(send_text=AsyncMock()), trace)
+    trace.inbound(json.dumps({"v": 2, "stream_id": "s1", "data": {"prompt": "p", "token": "jwt"}}))
+    trace.inbound(json.dumps({"v": 2, "stream_id": "s1", "action": "cancel", "data": {}}))
+    stream = StreamWebSocket(client, "s1")
+    await stream.send_text('{"token":"abc","offset":0}')
+    await stream.send_text('{"token":"END_OF_RESPONSE","truncated":true,"reason":"cancelled"}')
+    trace.close()
+    await recorder.flush()
+
+    _, prompt, cancel, token, end, _ = read_trace(tmp_path)
+    hashed = recorder.anonymise("s1")
+    assert (prompt["v"], prompt["stream"], prompt["prompt_len"]) == (2, hashed, 1)
+    assert "action" not in prompt
+    assert (cancel["v"], cancel["stream"], cancel["action"]) == (2, hashed, "cancel")
+    assert (token["f"], token["stream"]) == ("token", hashed)
+    assert (end["f"], end["end"], end["stream"]) == ("end", "cancelled", hashed)
@@ -0,0 +1,136 @@
+import gzip
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from fastapi.testclient import TestClient
+from websockets.extensions.permessage_deflate import PerMessageDeflate
+from websockets.frames import Frame, Opcode
+
+from app import compression
+from app.compression import (
+    CompressionMiddleware,
+    DeflateEstimator,
+    accepted_encodings,
+    negotiates_deflate,
+)
+from app.metrics import metrics
+
+BODY = "prediction " * 200
+
+app = FastAPI()
+app.add_middleware(CompressionMiddleware)
+
+
+@app.get("/large", response_class=PlainTextResponse)
+async def large():
+    return BODY
+
+
+@app.get("/small", response_class=PlainTextResponse)
+async def small():
+    return "tiny"
+
+
+@app.get("/encoded")
+async def encoded():
+    return Response(gzip.compress(BODY.encode()), headers={"Content-Encoding": "gzip"})
+
+
+@app.get("/streamed")
+async def streamed():
+    async def chunks():
+        for _ in range(3):
+            yield BODY.encode()
+
+    return StreamingResponse(chunks(), media_type="text/plain")
+
+
+@pytest.fixture
+def client(monkeypatch, configure):
+    # Negotiate gzip whether or not brotli is installed.
+    monkeypatch.setattr(compression, "brotli", None)
+    configure(COMPRESSION_MIN_SIZE="1024", GZIP_LEVEL="6")
+    return TestClient(app)
+
+
+def counter(name, **labels):
+    return metrics.counters[name][tuple(sorted(labels.items()))]
+
+
+def test_accepted_encodings():
+    assert accepted_encodings("gzip;q=0.5, br;q=0, Identity") == {"gzip", "identity"}
+
+
+# Test that gzip is negotiated and the compression is counted
+def test_gzip(client):
+    responses = counter("http_compression_responses_total", encoding="gzip")
+    bytes_in = counter("http_compression_bytes_in_total", encoding="gzip")
+
+    response = client.get("/large", headers={"Accept-Encoding": "gzip, deflate"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert response.text == BODY
+    assert int(response.headers["content-length"]) < len(BODY)
+    assert counter("http_compression_responses_total", encoding="gzip") == responses + 1
+    assert counter("http_compression_bytes_in_total", encoding="gzip") == bytes_in + len(BODY)
+    assert counter("http_compression_seconds_total", encoding="gzip") > 0
+
+
+# Test that clients that do not accept an encoding get the plain body
+def test_not_accepted(client):
+    response = client.get("/large", headers={"Accept-Encoding": "identity"})
+
+    assert "content-encoding" not in response.headers
+    assert response.text == BODY
+
+
+# Test that bodies below the threshold, encoded bodies and streams pass through
+@pytest.mark.parametrize("path", ["/small", "/encoded", "/streamed"])
+def test_skipped(client, path):
+    skipped = counter("http_compression_skipped_total")
+
+    response = client.get(path, headers={"Accept-Encoding": "gzip"})
+
+    assert response.status_code == 200
+    assert response.headers.get("content-encoding") in (None, "gzip")
+    assert counter("http_compression_skipped_total") == skipped + 1
+    if path == "/streamed":
+        assert response.text == BODY * 3
+
+
+# Test that the threshold is read from the settings
+def test_min_size_setting(client, configure):
+    configure(COMPRESSION_MIN_SIZE="1")
+
+    response = client.get("/small", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+
+
+# Test that the deflated size estimate matches what the server sends
+@pytest.mark.asyncio
+async def test_deflate_estimator():
+    websocket = MagicMock(send_text=AsyncMock())
+    estimator = DeflateEstimator(websocket)
+    server = PerMessageDeflate(False, False, 12, 12, {"memLevel": 5})
+    bytes_in = counter("ws_deflate_sampled_bytes_in_total")
+    bytes_out = counter("ws_deflate_sampled_bytes_out_total")
+    frames = [f'{{"token":"word {i}","offset":{i}}}' for i in range(20)]
+
+    for frame in frames:
+        await estimator.send_text(frame)
+
+    assert [c.args[0] for c in websocket.send_text.await_args_list] == frames
+    deflated = sum(len(server.encode(Frame(Opcode.TEXT, f.encode())).data) for f in frames)
+    assert counter("ws_deflate_sampled_bytes_out_total") - bytes_out == deflated
+    assert counter("ws_deflate_sampled_bytes_in_total") - bytes_in == sum(map(len, frames))
+    assert deflated < sum(map(len, frames)) / 2
+
+
+def test_negotiates_deflate():
+    offered = MagicMock(headers={"sec-websocket-extensions": "permessage-deflate; client_max_window_bits"})
+    assert negotiates_deflate(offered)
+    assert not negotiates_deflate(MagicMock(headers={}))
@@ -0,0 +1,54 @@
+import asyncio
+import json
+from unittest.mock import MagicMock
+
+import pytest
+import pytest_asyncio
+import websockets
+
+from app.settings import reload_settings
+
+
+@pytest.fixture(autouse=True)
+def configure(monkeypatch):
+    """
+    Settings are loaded once, so tests change them with
+    `configure(NAME=value, ...)`: it sets the environment variables (None
+    unsets one) and reloads the settings. Every test starts from, and leaves
+    behind, the settings of the unmodified environment.
+    """
+
+    def configure(**environ):
+        for name, value in environ.items():
+            if value is None:
+                monkeypatch.delenv(name, raising=False)
+            else:
+                monkeypatch.setenv(name, str(value))
+        reload_settings()
+
+    reload_settings()
+    yield configure
+    monkeypatch.undo()
+    reload_settings()
+
+
+@pytest_asyncio.fixture
+async def upstream(configure):
+    """
+    A fake inference server, which AKASH_ENDPOINT points to. It streams
+    `upstream.tokens`, sleeping `upstream.delay` seconds before each, and
+    keeps the prompts it receives in `upstream.prompts` and their number in
+    `upstream.calls`.
+    """
+    state = MagicMock(tokens=["a", "b", "c"], delay=0, prompts=[], calls=0)
+
+    async def handler(ws):
+        state.prompts.append(json.loads(await ws.recv()))
+        state.calls += 1
+        for token in state.tokens:
+            await asyncio.sleep(state.delay)
+            await ws.send(token)
+
+    async with websockets.serve(handler, "127.0.0.1", 0) as server:
+        configure(AKASH_ENDPOINT=f"127.0.0.1:{server.sockets[0].getsockname()[1]}")
+        yield state
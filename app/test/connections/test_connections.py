@@ -0,0 +1,128 @@
+import asyncio
+import time
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.connections import (
+    CLOSE_IDLE,
+    CLOSE_UNRESPONSIVE,
+    ConnectionLimitExceeded,
+    ConnectionManager,
+    is_pong,
+)
+from app.serialization import dumps
+
+
+def fake_socket():
+    return MagicMock(send_text=AsyncMock(), close=AsyncMock())
+
+
+@pytest.fixture(autouse=True)
+def limits(configure):
+    configure(
+        WS_MAX_CONNECTIONS_PER_IP="2",
+        WS_MAX_CONNECTIONS_PER_WALLET="1",
+        WS_IDLE_TIMEOUT="60",
+        WS_HEARTBEAT_TIMEOUT="0.05",
+    )
+
+
+# Test that the per-IP and per-wallet limits are enforced and released
+def test_limits():
+    manager = ConnectionManager()
+    first, second = fake_socket(), fake_socket()
+    manager.connect(first, "1.2.3.4")
+    manager.connect(second, "1.2.3.4")
+    with pytest.raises(ConnectionLimitExceeded):
+        manager.connect(fake_socket(), "1.2.3.4")
+
+    manager.identify(first, "0xabc")
+    manager.identify(first, "0xabc")
+    with pytest.raises(ConnectionLimitExceeded):
+        manager.identify(second, "0xabc")
+
+    manager.disconnect(first)
+    manager.disconnect(first)
+    manager.identify(second, "0xabc")
+    manager.connect(fake_socket(), "1.2.3.4")
+    assert len(manager) == 2
+    assert manager.gauges()[(("state", "authenticated"),)] == 1
+
+
+# Test that idle and unresponsive connections are evicted, busy ones are kept
+@pytest.mark.asyncio
+async def test_sweep(configure):
+    configure(WS_MAX_CONNECTIONS_PER_IP="10")
+    manager = ConnectionManager()
+    idle, busy, stuck, healthy, legacy = (fake_socket() for _ in range(5))
+    for socket in (idle, busy, stuck, healthy, legacy):
+        manager.connect(socket, "10.0.0.1")
+    for socket in (stuck, healthy):
+        manager.get(socket).protocol = 2
+    manager.get(idle).last_seen = time.monotonic() - 120
+    manager.get(busy).last_seen = time.monotonic() - 120
+    manager.get(busy).active_requests = 1
+
+    async def blocked(frame):
+        await asyncio.sleep(1)
+
+    stuck.send_text.side_effect = blocked
+
+    await manager.sweep()
+
+    idle.close.assert_awaited_once_with(code=CLOSE_IDLE, reason="idle")
+    stuck.close.assert_awaited_once_with(code=CLOSE_UNRESPONSIVE, reason="unresponsive")
+    healthy.send_text.assert_awaited_once_with(dumps({"heartbeat": 1}))
+    legacy.send_text.assert_not_awaited()
+    assert manager.get(busy) and manager.get(healthy) and manager.get(legacy)
+    assert len(manager) == 3
+
+
+# Test that only heartbeat replies are taken for pongs
+@pytest.mark.parametrize("data, expected", [
+    ('{"pong": 1}', True),
+    ('{ "pong" : 2 }', True),
+    ('{"data": {"prompt": "\\"pong\\""}}', False),
+    ('{"pong"', False),
+    ('["pong"]', False),
+])
+def test_is_pong(data, expected):
+    assert is_pong(data) is expected
+
+
+# Test that the endpoint unregisters a connection however it ends
+def test_endpoint_unregisters(monkeypatch, configure):
+    from app import main
+    from app.connections import connection_manager
+
+    monkeypatch.setattr(main, "handle_message", AsyncMock(side_effect=RuntimeError))
+    client = TestClient(main.app)
+    with client.websocket_connect("/ws") as ws:
+        ws.send_text('{"pong": 1}')
+        ws.send_text("{}")
+    assert len(connection_manager) == 0
+
+    configure(WS_MAX_CONNECTIONS_PER_IP="0")
+    with pytest.raises(Exception):
+        with client.websocket_connect("/ws") as ws:
+            ws.receive_text()
+    assert len(connection_manager) == 0
+
+
+# Test that a client dropping during the handshake is unregistered
+@pytest.mark.asyncio
+async def test_endpoint_unregisters_on_failed_accept():
+    from app import main
+    from app.connections import connection_manager
+
+    websocket = fake_socket()
+    websocket.client.host = "1.2.3.4"
+    websocket.headers = {}
+    websocket.accept = AsyncMock(side_effect=RuntimeError("client went away"))
+
+    await main.websocket_endpoint(websocket)
+
+    assert len(connection_manager) == 0
+    assert "1.2.3.4" not in connection_manager._per_ip
@@ -0,0 +1,136 @@
+import json
+from types import SimpleNamespace
+
+import boto3
+import pytest
+from botocore.awsrequest import AWSResponse
+from botocore.config import Config
+
+from app.api.db import capacity
+from app.api.db.capacity import (
+    CRITICAL,
+    LOW,
+    NORMAL,
+    AdaptiveRateLimiter,
+    CapacityExceeded,
+    CapacityTracker,
+    priority,
+)
+from app.metrics import metrics
+
+
+class FakeRaw:
+    def __init__(self, body):
+        self.body = body
+
+    def stream(self, **kwargs):
+        yield self.body
+
+
+@pytest.fixture
+def dynamodb():
+    """A DynamoDB client answering from `client.responses` instead of AWS."""
+    client = boto3.client(
+        "dynamodb",
+        region_name="us-east-1",
+        aws_access_key_id="x",
+        aws_secret_access_key="y",
+        config=Config(retries={"total_max_attempts": 1, "mode": "standard"}),
+    )
+    client.requests, client.responses = [], []
+
+    def send(request, **kwargs):
+        client.requests.append(json.loads(request.body))
+        status, body = client.responses.pop(0)
+        raw = FakeRaw(json.dumps(body).encode())
+        return AWSResponse(request.url, status, {}, raw)
+
+    client.meta.events.register("before-send.dynamodb", send)
+    tracker = CapacityTracker()
+    tracker.install(client)
+    client.tracker = tracker
+    return client
+
+
+def query(client, table="results"):
+    return client.query(
+        TableName=table,
+        KeyConditionExpression="a = :a",
+        ExpressionAttributeValues={":a": {"S": "x"}},
+    )
+
+
+def counter(name, **labels):
+    return metrics.counters[name].get(tuple(sorted(labels.items())), 0)
+
+
+# Test that consumed capacity is requested and recorded per table and operation
+def test_consumed_capacity(dynamodb):
+    before = counter("dynamodb_consumed_read_units_total", table="results", operation="Query")
+    dynamodb.responses.append(
+        (200, {"Items": [], "ConsumedCapacity": {"TableName": "results", "CapacityUnits": 2.5}})
+    )
+
+    query(dynamodb)
+
+    assert dynamodb.requests[0]["ReturnConsumedCapacity"] == "TOTAL"
+    after = counter("dynamodb_consumed_read_units_total", table="results", operation="Query")
+    assert after - before == 2.5
+
+
+# Test that throttling surfaces as CapacityExceeded and activates the limiter
+def test_throttling(dynamodb):
+    dynamodb.responses.append(
+        (400, {"__type": "ProvisionedThroughputExceededException", "message": "slow down"})
+    )
+
+    with pytest.raises(CapacityExceeded):
+        dynamodb.put_item(TableName="results", Item={"a": {"S": "x"}})
+
+    limiter = dynamodb.tracker.limiters["results"]
+    assert limiter.rate is not None
+    # Low priority reads are shed without calling DynamoDB, writes still go through.
+    with priority(LOW), pytest.raises(CapacityExceeded):
+        query(dynamodb)
+    dynamodb.responses.append((200, {}))
+    dynamodb.put_item(TableName="results", Item={"a": {"S": "x"}})
+    assert len(dynamodb.requests) == 2
+
+
+# Test the AIMD behaviour of the limiter
+def test_adaptive_rate_limiter(monkeypatch, configure):
+    clock = [100.0]
+    monkeypatch.setattr(capacity, "time", SimpleNamespace(monotonic=lambda: clock[0]))
+    configure(DYNAMODB_RATE_INCREASE="10")
+    limiter = AdaptiveRateLimiter()
+    for _ in range(40):
+        clock[0] += 0.025
+        assert limiter.acquire(NORMAL)
+    limiter.on_throttle()
+    assert limiter.rate == pytest.approx(20)
+
+    clock[0] += 0.1
+    assert limiter.acquire(LOW) is False
+    assert limiter.acquire(NORMAL) and limiter.acquire(CRITICAL)
+    limiter.on_throttle()
+    assert limiter.rate == pytest.approx(10.5)
+
+    clock[0] += 10
+    assert limiter.acquire(NORMAL) and limiter.rate is None
+
+
+# Test that throttling is reported as 503 rather than a generic 500
+def test_throttled_endpoint_returns_503(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from app.api.db.db import DatabaseOperations
+    from app.main import app
+
+    async def throttled(iso_date_str):
+        raise CapacityExceeded("DynamoDB is throttling Scan requests")
+
+    monkeypatch.setattr(DatabaseOperations, "get_daily_event", throttled)
+    response = TestClient(app).get("/api/prediction/daily")
+
+    assert response.status_code == 503
+    assert response.json() == {"detail": "DynamoDB is throttling Scan requests"}
@@ -0,0 +1,140 @@
+import asyncio
+import json
+import os
+import signal
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app import startup
+from app.api.auth.service import AuthService
+from app.api.db.db import DatabaseOperations
+from app.connections import CLOSE_RESTART, connection_manager
+from app.drain import drain_coordinator
+from app.handlers import handle_message
+from app.metrics import metrics
+from app.startup import Readiness
+
+EVENTS = [{"team": "Spain_England", "contextPrompt": "ctx", "assistantPrompt": "asst"}]
+
+
+@pytest.fixture(autouse=True)
+def fresh_drain(configure, monkeypatch):
+    configure(
+        API_KEY_AUTH="api-key",
+        SECRET_KEY="a-secret-key-that-is-long-enough-for-hs256",
+        RETRY_TIME="0",
+        DRAIN_GRACE_PERIOD="5",
+    )
+    monkeypatch.setattr(Readiness, "warmed_up", True)
+    monkeypatch.setattr(Readiness, "checks", {})
+    monkeypatch.setattr(Readiness, "lock", None)
+    yield
+    drain_coordinator.__init__()
+
+
+@pytest.fixture
+def upstream(upstream):
+    upstream.delay = 0.02
+    return upstream
+
+
+@pytest.fixture
+def client():
+    websocket = MagicMock(send_text=AsyncMock(), close=AsyncMock())
+    connection_manager.connect(websocket, "127.0.0.1")
+    yield websocket
+    connection_manager.disconnect(websocket)
+
+
+def prompt_message():
+    data = {
+        "prompt": "p",
+        "team": "Spain_England",
+        "api_key_auth": "api-key",
+        "token": AuthService.generate_token("0xabc"),
+    }
+    return {"body": json.dumps({"data": data})}
+
+
+def frames(websocket):
+    return [json.loads(c.args[0]) for c in websocket.send_text.await_args_list]
+
+
+async def drain_during_stream(client):
+    with patch.object(DatabaseOperations, "get_all_events", AsyncMock(return_value=EVENTS)):
+        stream = asyncio.create_task(handle_message(prompt_message(), client))
+        await asyncio.sleep(0.05)
+        drain = drain_coordinator.start()
+        assert not Readiness.is_ready()
+        await handle_message(prompt_message(), client)
+        await drain
+        await asyncio.gather(stream, return_exceptions=True)
+
+
+# Test that a drain lets the streams in flight finish, then sends the clients away
+@pytest.mark.asyncio
+async def test_drain_waits_for_streams(upstream, client):
+    await drain_during_stream(client)
+
+    sent = frames(client)
+    assert {"statusCode": 503, "body": "Server is draining, reconnect"} in sent
+    tokens = [f["token"] for f in sent if "token" in f]
+    assert tokens == ["a", "b", "c", "END_OF_RESPONSE"]
+    assert sent[-1] == {"reconnect": True, "reason": "draining"}
+    client.close.assert_awaited_once_with(code=CLOSE_RESTART, reason="draining")
+    assert connection_manager.get(client) is None
+
+
+# Test that the streams still running after the grace period are ended
+@pytest.mark.asyncio
+async def test_drain_ends_streams_after_grace_period(upstream, client, configure):
+    configure(DRAIN_GRACE_PERIOD="0.1")
+    upstream.tokens = ["t"] * 100
+    before = metrics.counters["drain_streams_cut_total"][()]
+
+    await drain_during_stream(client)
+
+    sent = frames(client)
+    assert {"token": "END_OF_RESPONSE", "truncated": True, "reason": "draining"} in sent
+    assert sent[-1] == {"reconnect": True, "reason": "draining"}
+    assert metrics.counters["drain_streams_cut_total"][()] == before + 1
+    assert drain_coordinator.status()["finished"] is True
+
+
+# Test that SIGTERM drains before reaching the handler it replaced
+@pytest.mark.asyncio
+async def test_sigterm_drains_then_hands_over():
+    received = []
+    original = signal.signal(signal.SIGTERM, lambda signum, frame: received.append(signum))
+    try:
+        drain_coordinator.install_signal_handler()
+        os.kill(os.getpid(), signal.SIGTERM)
+        await asyncio.sleep(0.05)
+        assert drain_coordinator.draining
+        await drain_coordinator.task
+        await asyncio.sleep(0.05)
+        assert received == [signal.SIGTERM]
+    finally:
+        asyncio.get_running_loop().remove_signal_handler(signal.SIGTERM)
+        signal.signal(signal.SIGTERM, original)
+
+
+# Test that the admin endpoint drains, readiness reports it and new sockets are refused
+@patch.object(startup, "check_inference_server", AsyncMock())
+@patch.object(startup, "check_dynamodb", AsyncMock())
+def test_admin_drain():
+    from app.main import app
+
+    http = TestClient(app, headers={"api_key_auth": "api-key"})
+    response = http.post("/api/admin/drain")
+    assert response.status_code == 200 and response.json()["draining"] is True
+
+    ready = http.get("/api/ping/ready")
+    assert ready.status_code == 503 and ready.json()["draining"] is True
+    with pytest.raises(WebSocketDisconnect) as closed:
+        with http.websocket_connect("/ws") as ws:
+            ws.receive_text()
+    assert closed.value.code == CLOSE_RESTART
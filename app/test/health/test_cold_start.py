@@ -0,0 +1,19 @@
+import subprocess
+import sys
+
+# Heavy dependencies that must only be imported on first use or during the
+# startup warm-up, never when the application module is imported.
+DEFERRED_MODULES = ["boto3", "botocore.session", "aiohttp", "jwt", "websockets.asyncio.client"]
+
+
+# Test that importing the application does not pull in the heavy clients
+def test_import_app_main_defers_heavy_modules():
+    code = (
+        "import sys, app.main; "
+        f"print([m for m in {DEFERRED_MODULES!r} if m in sys.modules])"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], check=True, capture_output=True, text=True
+    ).stdout
+
+    assert output.strip() == "[]"
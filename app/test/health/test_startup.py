@@ -0,0 +1,66 @@
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app import startup
+from app.startup import Readiness
+
+
+@pytest.fixture(autouse=True)
+def reset_readiness(monkeypatch, configure):
+    monkeypatch.setattr(Readiness, "warmed_up", False)
+    monkeypatch.setattr(Readiness, "checks", {})
+    monkeypatch.setattr(Readiness, "checked_at", 0.0)
+    monkeypatch.setattr(Readiness, "lock", None)
+    configure(**{name: "test" for name in startup.REQUIRED_SETTINGS})
+
+
+# Test that every dependency is reported with its latency
+@patch.object(startup, "check_inference_server", AsyncMock())
+@patch.object(startup, "check_dynamodb", AsyncMock())
+@pytest.mark.asyncio
+async def test_readiness_report_not_warmed_up():
+    report = await startup.readiness_report()
+
+    assert report["ready"] is False
+    assert set(report["checks"]) == {"configuration", "dynamodb", "inference_server"}
+    for check in report["checks"].values():
+        assert check["ok"] is True
+        assert "latency_ms" in check
+
+
+# Test that a failing dependency keeps the instance not ready
+@patch.object(startup, "check_inference_server", AsyncMock())
+@patch.object(
+    startup, "check_dynamodb", AsyncMock(side_effect=Exception("unreachable"))
+)
+@pytest.mark.asyncio
+async def test_readiness_report_dependency_down():
+    Readiness.warmed_up = True
+    report = await startup.readiness_report()
+
+    assert report["ready"] is False
+    assert report["checks"]["dynamodb"] == {
+        "ok": False,
+        "error": "unreachable",
+        "latency_ms": report["checks"]["dynamodb"]["latency_ms"],
+    }
+
+
+# Test that the warm-up preloads events and marks the instance ready
+@patch.object(startup, "preload_events", AsyncMock())
+@patch.object(startup, "check_inference_server", AsyncMock())
+@patch.object(startup, "check_dynamodb", AsyncMock())
+@pytest.mark.asyncio
+async def test_warm_up():
+    await startup.warm_up()
+
+    startup.preload_events.assert_awaited_once()
+    assert Readiness.is_ready() is True
+
+
+# Test that missing configuration is reported
+def test_verify_configuration_missing(configure):
+    configure(SECRET_KEY=None)
+    with pytest.raises(ValueError, match="SECRET_KEY"):
+        startup.verify_configuration()
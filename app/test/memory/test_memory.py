@@ -0,0 +1,135 @@
+import tracemalloc
+from collections import deque
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.memory import MemoryDiagnostics, deep_sizeof, memory_diagnostics, subsystem
+from app.metrics import metrics
+
+# Allocations made by this module, kept alive until the diff is taken.
+retained = []
+
+
+def allocate():
+    retained.extend(bytearray(1024) for _ in range(500))
+
+
+@pytest.fixture
+def admin(configure):
+    from app.main import app
+
+    configure(API_KEY_AUTH="admin-key")
+    return TestClient(app, headers={"api_key_auth": "admin-key"})
+
+
+@pytest.fixture
+def tracing():
+    was_tracing = tracemalloc.is_tracing()
+    yield
+    if not was_tracing:
+        memory_diagnostics.stop_tracing()
+    retained.clear()
+
+
+# Test that nested containers are counted once and other objects shallowly
+def test_deep_sizeof():
+    text = "x" * 1000
+    assert deep_sizeof([text, text]) < 2 * len(text)
+    assert deep_sizeof({"a": deque([text])}) > len(text)
+
+    class Node:
+        def __init__(self):
+            self.payload = "y" * 10000
+
+    assert deep_sizeof([Node()]) < 1000
+
+
+# Test that allocation sites are attributed to modules of the app or to library packages
+def test_subsystem():
+    import app.api.predictions.sessions as sessions
+    import pydantic
+
+    assert subsystem(sessions.__file__) == "app.api.predictions.sessions"
+    assert subsystem(pydantic.__file__) == "pydantic"
+    assert subsystem("<frozen importlib._bootstrap>") == "<frozen importlib._bootstrap>"
+
+
+# Test that per-item sizers report the total, the count and the largest items
+def test_sizes():
+    diagnostics = MemoryDiagnostics()
+    diagnostics.register("cache", lambda: {"a": 10, "b": 30, "c": 20})
+    diagnostics.register("total", lambda: 5)
+    diagnostics.register("broken", lambda: 1 / 0)
+
+    sizes = diagnostics.sizes(limit=2)
+
+    assert sizes["cache"] == {"bytes": 60, "count": 3, "largest": {"b": 30, "c": 20}}
+    assert sizes["total"] == {"bytes": 5}
+    assert "error" in sizes["broken"]
+
+
+# Test that a sample updates the process gauges
+def test_sample_gauges():
+    samples = memory_diagnostics.sample()
+
+    collected = metrics.collect()
+    assert samples["rss_bytes"] > 0
+    assert collected["process_memory_rss_bytes"] == {(): samples["rss_bytes"]}
+    assert set(collected["process_gc_objects"]) == {
+        (("generation", str(generation)),) for generation in range(3)
+    }
+
+
+# Test that a diff attributes the allocations since the snapshot to this module
+def test_snapshot_and_diff(tracing):
+    diagnostics = MemoryDiagnostics()
+    with pytest.raises(RuntimeError):
+        diagnostics.snapshot()
+    diagnostics.start_tracing(frames=5)
+    with pytest.raises(LookupError):
+        diagnostics.diff()
+
+    assert diagnostics.snapshot()["traced_bytes"] >= 0
+    allocate()
+    diff = diagnostics.diff(limit=5)
+
+    assert diff["size_diff"] >= 500 * 1024
+    assert diff["subsystems"]["app.test.memory.test_memory"] >= 500 * 1024
+    assert diff["top"][0]["subsystem"] == "app.test.memory.test_memory"
+
+
+# Test that object deltas report the types whose counts changed
+def test_object_deltas():
+    diagnostics = MemoryDiagnostics()
+    assert diagnostics.object_deltas()["baseline"] is True
+
+    class Leaked:
+        pass
+
+    leaked = [Leaked() for _ in range(1000)]
+    deltas = diagnostics.object_deltas(limit=100)
+
+    assert deltas["baseline"] is False
+    assert deltas["top"]["test_object_deltas.<locals>.Leaked"] == 1000
+    del leaked
+
+
+# Test the admin endpoints
+def test_admin_memory(admin, tracing):
+    assert admin.get("/api/admin/memory", headers={"api_key_auth": "wrong"}).status_code == 403
+    report = admin.get("/api/admin/memory").json()
+    assert report["process"]["rss_bytes"] > 0
+    assert {"generation_sessions", "ws_connections", "events_cache"} <= set(report["subsystems"])
+
+    memory_diagnostics.stop_tracing()
+    assert admin.get("/api/admin/memory/snapshot").status_code == 409
+    assert admin.post("/api/admin/memory/tracemalloc/start?frames=3").json() == {"tracing": True}
+    assert admin.get("/api/admin/memory/diff").status_code == 409
+    assert admin.get("/api/admin/memory/snapshot?limit=3").status_code == 200
+    allocate()
+    diff = admin.get("/api/admin/memory/diff?limit=3").json()
+    assert diff["size_diff"] > 0 and len(diff["top"]) <= 3
+    assert admin.get("/api/admin/memory/objects").status_code == 200
+    assert admin.post("/api/admin/memory/tracemalloc/stop").json() == {"tracing": False}
+    assert not tracemalloc.is_tracing()
@@ -0,0 +1,60 @@
+from fastapi.testclient import TestClient
+
+from app.metrics import Metrics, metrics
+
+
+# Test that counters accumulate per label set, whatever the order of the labels
+def test_counters():
+    registry = Metrics()
+    registry.inc("requests_total")
+    registry.inc("requests_total", 2, method="get", status="200")
+    registry.inc("requests_total", status="200", method="get")
+
+    assert registry.collect()["requests_total"] == {
+        (): 1,
+        (("method", "get"), ("status", "200")): 3,
+    }
+
+
+# Test that gauges hold the last value and registered gauges are computed when collected
+def test_gauges():
+    registry = Metrics()
+    registry.set_gauge("queue", 3)
+    registry.set_gauge("queue", 5)
+    depth = [1]
+    registry.register_gauge("depth", lambda: depth[0])
+    registry.register_gauge("states", lambda: {(("state", "open"),): 2})
+    depth[0] = 7
+
+    collected = registry.collect()
+
+    assert collected["queue"] == {(): 5}
+    assert collected["depth"] == {(): 7}
+    assert collected["states"] == {(("state", "open"),): 2}
+
+
+# Test the Prometheus text format
+def test_render():
+    registry = Metrics()
+    registry.inc("frames_total", kind="token")
+    registry.register_gauge("active", lambda: 2)
+
+    assert registry.render() == (
+        "# TYPE active gauge\n"
+        "active 2\n"
+        "# TYPE frames_total counter\n"
+        'frames_total{kind="token"} 1.0\n'
+    )
+
+
+# Test that the endpoint exports the process-wide registry
+def test_metrics_endpoint():
+    from app.main import app
+
+    metrics.inc("test_endpoint_total")
+
+    response = TestClient(app).get("/api/metrics/")
+
+    assert response.status_code == 200
+    assert "# TYPE test_endpoint_total counter" in response.text
+    assert "test_endpoint_total 1.0" in response.text
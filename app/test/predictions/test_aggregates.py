@@ -0,0 +1,45 @@
+from unittest.mock import patch
+
+import pytest
+
+from app.api.predictions.aggregates import PredictionAggregates
+
+
+# Test that saved predictions are counted per team
+def test_record_and_stats():
+    aggregates = PredictionAggregates()
+    aggregates.record("team_a", "Team A")
+    aggregates.record("team_a", "Team A")
+    aggregates.record("team_a", "Draw")
+    aggregates.record("team_b", "Team B")
+
+    stats = aggregates.stats("team_a")
+
+    assert stats["total"] == 3
+    assert stats["predictions"] == {"Team A": 2, "Draw": 1}
+    assert aggregates.stats("team_a") is stats
+
+    aggregates.record("team_a", "Draw")
+    assert aggregates.stats("team_a")["predictions"]["Draw"] == 2
+
+
+# Test that reconciliation rebuilds the counters from every scan segment
+@pytest.mark.asyncio
+async def test_reconcile():
+    aggregates = PredictionAggregates()
+    aggregates.record("team_a", "stale")
+    segments = {
+        0: {("team_a", "Team A"): 2},
+        1: {("team_a", "Team A"): 1, ("team_b", "Draw"): 4},
+    }
+
+    with patch.object(
+        PredictionAggregates,
+        "_scan_segment",
+        staticmethod(lambda segment, total: segments[segment]),
+    ):
+        await aggregates.reconcile(segments=2)
+
+    assert aggregates.stats("team_a")["predictions"] == {"Team A": 3}
+    assert aggregates.stats("team_b")["total"] == 4
+    assert aggregates.stats("team_b")["reconciled_at"] is not None
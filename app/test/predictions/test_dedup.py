@@ -0,0 +1,128 @@
+import json
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import numpy as np
+import pytest
+
+from app.api.db.db import DatabaseOperations
+from app.api.predictions.dedup import (
+    MinHasher,
+    MinHashIndex,
+    prompt_deduplicator,
+    shingle_hashes,
+)
+from app.api.predictions.lifecycle import event_lifecycle
+from app.api.predictions.service import PredictionService
+from app.metrics import metrics
+
+EVENT = {"team": "Spain_England", "contextPrompt": "ctx", "assistantPrompt": "asst"}
+PROMPT = "Who will win the match between Spain and England tonight?"
+
+
+@pytest.fixture(autouse=True)
+def deduplicator(configure):
+    configure(DEDUP_ENABLED="true", RETRY_TIME="0")
+    prompt_deduplicator.indexes.clear()
+    yield prompt_deduplicator
+    prompt_deduplicator.indexes.clear()
+
+
+@pytest.fixture
+def upstream(upstream):
+    upstream.tokens = ["Spain", " wins"]
+    return upstream
+
+
+async def run_prediction(prompt, team="Spain_England"):
+    client = MagicMock(send_text=AsyncMock())
+    with patch.object(
+        DatabaseOperations, "get_all_events", AsyncMock(return_value=[EVENT])
+    ):
+        await PredictionService.get_new_prediction(prompt, client, team, "default")
+    frames = [json.loads(c.args[0]) for c in client.send_text.await_args_list]
+    return [f["token"] for f in frames[1:]]
+
+
+# Test that shingling ignores case and whitespace
+def test_shingle_hashes_normalise():
+    assert np.array_equal(shingle_hashes("Hello  World", 3), shingle_hashes("hello world", 3))
+    assert len(shingle_hashes("abcabc", 3)) == 3
+    assert len(shingle_hashes("", 3)) == 0
+
+
+# Test that the signature agreement estimates the Jaccard similarity
+def test_signature_estimates_jaccard():
+    hasher = MinHasher(permutations=256, bands=32, shingle_size=3)
+    a, b = "the quick brown fox jumps over the lazy dog", "the quick brown fox jumped over a lazy dog"
+    sa, sb = set(shingle_hashes(a, 3).tolist()), set(shingle_hashes(b, 3).tolist())
+    jaccard = len(sa & sb) / len(sa | sb)
+
+    estimate = (hasher.signature(a)[0] == hasher.signature(b)[0]).mean()
+
+    assert abs(estimate - jaccard) < 0.1
+
+
+# Test that the index only returns matches above the threshold and keeps the newest entries
+def test_index_query_and_capacity():
+    hasher = MinHasher(permutations=64, bands=16, shingle_size=4)
+    index = MinHashIndex(2, permutations=64, bands=16)
+    index.add(*hasher.signature(PROMPT), "first")
+
+    similarity, response = index.query(*hasher.signature(PROMPT.lower() + " "), 0.9)
+    assert (similarity, response) == (1.0, "first")
+    assert index.query(*hasher.signature("Is it going to rain in Madrid?"), 0.5) is None
+
+    index.add(*hasher.signature("second prompt"), "second")
+    index.add(*hasher.signature("third prompt"), "third")
+    assert index.size == 2
+    assert index.query(*hasher.signature(PROMPT), 0.5) is None
+
+
+# Test that lookups are per event and respect the threshold and the token budget
+def test_lookup(deduplicator):
+    signature = deduplicator.signature(PROMPT)
+    deduplicator.store("Spain_England", signature, ["a", "b"])
+    variation = deduplicator.signature("who will win the match between Spain and England tonight")
+
+    assert deduplicator.lookup("Spain_England", variation) == ["a", "b"]
+    assert deduplicator.lookup("Spain_England", variation, threshold=1.0) is None
+    assert deduplicator.lookup("Spain_England", variation, max_tokens=1) is None
+    assert deduplicator.lookup("France_Italy", variation) is None
+    assert metrics.counters["dedup_hits_total"][()] >= 1
+
+
+# Test that an event's index is dropped when the event ends
+def test_evicted_when_event_ends(deduplicator):
+    deduplicator.store("Spain_England", deduplicator.signature(PROMPT), ["a"])
+
+    for callback in event_lifecycle._end_hooks:
+        callback(EVENT)
+
+    assert "Spain_England" not in deduplicator.indexes
+
+
+# Test that a near-duplicate prompt is answered without calling the upstream
+@pytest.mark.asyncio
+async def test_near_duplicate_served_from_index(upstream):
+    assert await run_prediction(PROMPT) == ["Spain", " wins", "END_OF_RESPONSE"]
+    assert await run_prediction("who will win the match between spain and england tonight") == [
+        "Spain",
+        " wins",
+        "END_OF_RESPONSE",
+    ]
+    assert upstream.calls == 1
+
+    await run_prediction("Which player will score first for England?")
+    assert upstream.calls == 2
+
+
+# Test that nothing is stored or served when disabled
+@pytest.mark.asyncio
+async def test_disabled(configure, upstream):
+    configure(DEDUP_ENABLED="false")
+
+    await run_prediction(PROMPT)
+    await run_prediction(PROMPT)
+
+    assert upstream.calls == 2
+    assert not prompt_deduplicator.indexes
@@ -0,0 +1,113 @@
+import json
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.api.auth.service import AuthService
+from app.api.db.db import DatabaseOperations
+from app.api.predictions.budget import UpstreamLoad, resolve_token_budget
+from app.api.predictions.service import PredictionService
+from app.handlers import handle_message
+
+EVENT = {
+    "team": "some-team",
+    "contextPrompt": "some-prompt",
+    "assistantPrompt": "some-context",
+    "max_tokens": 500,
+    "token_budgets": {"premium": 2000},
+}
+
+
+@pytest.fixture(autouse=True)
+def reset_load(monkeypatch, configure):
+    monkeypatch.setattr(UpstreamLoad, "in_flight", 0)
+    monkeypatch.setattr(UpstreamLoad, "latency_ewma", 0.0)
+    configure(RETRY_TIME="0")
+
+
+async def run_prediction(tier="default"):
+    client = MagicMock(send_text=AsyncMock())
+    with patch.object(
+        DatabaseOperations, "get_all_events", AsyncMock(return_value=[EVENT])
+    ):
+        await PredictionService.get_new_prediction("prompt", client, "some-team", tier)
+    return [json.loads(c.args[0]) for c in client.send_text.await_args_list]
+
+
+# Test that the budget comes from the tier, then the event
+def test_resolve_token_budget():
+    assert resolve_token_budget(EVENT, "premium") == 2000
+    assert resolve_token_budget(EVENT, "default") == 500
+    assert resolve_token_budget({}, "default") == 10000
+
+
+# Test that the budget is reduced while the upstream is overloaded
+def test_resolve_token_budget_overloaded(configure):
+    configure(BUDGET_QUEUE_THRESHOLD="1")
+    UpstreamLoad.in_flight = 1
+
+    assert resolve_token_budget(EVENT, "premium") == 1000
+    assert resolve_token_budget(EVENT, "default") == 500
+
+
+# Test a complete stream
+@pytest.mark.asyncio
+async def test_get_new_prediction(upstream):
+    frames = await run_prediction(tier="premium")
+
+    assert frames[0]["offset"] == 0 and frames[0]["session_id"]
+    assert frames[1:] == [
+        {"token": "a", "offset": 0},
+        {"token": "b", "offset": 1},
+        {"token": "c", "offset": 2},
+        {"token": "END_OF_RESPONSE"},
+    ]
+    assert upstream.prompts[0]["max_tokens"] == 2000
+    assert UpstreamLoad.in_flight == 0
+
+
+# Test that a message authenticated with a premium token gets the premium budget
+@pytest.mark.asyncio
+async def test_handle_message_tier_budget(upstream, configure):
+    configure(API_KEY_AUTH="api-key", SECRET_KEY="a-secret-key-that-is-long-enough-for-hs256")
+    client = MagicMock(send_text=AsyncMock())
+    for tier in ("premium", "default"):
+        data = {
+            "prompt": "prompt",
+            "team": "some-team",
+            "api_key_auth": "api-key",
+            "token": AuthService.generate_token("0xabc", tier),
+        }
+        with patch.object(
+            DatabaseOperations, "get_all_events", AsyncMock(return_value=[EVENT])
+        ):
+            await handle_message({"body": json.dumps({"data": data})}, client)
+
+    assert [prompt["max_tokens"] for prompt in upstream.prompts] == [2000, 500]
+
+
+# Test that a stream exceeding the token budget is truncated
+@pytest.mark.asyncio
+async def test_get_new_prediction_token_budget(upstream):
+    upstream.tokens = ["a"] * 600
+
+    frames = await run_prediction()
+
+    assert len(frames) == 502
+    assert frames[-1] == {
+        "token": "END_OF_RESPONSE",
+        "truncated": True,
+        "reason": "token_budget",
+    }
+
+
+# Test that a stream running past the deadline is truncated
+@pytest.mark.asyncio
+async def test_get_new_prediction_deadline(upstream, configure):
+    configure(GENERATION_DEADLINE="0.2")
+    upstream.delay = 0.1
+
+    frames = await run_prediction()
+
+    assert 1 < len(frames) < 5
+    assert frames[-1]["reason"] == "deadline"
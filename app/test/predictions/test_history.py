@@ -0,0 +1,69 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.api.db.db import DatabaseOperations, decode_cursor, encode_cursor, projection
+from app.api.predictions.service import PredictionService
+
+
+# Test that cursors round-trip and reject garbage
+def test_cursor_round_trip():
+    key = {"id": "1", "address": "0x123", "team": "a_b"}
+
+    assert decode_cursor(encode_cursor(key)) == key
+    assert encode_cursor(None) is None
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor("not a cursor")
+
+
+def test_projection():
+    assert projection(("team", "timestamp")) == {
+        "ProjectionExpression": "#p0, #p1",
+        "ExpressionAttributeNames": {"#p0": "team", "#p1": "timestamp"},
+    }
+    assert projection(None) == {}
+
+
+# Test that a history page returns the cursor of the next page
+@pytest.mark.asyncio
+async def test_get_address_history_page():
+    prediction_service = PredictionService()
+    prediction_service.table = MagicMock()
+    prediction_service.table.query.return_value = {
+        "Items": [{"team": "a_b"}],
+        "LastEvaluatedKey": {"id": "1"},
+    }
+    cursor = encode_cursor({"id": "0"})
+
+    items, next_cursor = await prediction_service.get_address_history(
+        "0x123", limit=1, cursor=cursor, fields=("team",)
+    )
+
+    assert items == [{"team": "a_b"}]
+    assert decode_cursor(next_cursor) == {"id": "1"}
+    kwargs = prediction_service.table.query.call_args.kwargs
+    assert kwargs["Limit"] == 1
+    assert kwargs["ExclusiveStartKey"] == {"id": "0"}
+    assert kwargs["ProjectionExpression"] == "#p0"
+
+
+# Test that the next open event skips every event the address predicted
+@patch.object(DatabaseOperations, "__init__", lambda self: None)
+@pytest.mark.asyncio
+async def test_get_address_prediction_event():
+    events = [{"team": "a_b"}, {"team": "c_d"}, {"team": "e_f"}]
+    pages = [
+        {"Items": [{"team": "a_b"}], "LastEvaluatedKey": {"id": "1"}},
+        {"Items": [{"team": "c_d"}]},
+    ]
+    DatabaseOperations.football_results = MagicMock()
+    DatabaseOperations.football_results.query.side_effect = pages
+    try:
+        with patch.object(
+            DatabaseOperations, "get_all_events", AsyncMock(return_value=events)
+        ):
+            result = await PredictionService.get_address_prediction_event("0x123")
+    finally:
+        del DatabaseOperations.football_results
+
+    assert result == "e_f"
@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.api.db.db import DatabaseOperations, event_timestamp
+from app.api.predictions import lifecycle
+from app.api.predictions.lifecycle import EventLifecycle
+
+NOW = datetime(2024, 7, 14, 19, 0, tzinfo=timezone.utc)
+
+
+def make_event(team, start, end):
+    return {
+        "team": team,
+        "start_ts": event_timestamp(NOW + timedelta(minutes=start)),
+        "end_ts": event_timestamp(NOW + timedelta(minutes=end)),
+        "contextPrompt": "ctx",
+        "assistantPrompt": "asst",
+    }
+
+
+@pytest.fixture(autouse=True)
+def cache(monkeypatch, configure):
+    monkeypatch.setattr(DatabaseOperations, "query_cache", {})
+    monkeypatch.setattr(lifecycle, "check_inference_server", AsyncMock())
+    configure(EVENT_PREWARM_LEAD="120")
+
+
+# Test that the next wake-up is the earliest pending boundary
+def test_next_boundary():
+    events = EventLifecycle()
+    events.timeline = [make_event("later", 60, 180), make_event("soon", 10, 120)]
+
+    assert events.next_boundary(NOW) == NOW + timedelta(minutes=8)
+
+
+# Test that events are prewarmed, swapped in at start and evicted after end
+@pytest.mark.asyncio
+async def test_handle_due():
+    events = EventLifecycle()
+    ending = make_event("ending", -120, 1)
+    upcoming = make_event("upcoming", 1, 120)
+    events.timeline = [ending, upcoming]
+    hook = MagicMock()
+    events.on_event_end(hook)
+
+    await events.handle_due(NOW)
+    assert DatabaseOperations.query_cache["events"] == [ending]
+    lifecycle.check_inference_server.assert_awaited()
+
+    await events.handle_due(NOW + timedelta(minutes=2))
+    assert DatabaseOperations.query_cache["events"] == [upcoming]
+    hook.assert_called_once_with(ending)
+    assert events.timeline == [upcoming]
+
+
+# Test that event timestamps are written and read back as UTC
+def test_event_timestamp():
+    paris = timezone(timedelta(hours=2))
+
+    assert event_timestamp(NOW) == "2024-07-14T19:00:00"
+    assert event_timestamp(NOW.astimezone(paris)) == "2024-07-14T19:00:00"
+    assert lifecycle.parse_ts(event_timestamp(NOW)) == NOW
+    assert lifecycle.parse_ts(event_timestamp()).tzinfo is timezone.utc
@@ -0,0 +1,112 @@
+import asyncio
+
+import pytest
+
+from app.api.predictions.scheduler import POSITION_INTERVAL, InferenceScheduler, SchedulerFull
+
+
+async def run_all(scheduler, requests):
+    """Queue (key, tier) requests behind a held slot; return the admission order."""
+    order = []
+    positions = {}
+
+    async def request(i, key, tier):
+        async def on_position(position):
+            positions.setdefault(i, []).append(position)
+
+        async with scheduler.slot(key, tier, on_position=on_position):
+            order.append(key)
+            await asyncio.sleep(0)
+
+    tasks = []
+    async with scheduler.slot("holder"):
+        for i, (key, tier) in enumerate(requests):
+            tasks.append(asyncio.create_task(request(i, key, tier)))
+            await asyncio.sleep(0)
+        await asyncio.sleep(POSITION_INTERVAL * 2)
+    await asyncio.gather(*tasks)
+    return order, positions
+
+
+# Test that a heavy wallet cannot starve the others
+@pytest.mark.asyncio
+async def test_fair_queueing(configure):
+    configure(INFERENCE_MAX_CONCURRENCY="1")
+    scheduler = InferenceScheduler()
+    requests = [("heavy", "default")] * 5 + [("light_1", "default"), ("light_2", "default")]
+
+    order, positions = await run_all(scheduler, requests)
+
+    assert order[:3] == ["heavy", "light_1", "light_2"]
+    assert scheduler.active == 0 and scheduler.waiting == 0
+    # The arrivals are coalesced into one update: the last heavy request is
+    # told once that the light ones are ahead of it.
+    assert positions[4][0] == 7
+    assert [positions[i][0] for i in range(7)] == [1, 4, 5, 6, 7, 2, 3]
+
+
+# Test that tier weights give a wallet a larger share
+@pytest.mark.asyncio
+async def test_tier_weights(configure):
+    configure(INFERENCE_MAX_CONCURRENCY="1", SCHEDULER_TIER_WEIGHTS="premium=2")
+    scheduler = InferenceScheduler()
+    requests = [("premium", "premium")] * 4 + [("basic", "default")] * 4
+
+    order, _ = await run_all(scheduler, requests)
+
+    assert order[:6] == ["premium", "premium", "basic", "premium", "premium", "basic"]
+
+
+# Test that a cancelled waiter leaves the queue
+@pytest.mark.asyncio
+async def test_cancelled_waiter(configure):
+    configure(INFERENCE_MAX_CONCURRENCY="1")
+    scheduler = InferenceScheduler()
+    async with scheduler.slot("a"):
+        waiter = asyncio.create_task(scheduler.slot("b").__aenter__())
+        await asyncio.sleep(0)
+        assert scheduler.waiting == 1
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert scheduler.waiting == 0
+    assert scheduler.active == 0
+
+
+# Test that the queue is bounded
+@pytest.mark.asyncio
+async def test_queue_full(configure):
+    configure(INFERENCE_MAX_CONCURRENCY="1", SCHEDULER_MAX_QUEUE="0")
+    scheduler = InferenceScheduler()
+    async with scheduler.slot("a"):
+        with pytest.raises(SchedulerFull):
+            async with scheduler.slot("b"):
+                pass
+
+
+# Test that queue positions are recomputed once per burst of arrivals
+@pytest.mark.asyncio
+async def test_positions_coalesced(configure, monkeypatch):
+    configure(INFERENCE_MAX_CONCURRENCY="1")
+    scheduler = InferenceScheduler()
+    updates = []
+    update_positions = scheduler._update_positions
+    monkeypatch.setattr(
+        scheduler, "_update_positions", lambda: updates.append(1) or update_positions()
+    )
+    positions = []
+
+    async def on_position(position):
+        positions.append(position)
+
+    async with scheduler.slot("a"):
+        waiters = [
+            asyncio.create_task(scheduler.slot(f"key_{i}", on_position=on_position).__aenter__())
+            for i in range(50)
+        ]
+        await asyncio.sleep(POSITION_INTERVAL * 2)
+        assert len(updates) == 1
+        assert sorted(positions) == list(range(1, 51))
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
@@ -0,0 +1,107 @@
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.api.predictions import scoring
+from app.api.predictions.scoring import (
+    BulkScorer,
+    parse_predictions,
+    parse_result,
+    score_predictions,
+)
+
+
+# Test that predictions are scored against the result
+def test_score_predictions():
+    predictions = ["2-1", " 1 : 0 ", "Spain", "England wins", "draw", "no idea", "1-1"]
+
+    home, away, kind = parse_predictions(predictions, "Spain", "England")
+    scores = score_predictions(home, away, kind, parse_result("2-1"))
+
+    assert scores.tolist() == [3, 1, 1, 0, 0, 0, 0]
+
+
+# Test that the first score of each prediction is found, as the pattern would
+def test_parse_predictions_scores():
+    predictions = ["12 : 3 and 4-5", "a1-b2", "-1-2", "1\t-\n2", "07:00", "", "1 2-3"]
+
+    home, away, kind = parse_predictions(predictions, "Spain", "England")
+
+    assert list(zip(home.tolist(), away.tolist(), kind.tolist())) == [
+        (12, 3, 2), (0, 0, 0), (1, 2, 2), (1, 2, 2), (7, 0, 2), (0, 0, 0), (2, 3, 2)
+    ]
+    assert [a.tolist() for a in parse_predictions([], "Spain", "England")] == [[], [], []]
+
+
+def test_parse_result_invalid():
+    with pytest.raises(ValueError):
+        parse_result("Spain")
+
+
+# Test that every page is scored, written back and checkpointed
+@pytest.mark.asyncio
+async def test_bulk_scorer(tmp_path):
+    pages = [
+        {"Items": [{"id": "1", "prediction": "2-1"}], "LastEvaluatedKey": {"id": "1"}},
+        {"Items": [{"id": "2", "prediction": "England"}]},
+    ]
+    checkpoint = tmp_path / "checkpoint.json"
+    with patch.object(scoring, "get_dynamodb_resource", MagicMock()):
+        scorer = BulkScorer(chunk_size=1, checkpoint_path=str(checkpoint))
+    scorer._query_page = MagicMock(side_effect=pages)
+    scorer._write_scores = MagicMock()
+    scorer._save_checkpoint = MagicMock(wraps=scorer._save_checkpoint)
+
+    report = await scorer.run("Spain_England", "2-1")
+
+    assert report["scored"] == 2
+    written = [c.args[0] for c in scorer._write_scores.call_args_list]
+    assert written == [[("1", 3)], [("2", 0)]]
+    scorer._save_checkpoint.assert_any_call("Spain_England", {"id": "1"})
+    assert not checkpoint.exists()
+
+
+# Test that a page is only counted and checkpointed once all of its writes have completed
+@pytest.mark.asyncio
+async def test_bulk_scorer_checkpoint_waits_for_page(tmp_path):
+    pages = [
+        {"Items": [{"id": "1", "prediction": "2-1"}], "LastEvaluatedKey": {"id": "1"}},
+        {"Items": [{"id": "2", "prediction": "1-1"}], "LastEvaluatedKey": {"id": "2"}},
+        {"Items": []},
+    ]
+    with patch.object(scoring, "get_dynamodb_resource", MagicMock()):
+        scorer = BulkScorer(chunk_size=1, checkpoint_path=str(tmp_path / "checkpoint.json"))
+    scorer._query_page = MagicMock(side_effect=pages)
+    # The first page's write finishes after the second page's.
+    scorer._write_scores = MagicMock(
+        side_effect=lambda scores, scored_at: time.sleep(0.1 if scores[0][0] == "1" else 0)
+    )
+    saved = []
+    scorer._save_checkpoint = lambda team, key: saved.append((key, scorer.scored))
+
+    report = await scorer.run("Spain_England", "2-1")
+
+    assert saved == [({"id": "1"}, 1), ({"id": "2"}, 2), (None, 2)]
+    assert report["scored"] == 2
+
+
+# Test that only the score fields are written, by key, and deleted rows are skipped
+def test_write_scores():
+    table = MagicMock()
+    table.meta.client.exceptions.ConditionalCheckFailedException = KeyError
+    table.update_item.side_effect = [None, KeyError("deleted")]
+    with patch.object(scoring, "get_dynamodb_resource", MagicMock()) as resource:
+        resource.return_value.Table.return_value = table
+        scorer = BulkScorer()
+
+    scorer._write_scores([("1", 3), ("2", 0)], "2024-07-14T21:00:00+00:00")
+
+    first, second = table.update_item.call_args_list
+    assert first.kwargs["Key"] == {"id": "1"}
+    assert first.kwargs["UpdateExpression"] == "SET score = :score, scored_at = :scored_at"
+    assert first.kwargs["ExpressionAttributeValues"] == {
+        ":score": 3, ":scored_at": "2024-07-14T21:00:00+00:00"
+    }
+    assert "Item" not in first.kwargs
+    assert second.kwargs["Key"] == {"id": "2"}
@@ -0,0 +1,115 @@
+import asyncio
+import json
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.api.predictions.sessions import SessionRegistry
+from app.serialization import END_OF_RESPONSE_FRAME
+
+
+def make_websocket(fail=False):
+    websocket = MagicMock(send_text=AsyncMock())
+    if fail:
+        websocket.send_text.side_effect = RuntimeError("closed")
+    return websocket
+
+
+def sent(websocket):
+    return [json.loads(c.args[0]) for c in websocket.send_text.await_args_list]
+
+
+# Test that a reconnecting client replays the frames it missed
+@pytest.mark.asyncio
+async def test_resume_after_disconnect():
+    registry = SessionRegistry()
+    first = make_websocket()
+    session = registry.create(first, owner="0x123")
+    await session.send_token("a")
+    first.send_text.side_effect = RuntimeError("closed")
+    await session.send_token("b")
+    await session.send_token("c")
+
+    assert session.websocket is None
+
+    second = make_websocket()
+    await registry.resume(session.session_id, "0x123", second, offset=1)
+    await session.finish(END_OF_RESPONSE_FRAME)
+
+    assert sent(second) == [
+        {"token": "b", "offset": 1},
+        {"token": "c", "offset": 2},
+        {"token": "END_OF_RESPONSE"},
+    ]
+
+
+# Test that only the owner can resume a session
+@pytest.mark.asyncio
+async def test_resume_other_owner():
+    registry = SessionRegistry()
+    session = registry.create(make_websocket(), owner="0x123")
+    websocket = make_websocket()
+
+    await registry.resume(session.session_id, "0x456", websocket, offset=0)
+
+    assert sent(websocket) == [{"statusCode": 404, "body": "Session not found"}]
+
+
+# Test that offsets that fell out of the ring buffer are rejected
+@pytest.mark.asyncio
+async def test_resume_offset_evicted(configure):
+    configure(SESSION_BUFFER_SIZE="2")
+    registry = SessionRegistry()
+    session = registry.create(make_websocket(fail=True), owner="0x123")
+    for token in "abcd":
+        await session.send_token(token)
+    websocket = make_websocket()
+
+    await registry.resume(session.session_id, "0x123", websocket, offset=1)
+
+    assert sent(websocket)[0]["statusCode"] == 410
+
+
+# Test that an offset evicted while waiting to attach is rejected, not replayed from the wrong frame
+@pytest.mark.asyncio
+async def test_resume_offset_evicted_while_waiting(configure):
+    configure(SESSION_BUFFER_SIZE="2")
+    registry = SessionRegistry()
+    release = asyncio.Event()
+
+    async def send_slowly(frame):
+        await release.wait()
+
+    slow = make_websocket()
+    slow.send_text.side_effect = send_slowly
+    session = registry.create(slow, owner="0x123")
+    # Holds the session's lock while its frame is being written.
+    sending = asyncio.create_task(session.send_token("a"))
+    await asyncio.sleep(0)
+    websocket = make_websocket()
+    resuming = asyncio.create_task(
+        registry.resume(session.session_id, "0x123", websocket, offset=0)
+    )
+    await asyncio.sleep(0)
+    # Buffered straight away, then queued behind the lock.
+    more = [asyncio.create_task(session.send_token(token)) for token in "bc"]
+    await asyncio.sleep(0)
+
+    release.set()
+    await asyncio.gather(sending, resuming, *more)
+
+    assert sent(websocket) == [{"statusCode": 410, "body": "Session offset no longer available"}]
+
+
+# Test that a session without a client is abandoned and evicted after the grace period
+@pytest.mark.asyncio
+async def test_abandoned_session_evicted(configure):
+    configure(SESSION_GRACE_PERIOD="0")
+    registry = SessionRegistry()
+    session = registry.create(make_websocket(fail=True), owner="0x123")
+    await session.send_token("a")
+
+    assert session.abandoned
+    await session.finish(END_OF_RESPONSE_FRAME)
+    registry.create(make_websocket(), owner="0x456")
+    assert len(registry) == 1
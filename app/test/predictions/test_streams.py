@@ -0,0 +1,138 @@
+import asyncio
+import json
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.api.auth.service import AuthService
+from app.api.db.db import DatabaseOperations
+from app.api.predictions.streams import StreamWebSocket, completion_frame
+from app.connections import connection_manager
+from app.handlers import handle_message
+from app.serialization import END_OF_RESPONSE_FRAME, error_frame, truncation_frame
+
+EVENTS = [
+    {"team": "Spain_England", "contextPrompt": "ctx", "assistantPrompt": "asst"},
+    {"team": "France_Italy", "contextPrompt": "ctx", "assistantPrompt": "asst"},
+]
+
+
+@pytest.fixture(autouse=True)
+def credentials(configure):
+    configure(
+        API_KEY_AUTH="api-key",
+        SECRET_KEY="a-secret-key-that-is-long-enough-for-hs256",
+        RETRY_TIME="0",
+    )
+
+
+@pytest.fixture
+def upstream(upstream):
+    upstream.tokens = ["a", "b"]
+    return upstream
+
+
+@pytest.fixture
+def client():
+    websocket = MagicMock(send_text=AsyncMock(), close=AsyncMock())
+    connection_manager.connect(websocket, "127.0.0.1")
+    yield websocket
+    connection_manager.disconnect(websocket)
+
+
+def message(stream_id, action=None, **data):
+    data.update(api_key_auth="api-key", token=AuthService.generate_token("0xabc"))
+    body = {"v": 2, "stream_id": stream_id, "data": data}
+    if action is not None:
+        body["action"] = action
+    return {"body": json.dumps(body)}
+
+
+def frames(websocket, stream_id):
+    sent = [json.loads(c.args[0]) for c in websocket.send_text.await_args_list]
+    return [f for f in sent if f.get("stream_id") == stream_id]
+
+
+# Test that final frames become completion frames with a status
+def test_completion_frame():
+    assert json.loads(completion_frame("s", END_OF_RESPONSE_FRAME)) == {"stream_id": "s", "end": "complete"}
+    assert json.loads(completion_frame("s", truncation_frame("deadline"))) == {
+        "stream_id": "s", "end": "truncated", "reason": "deadline"
+    }
+    assert json.loads(completion_frame("s", truncation_frame("cancelled")))["end"] == "cancelled"
+    assert json.loads(completion_frame("s", error_frame(404, "No daily event found"))) == {
+        "stream_id": "s", "end": "error", "statusCode": 404, "body": "No daily event found"
+    }
+
+
+# Test that frames are tagged without re-serialising them
+@pytest.mark.asyncio
+async def test_stream_websocket_tags_frames():
+    websocket = MagicMock(send_text=AsyncMock())
+    stream = StreamWebSocket(websocket, 'a"b')
+    await stream.send_text('{"token":"x","offset":0}')
+
+    assert json.loads(websocket.send_text.await_args.args[0]) == {
+        "stream_id": 'a"b', "token": "x", "offset": 0
+    }
+
+
+# Test that two prompts share one socket with separately tagged streams
+@pytest.mark.asyncio
+async def test_concurrent_streams(upstream, client):
+    with patch.object(DatabaseOperations, "get_all_events", AsyncMock(return_value=EVENTS)):
+        await asyncio.gather(
+            handle_message(message("one", prompt="p", team="Spain_England"), client),
+            handle_message(message("two", prompt="p", team="France_Italy"), client),
+        )
+
+    for stream_id in ("one", "two"):
+        stream = frames(client, stream_id)
+        assert "session_id" in stream[0]
+        assert [f["token"] for f in stream[1:-1]] == ["a", "b"]
+        assert stream[-1] == {"stream_id": stream_id, "end": "complete"}
+    # Heartbeats are only sent once the client has spoken version 2.
+    assert connection_manager.get(client).protocol == 2
+
+
+# Test that a stream can be cancelled without affecting the others
+@pytest.mark.asyncio
+async def test_cancel_stream(upstream, client):
+    upstream.tokens = ["t"] * 50
+    upstream.delay = 0.02
+    with patch.object(DatabaseOperations, "get_all_events", AsyncMock(return_value=EVENTS)):
+        first = asyncio.create_task(
+            handle_message(message("one", prompt="p", team="Spain_England"), client)
+        )
+        await asyncio.sleep(0.2)
+        await handle_message(message("one", action="cancel"), client)
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        await handle_message(message("one", action="cancel"), client)
+
+    stream = frames(client, "one")
+    assert {"stream_id": "one", "end": "cancelled"} in stream
+    assert stream[-1] == {"stream_id": "one", "end": "error", "statusCode": 404, "body": "Stream not found"}
+    assert not connection_manager.get(client).streams
+
+
+# Test that a cancel without valid credentials leaves the stream running
+@pytest.mark.asyncio
+async def test_cancel_requires_credentials(upstream, client):
+    upstream.tokens = ["t"] * 10
+    upstream.delay = 0.01
+    with patch.object(DatabaseOperations, "get_all_events", AsyncMock(return_value=EVENTS)):
+        stream = asyncio.create_task(
+            handle_message(message("one", prompt="p", team="Spain_England"), client)
+        )
+        await asyncio.sleep(0.05)
+        await handle_message({"body": '{"v": 2, "stream_id": "one", "action": "cancel"}'}, client)
+        forged = json.loads(message("one", action="cancel")["body"])
+        forged["data"]["token"] = "not-a-jwt"
+        await handle_message({"body": json.dumps(forged)}, client)
+        await stream
+
+    sent = frames(client, "one")
+    assert sent[-1] == {"stream_id": "one", "end": "complete"}
+    statuses = [f["statusCode"] for f in sent if "statusCode" in f]
+    assert statuses == [400, 498]
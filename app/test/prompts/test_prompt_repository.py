@@ -0,0 +1,83 @@
+import asyncio
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app import prompt_dynamo
+from app.prompt_dynamo import PromptRepository, default_prompts, get_prompts_from_dynamodb
+
+ITEM = {"sport_key": "football", "contextPrompt": "ctx", "assistantPrompt": "asst"}
+
+
+@pytest.fixture
+def repository():
+    repository = PromptRepository()
+    repository._fetch = MagicMock(return_value=ITEM)
+    repository._fetch_batch = MagicMock(return_value={"football": ITEM})
+    return repository
+
+
+# Test that a fresh entry is served from the cache
+@pytest.mark.asyncio
+async def test_get_cached(repository):
+    first = await repository.get("football")
+    second = await repository.get("football")
+
+    assert first == second == {"contextPrompt": "ctx", "assistantPrompt": "asst"}
+    repository._fetch.assert_called_once_with("football")
+
+
+# Test that concurrent misses share a single fetch
+@pytest.mark.asyncio
+async def test_get_coalesces_misses(repository):
+    results = await asyncio.gather(*(repository.get("football") for _ in range(5)))
+
+    assert all(r["contextPrompt"] == "ctx" for r in results)
+    repository._fetch.assert_called_once()
+
+
+# Test that a stale entry is served while it is refreshed in the background
+@pytest.mark.asyncio
+async def test_get_stale_while_revalidate(repository, configure):
+    await repository.get("football")
+    configure(PROMPTS_CACHE_TTL="0")
+    repository._fetch.return_value = {**ITEM, "contextPrompt": "new ctx"}
+
+    stale = await repository.get("football")
+    assert stale["contextPrompt"] == "ctx"
+
+    await asyncio.sleep(0.05)
+    assert (await repository.get("football"))["contextPrompt"] == "new ctx"
+    assert repository._fetch.call_count == 2
+
+
+# Test that missing keys are negatively cached and fall back to the defaults
+@pytest.mark.asyncio
+async def test_get_missing_key(repository):
+    repository._fetch.return_value = None
+
+    assert await repository.get("curling") == default_prompts()
+    assert await repository.get("curling") == default_prompts()
+    repository._fetch.assert_called_once()
+
+
+# Test that preloading fills the cache, including misses
+@pytest.mark.asyncio
+async def test_preload(repository):
+    await repository.preload(["football", "curling", "football"])
+
+    repository._fetch_batch.assert_called_once_with(["football", "curling"])
+    assert (await repository.get("football"))["contextPrompt"] == "ctx"
+    assert await repository.get("curling") == default_prompts()
+    repository._fetch.assert_not_called()
+
+
+# Test that the prompt lookup is served from the preloaded repository
+@pytest.mark.asyncio
+async def test_get_prompts_from_dynamodb(repository):
+    with patch.object(prompt_dynamo, "prompt_repository", repository):
+        await repository.preload(["football"])
+        prompts = await get_prompts_from_dynamodb("football")
+
+    assert prompts == {"contextPrompt": "ctx", "assistantPrompt": "asst"}
+    repository._fetch.assert_not_called()
@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+from app.prompt_templates import PromptTemplateCache, PromptTooLargeError
+from app.utils import generate_json_prompt
+
+EVENT = {
+    "team": "team_a_team_b",
+    "contextPrompt": 'Context with "quotes" and\nnewlines',
+    "assistantPrompt": "Assistant é prompt",
+}
+
+
+# Test that a rendered template matches the payload built by generate_json_prompt
+def test_render_matches_generate_json_prompt():
+    template = PromptTemplateCache().for_event(EVENT)
+    prompt = 'Who wins? "really"\n'
+
+    rendered = template.render(prompt, max_tokens=10000)
+
+    assert rendered == generate_json_prompt(
+        prompt, EVENT["contextPrompt"], EVENT["assistantPrompt"], max_tokens=10000
+    )
+    assert json.loads(rendered)["user_prompt"] == prompt
+
+
+# Test that templates are reused until the prompt row changes
+def test_for_event_invalidated_on_change():
+    cache = PromptTemplateCache()
+    template = cache.for_event(EVENT)
+
+    assert cache.for_event(dict(EVENT)) is template
+
+    changed = cache.for_event({**EVENT, "contextPrompt": "New context"})
+    assert changed is not template
+    assert '"New context"' in changed.render("hi", max_tokens=10)
+
+
+# Test that an explicit version attribute is used when present
+def test_for_event_versioned_row():
+    cache = PromptTemplateCache()
+    template = cache.for_event({**EVENT, "version": 1})
+
+    assert cache.for_event({**EVENT, "version": 1}) is template
+    assert cache.for_event({**EVENT, "version": 2}) is not template
+
+
+# Test the optional prompt token budget
+def test_render_over_budget(configure):
+    configure(MAX_PROMPT_TOKENS="20")
+    template = PromptTemplateCache().for_event(EVENT)
+
+    template.render("short", max_tokens=10)
+    with pytest.raises(PromptTooLargeError):
+        template.render("x" * 100, max_tokens=10)
@@ -0,0 +1,102 @@
+import asyncio
+import os
+import signal
+
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+
+from app import settings as settings_module
+from app.settings import Settings, get_settings, install_reload_handler, reload_settings
+
+
+@pytest.fixture
+def admin(configure):
+    from app.main import app
+
+    configure(API_KEY_AUTH="admin-key")
+    return TestClient(app, headers={"api_key_auth": "admin-key"})
+
+
+# Test that values are parsed and validated from the environment
+def test_from_environ():
+    settings = Settings.from_environ({
+        "RETRY_TIME": "0.5",
+        "SCHEDULER_TIER_WEIGHTS": "premium=2, free=0.5",
+        "PROMPT_KEYS": "football,,tennis",
+        "DEDUP_ENABLED": "true",
+        "GZIP_LEVEL": "",
+    })
+
+    assert settings.retry_time == 0.5
+    assert settings.scheduler_tier_weights == {"premium": 2.0, "free": 0.5}
+    assert settings.prompt_keys == ["football", "tennis"]
+    assert settings.dedup_enabled is True
+    assert settings.gzip_level == 6
+
+
+@pytest.mark.parametrize("environ", [
+    {"RETRY_COUNT": "three"},
+    {"INFERENCE_MAX_CONCURRENCY": "0"},
+    {"SCHEDULER_TIER_WEIGHTS": "free=0"},
+    {"GZIP_LEVEL": "12"},
+    {"DEDUP_PERMUTATIONS": "100", "DEDUP_BANDS": "32"},
+])
+def test_invalid_settings(environ):
+    with pytest.raises(ValidationError):
+        Settings.from_environ(environ)
+
+
+# Test that a reload swaps the settings and calls the hooks, and an invalid one changes nothing
+def test_reload(configure, monkeypatch):
+    calls = []
+    monkeypatch.setattr(settings_module, "_reload_hooks", [lambda old, new: calls.append(new)])
+    before = get_settings()
+
+    configure(RETRY_COUNT="5")
+    assert get_settings().retry_count == 5 and calls == [get_settings()]
+    assert reload_settings() == []
+
+    monkeypatch.setenv("RETRY_COUNT", "-1")
+    with pytest.raises(ValidationError):
+        reload_settings()
+    assert get_settings().retry_count == 5 and get_settings() is not before
+
+
+# Test that SETTINGS_FILE overrides the environment
+def test_settings_file(configure, tmp_path):
+    path = tmp_path / "tunables.env"
+    path.write_text("RETRY_TIME=7\n")
+
+    configure(RETRY_TIME="3", SETTINGS_FILE=str(path))
+
+    assert get_settings().retry_time == 7
+
+
+# Test that SIGHUP reloads the settings
+@pytest.mark.asyncio
+async def test_reload_on_sighup(monkeypatch):
+    install_reload_handler()
+    try:
+        monkeypatch.setenv("STATS_SCAN_SEGMENTS", "9")
+        os.kill(os.getpid(), signal.SIGHUP)
+        await asyncio.sleep(0.05)
+        assert get_settings().stats_scan_segments == 9
+    finally:
+        asyncio.get_running_loop().remove_signal_handler(signal.SIGHUP)
+
+
+# Test the admin endpoints, which require the API key and hide the secrets
+def test_admin_settings(admin, monkeypatch):
+    assert admin.get("/api/admin/settings", headers={"api_key_auth": "wrong"}).status_code == 403
+    current = admin.get("/api/admin/settings").json()
+    assert current["retry_count"] == 3 and "api_key_auth" not in current
+
+    monkeypatch.setenv("RETRY_COUNT", "4")
+    response = admin.post("/api/admin/settings/reload")
+    assert response.status_code == 200 and response.json() == {"changed": ["retry_count"]}
+
+    monkeypatch.setenv("RETRY_COUNT", "none")
+    response = admin.post("/api/admin/settings/reload")
+    assert response.status_code == 422
+    assert get_settings().retry_count == 4
@@ -1,8 +1,10 @@
 import json
-import os
 
 from fastapi import HTTPException, WebSocket
 
+from app.serialization import token_frame
+from app.settings import get_settings
+
 
 def generate_json_prompt(
     prompt: str,
@@ -22,7 +24,7 @@ def generate_json_prompt(
 
 async def send_token_to_client(token: str, websocket: WebSocket) -> None:
     try:
-        await websocket.send_text(json.dumps({"token": token}))
+        await websocket.send_text(token_frame(token))
     except Exception as e:
         print("Error sending token via WebSocket:", e)
 
@@ -30,5 +32,5 @@ async def send_token_to_client(token: str, websocket: WebSocket) -> None:
 def check_api_key(api_key: str) -> None:
     if not api_key:
         raise HTTPException(status_code=400, detail="API key is missing")
-    if api_key != os.environ.get("API_KEY_AUTH"):
+    if api_key != get_settings().api_key_auth:
         raise HTTPException(status_code=403, detail="Invalid API key")
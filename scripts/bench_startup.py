@@ -0,0 +1,90 @@
+"""
+Startup-time benchmark.
+
+Measures, in fresh interpreters, how long `import app.main` takes and how long
+the first request to the liveness probe takes once the app is imported.
+
+Usage:
+    python scripts/bench_startup.py [--runs 5] [--max-import-ms 400]
+
+Exits with a non-zero status if the median import time exceeds --max-import-ms,
+so it can be used as a regression gate in CI.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Runs in a fresh interpreter so that nothing is already imported.
+PROBE = """
+import asyncio, json, time
+
+started = time.perf_counter()
+from app.main import app
+imported = time.perf_counter()
+
+
+async def first_request():
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": "/api/ping/", "raw_path": b"/api/ping/",
+        "root_path": "", "query_string": b"", "headers": [],
+        "client": ("127.0.0.1", 0), "server": ("127.0.0.1", 4000),
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    return messages[0]["status"]
+
+
+status = asyncio.run(first_request())
+done = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "first_request_ms": (done - imported) * 1000,
+    "status": status,
+}))
+"""
+
+
+def run_once() -> dict[str, float]:
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=ROOT,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-import-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    results = [run_once() for _ in range(args.runs)]
+    import_ms = statistics.median(r["import_ms"] for r in results)
+    first_request_ms = statistics.median(r["first_request_ms"] for r in results)
+    print(f"import app.main:  {import_ms:8.1f} ms (median of {args.runs})")
+    print(f"first request:    {first_request_ms:8.1f} ms (median of {args.runs})")
+
+    if args.max_import_ms is not None and import_ms > args.max_import_ms:
+        print(f"Import time regression: {import_ms:.1f} ms > {args.max_import_ms} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
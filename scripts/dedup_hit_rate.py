@@ -0,0 +1,91 @@
+"""
+Measure how often near-duplicate prompt detection would serve a stored response.
+
+Usage:
+    python scripts/dedup_hit_rate.py PROMPTS... [--thresholds 0.6,0.7,0.8,0.9]
+        [--shingle-size 5] [--permutations 128] [--bands 32] [--max-entries 1000]
+
+PROMPTS are capture traces recorded with CAPTURE_ENABLED and CAPTURE_PROMPTS
+(see app/capture.py), or JSON lines files of `{"team": ..., "prompt": ...}`.
+The prompts are replayed in order through a PromptDeduplicator per threshold:
+a prompt that misses is stored, as its generation would have been, so later
+variations of it can hit. Prints the hit rate per threshold and event.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def rotation_index(path: str) -> int:
+    suffix = Path(path).suffix[1:]
+    return -int(suffix) if suffix.isdigit() else 0
+
+
+def load_prompts(paths: list[str]) -> list[tuple[str, str]]:
+    prompts = []
+    # Rotated capture files (.1, .2, ...) hold older records: read them first.
+    for path in sorted(paths, key=rotation_index):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if record.get("k", "in") == "in" and record.get("prompt"):
+                    prompts.append((record.get("team", ""), record["prompt"]))
+    return prompts
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("prompts", nargs="+")
+    parser.add_argument("--thresholds", default="0.6,0.7,0.8,0.9")
+    parser.add_argument("--shingle-size", type=int, default=5)
+    parser.add_argument("--permutations", type=int, default=128)
+    parser.add_argument("--bands", type=int, default=32)
+    parser.add_argument("--max-entries", type=int, default=1000)
+    args = parser.parse_args()
+
+    os.environ.update(
+        DEDUP_SHINGLE_SIZE=str(args.shingle_size),
+        DEDUP_PERMUTATIONS=str(args.permutations),
+        DEDUP_BANDS=str(args.bands),
+        DEDUP_MAX_ENTRIES=str(args.max_entries),
+    )
+    from app.api.predictions.dedup import PromptDeduplicator
+
+    prompts = load_prompts(args.prompts)
+    if not prompts:
+        parser.error("No prompts found; traces must be captured with CAPTURE_PROMPTS=true")
+
+    deduplicator = PromptDeduplicator()
+    deduplicator.signature(prompts[0][1])  # warm up numpy
+    started = time.perf_counter()
+    signatures = [(team, deduplicator.signature(prompt)) for team, prompt in prompts]
+    elapsed = time.perf_counter() - started
+    print(f"{len(prompts)} prompts, {elapsed / len(prompts) * 1e6:.0f} us per signature")
+
+    for threshold in (float(t) for t in args.thresholds.split(",")):
+        deduplicator = PromptDeduplicator()
+        hits: Counter[str] = Counter()
+        totals: Counter[str] = Counter()
+        for team, signature in signatures:
+            totals[team] += 1
+            if deduplicator.lookup(team, signature, threshold=threshold) is not None:
+                hits[team] += 1
+            else:
+                deduplicator.store(team, signature, [])
+        rate = sum(hits.values()) / len(signatures)
+        print(f"threshold {threshold:.2f}: hit rate {rate:.1%}, {deduplicator.entries()} entries")
+        for team in sorted(totals):
+            print(f"    {team or '-'}: {hits[team]}/{totals[team]}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,286 @@
+"""
+Replay captured WebSocket traces against a local instance.
+
+Traces are written by the app when CAPTURE_ENABLED is set (see app/capture.py).
+This tool starts a fake inference server that reproduces the captured upstream
+token timings, then opens the captured connections against the instance under
+test and sends the same sequence of messages with the same timing, divided by
+--speed.
+
+Point the instance at the fake upstream, e.g.:
+    AKASH_ENDPOINT=127.0.0.1:8765 uvicorn app.main:app --port 4000
+
+Usage:
+    python scripts/replay_traces.py captures/trace.jsonl* [--speed 4]
+        [--url ws://127.0.0.1:4000/ws] [--upstream-port 8765]
+        [--report report.json] [--compare baseline.json]
+
+The instance's API_KEY_AUTH and SECRET_KEY must be in the environment (or
+passed with --api-key/--secret-key) so that requests can be authenticated.
+Comparing the reports of two builds replayed from the same traces shows how
+their behaviour under the captured load differs.
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import statistics
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Optional
+
+MARKER = re.compile(r"replay:(\w+):(\d+)")
+
+
+class Connection:
+    def __init__(self, connection_id: str, opened: float) -> None:
+        self.connection_id = connection_id
+        self.opened = opened
+        self.inbound: list[dict[str, Any]] = []
+        self.requests: dict[int, dict[str, Any]] = {}
+        self.generations: dict[int, dict[str, Any]] = {}
+        self.sessions: list[str] = []
+
+
+def rotation_index(path: str) -> int:
+    suffix = Path(path).suffix[1:]
+    return -int(suffix) if suffix.isdigit() else 0
+
+
+def load_traces(paths: list[str]) -> list[Connection]:
+    connections: dict[str, Connection] = {}
+    records = []
+    # Rotated files (.1, .2, ...) hold older records: read them first.
+    for path in sorted(paths, key=rotation_index):
+        with open(path, encoding="utf-8") as f:
+            records.extend(json.loads(line) for line in f if line.strip())
+    for record in records:
+        kind = record["k"]
+        if kind == "open":
+            connections[record["c"]] = Connection(record["c"], record["ts"])
+            continue
+        connection = connections.get(record["c"])
+        if connection is None:
+            # Opened in a file that has since been rotated away.
+            continue
+        if kind == "in":
+            connection.inbound.append(record)
+        elif kind == "req":
+            connection.requests[record["m"]] = record
+        elif kind == "gen":
+            connection.generations[record["m"]] = record
+        elif kind == "out" and "session" in record:
+            connection.sessions.append(record["session"])
+    return sorted(connections.values(), key=lambda c: c.opened)
+
+
+class Replay:
+    def __init__(self, connections: list[Connection], args: argparse.Namespace) -> None:
+        self.connections = connections
+        self.args = args
+        self.speed = args.speed
+        self.generations = {
+            (c.connection_id, m): g for c in connections for m, g in c.generations.items()
+        }
+        # Captured session id -> its owner, and the id the replayed instance issued.
+        self.session_owners: dict[str, str] = {}
+        self.session_ids: dict[str, str] = {}
+        # (connection id, captured stream id) -> the owner of its last prompt,
+        # whose token a cancel of that stream is sent with.
+        self.stream_owners: dict[tuple[str, Optional[str]], str] = {}
+        for connection in connections:
+            owners = [connection.requests[m]["owner"] for m in sorted(connection.requests)]
+            self.session_owners.update(zip(connection.sessions, owners))
+        self.ttft: list[float] = []
+        self.statuses: Counter = Counter()
+        self.truncated: Counter = Counter()
+        self.frames = 0
+        self.errors = 0
+
+    async def upstream(self, ws) -> None:
+        """Fake inference server replaying the captured token timings."""
+        match = MARKER.search(await ws.recv())
+        generation = self.generations.get((match[1], int(match[2]))) if match else None
+        gaps = generation["d"] if generation else [20.0] * 20
+        sizes = generation["n"] if generation else [4] * 20
+        for gap, size in zip(gaps, sizes):
+            await asyncio.sleep(gap / 1000 / self.speed)
+            await ws.send("x" * size)
+
+    def token(self, owner: str, tier: str) -> str:
+        import jwt
+
+        payload = {
+            "wallet_address": f"replay-{owner}",
+            "tier": tier,
+            "exp": datetime.now(timezone.utc) + timedelta(days=1),
+        }
+        return jwt.encode(payload, self.args.secret_key, algorithm="HS256")
+
+    def message(self, connection: Connection, record: dict[str, Any]) -> str:
+        if record.get("invalid"):
+            return "x" * record["n"]
+        data: dict[str, Any] = {"api_key_auth": self.args.api_key, "team": record.get("team", "")}
+        stream = (connection.connection_id, record.get("stream"))
+        if record.get("action") == "cancel":
+            data["token"] = self.token(self.stream_owners.get(stream, "anonymous"), "default")
+        elif "session" in record:
+            owner = self.session_owners.get(record["session"], "anonymous")
+            data["session_id"] = self.session_ids.get(record["session"], record["session"])
+            data["offset"] = record.get("offset", 0)
+            data["token"] = self.token(owner, "default")
+            self.stream_owners[stream] = owner
+        else:
+            request = connection.requests.get(record["m"], {})
+            marker = f"replay:{connection.connection_id}:{record['m']} "
+            data["prompt"] = marker.ljust(record.get("prompt_len", 0), "x")
+            owner = request.get("owner", "anonymous")
+            data["token"] = self.token(owner, request.get("tier", "default"))
+            self.stream_owners[stream] = owner
+        body: dict[str, Any] = {"data": data}
+        # Version 2 messages keep their version, stream id and action.
+        for field, key in (("v", "v"), ("stream", "stream_id"), ("action", "action")):
+            if field in record:
+                body[key] = record[field]
+        return json.dumps(body)
+
+    async def client(self, connection: Connection, started: float) -> None:
+        import websockets
+
+        await asyncio.sleep(max(0.0, (connection.opened - started) / self.speed))
+        # Send times of the prompts awaiting their first token, and the
+        # number of prompts in progress, by stream (None for version 1).
+        sent: dict[Optional[str], list[float]] = defaultdict(list)
+        outstanding: Counter = Counter()
+        issued = iter(connection.sessions)
+        finished = asyncio.Event()
+        try:
+            async with websockets.connect(self.args.url) as ws:
+                opened = time.monotonic()
+
+                def complete(stream: Optional[str]) -> None:
+                    if outstanding[stream]:
+                        outstanding[stream] -= 1
+                    if not +outstanding:
+                        finished.set()
+
+                async def receive() -> None:
+                    async for raw in ws:
+                        self.frames += 1
+                        frame = json.loads(raw)
+                        stream = frame.get("stream_id")
+                        if "session_id" in frame:
+                            captured = next(issued, None)
+                            if captured is not None:
+                                self.session_ids[captured] = frame["session_id"]
+                        elif "statusCode" in frame:
+                            self.statuses[frame["statusCode"]] += 1
+                            if sent[stream]:
+                                sent[stream].pop(0)
+                            complete(stream)
+                        elif "end" in frame:
+                            if frame["end"] in ("truncated", "cancelled"):
+                                self.truncated[frame.get("reason", frame["end"])] += 1
+                            complete(stream)
+                        elif frame.get("token") == "END_OF_RESPONSE":
+                            if frame.get("truncated"):
+                                self.truncated[frame.get("reason")] += 1
+                            complete(stream)
+                        elif frame.get("offset") == 0 and sent[stream]:
+                            self.ttft.append((time.monotonic() - sent[stream].pop(0)) * 1000)
+
+                receiver = asyncio.create_task(receive())
+                for record in connection.inbound:
+                    delay = record["t"] / 1000 / self.speed - (time.monotonic() - opened)
+                    await asyncio.sleep(max(0.0, delay))
+                    if not ("session" in record or "action" in record or record.get("invalid")):
+                        stream = record.get("stream")
+                        sent[stream].append(time.monotonic())
+                        outstanding[stream] += 1
+                        finished.clear()
+                    await ws.send(self.message(connection, record))
+                if +outstanding:
+                    # Give the last generations time to finish before closing.
+                    await asyncio.wait_for(finished.wait(), timeout=self.args.drain)
+                receiver.cancel()
+        except asyncio.TimeoutError:
+            pass
+        except Exception as e:
+            print(f"Connection {connection.connection_id} failed:", e, file=sys.stderr)
+            self.errors += 1
+
+    async def run(self) -> dict[str, Any]:
+        import websockets
+
+        async with websockets.serve(self.upstream, "127.0.0.1", self.args.upstream_port):
+            started = time.monotonic()
+            first = self.connections[0].opened if self.connections else 0.0
+            await asyncio.gather(*(self.client(c, first) for c in self.connections))
+            duration = time.monotonic() - started
+        return self.report(duration)
+
+    def report(self, duration: float) -> dict[str, Any]:
+        ttft = sorted(self.ttft)
+
+        def percentile(q: float) -> Optional[float]:
+            if not ttft:
+                return None
+            return round(ttft[min(len(ttft) - 1, int(q * len(ttft)))], 1)
+
+        return {
+            "speed": self.speed,
+            "connections": len(self.connections),
+            "prompts": sum(len(c.requests) for c in self.connections),
+            "duration_s": round(duration, 2),
+            "frames": self.frames,
+            "ttft_ms": {
+                "p50": percentile(0.5),
+                "p95": percentile(0.95),
+                "p99": percentile(0.99),
+                "mean": round(statistics.fmean(ttft), 1) if ttft else None,
+            },
+            "statuses": {str(k): v for k, v in sorted(self.statuses.items())},
+            "truncated": dict(self.truncated),
+            "connection_errors": self.errors,
+        }
+
+
+def compare(report: dict[str, Any], baseline: dict[str, Any]) -> None:
+    for key in ("p50", "p95", "p99", "mean"):
+        new, old = report["ttft_ms"][key], baseline["ttft_ms"].get(key)
+        if new is not None and old:
+            print(f"ttft {key}: {old} -> {new} ms ({(new - old) / old * 100:+.1f}%)")
+    for key in ("duration_s", "frames", "connection_errors"):
+        print(f"{key}: {baseline.get(key)} -> {report[key]}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("traces", nargs="+")
+    parser.add_argument("--url", default="ws://127.0.0.1:4000/ws")
+    parser.add_argument("--speed", type=float, default=1.0)
+    parser.add_argument("--upstream-port", type=int, default=8765)
+    parser.add_argument("--drain", type=float, default=30.0)
+    parser.add_argument("--api-key", default=os.environ.get("API_KEY_AUTH"))
+    parser.add_argument("--secret-key", default=os.environ.get("SECRET_KEY"))
+    parser.add_argument("--report")
+    parser.add_argument("--compare")
+    args = parser.parse_args()
+    if not args.api_key or not args.secret_key:
+        parser.error("API_KEY_AUTH and SECRET_KEY are required")
+
+    report = asyncio.run(Replay(load_traces(args.traces), args).run())
+    print(json.dumps(report, indent=2))
+    if args.report:
+        Path(args.report).write_text(json.dumps(report, indent=2))
+    if args.compare:
+        compare(report, json.loads(Path(args.compare).read_text()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+"""
+Score every prediction for a finished match.
+
+Usage:
+    python scripts/score_match.py TEAM [--result 2-1] [--checkpoint score.json]
+        [--chunk-size 1000] [--concurrency 4] [--force]
+
+TEAM is the event's `team` key, e.g. "Spain_England". The result defaults to
+the event's `result` attribute in bs-football-context-prompts. Re-running with
+the same --checkpoint resumes an interrupted run.
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dotenv import load_dotenv  # noqa: E402
+
+from app.api.db.db import event_timestamp, get_dynamodb_resource  # noqa: E402
+from app.api.predictions.scoring import BulkScorer  # noqa: E402
+
+
+def find_event(team: str) -> dict:
+    from boto3.dynamodb.conditions import Attr
+
+    table = get_dynamodb_resource().Table("bs-football-context-prompts")
+    kwargs = {"FilterExpression": Attr("team").eq(team)}
+    while True:
+        response = table.scan(**kwargs)
+        if response.get("Items"):
+            return response["Items"][0]
+        if "LastEvaluatedKey" not in response:
+            raise SystemExit(f"No event found for {team}")
+        kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("team")
+    parser.add_argument("--result")
+    parser.add_argument("--checkpoint")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--force", action="store_true", help="score before end_ts")
+    args = parser.parse_args()
+
+    load_dotenv()
+    event = find_event(args.team)
+    if not args.force and event["end_ts"] > event_timestamp():
+        raise SystemExit(f"{args.team} has not ended yet (end_ts {event['end_ts']})")
+    result = args.result or event.get("result")
+    if not result:
+        raise SystemExit(f"{args.team} has no result, pass --result")
+
+    scorer = BulkScorer(args.chunk_size, args.concurrency, args.checkpoint)
+    print(asyncio.run(scorer.run(args.team, result)))
+
+
+if __name__ == "__main__":
+    main()